@@ -0,0 +1,212 @@
+"""Synthetic PJSekai extended charts for benchmarking."""
+
+import random
+from dataclasses import dataclass
+from itertools import pairwise
+from typing import Any
+
+from sonolus.script.level import ExternalEntityData, ExternalLevelData
+
+TAP_ARCHETYPES = (
+    "NormalTapNote",
+    "CriticalTapNote",
+    "NormalFlickNote",
+    "CriticalFlickNote",
+    "NormalTraceNote",
+    "CriticalTraceNote",
+    "NormalTraceFlickNote",
+    "DamageNote",
+)
+
+
+@dataclass(frozen=True)
+class ChartParams:
+    """Parameters of a synthetic chart.
+
+    Attributes:
+        beats: Length of the chart in beats.
+        note_density: Average number of taps and slide starts per beat.
+        slide_ratio: Fraction of those that start a slide rather than being a tap.
+        slide_length: Length of each slide in beats. Slides have a tick every half beat.
+        attached_tick_ratio: Fraction of slide ticks that are attached rather than being their own slide points.
+        sim_line_ratio: Fraction of taps that get a simultaneous partner joined by a sim line.
+        guide_count: Number of guides.
+        guide_chain_length: Number of guides joined end to end, sharing anchors, in each run of guides.
+        timescale_group_count: Number of timescale groups.
+        timescale_chain_length: Number of timescale changes in each group.
+        bpm_change_count: Number of bpm changes.
+        seed: Random seed.
+    """
+
+    beats: float = 400.0
+    note_density: float = 4.0
+    slide_ratio: float = 0.2
+    slide_length: float = 2.0
+    attached_tick_ratio: float = 0.5
+    sim_line_ratio: float = 0.1
+    guide_count: int = 300
+    guide_chain_length: int = 4
+    timescale_group_count: int = 4
+    timescale_chain_length: int = 32
+    bpm_change_count: int = 4
+    seed: int = 0
+
+
+class ChartGenerator:
+    def __init__(self, params: ChartParams):
+        self.params = params
+        self.rng = random.Random(params.seed)
+        self.entities: list[ExternalEntityData] = []
+        self.groups: list[int] = []
+
+    def add(self, archetype: str, **data: Any) -> int:
+        self.entities.append(ExternalEntityData(archetype, data))
+        return len(self.entities) - 1
+
+    def lane(self) -> float:
+        return self.rng.randint(-5, 5) + self.rng.choice([0.0, 0.5])
+
+    def size(self) -> float:
+        return self.rng.choice([1.0, 1.5, 2.0, 3.0])
+
+    def beat(self) -> float:
+        return self.rng.randrange(max(round(self.params.beats * 4), 1)) / 4
+
+    def generate(self) -> ExternalLevelData:
+        self.add("Initialization")
+        self.add_bpm_changes()
+        self.add_timescale_groups()
+        for _ in range(round(self.params.beats * self.params.note_density)):
+            if self.rng.random() < self.params.slide_ratio:
+                self.add_slide()
+            else:
+                self.add_tap()
+        self.add_guides()
+        return ExternalLevelData(bgm_offset=0.0, entities=self.entities)
+
+    def add_bpm_changes(self):
+        for i in range(self.params.bpm_change_count):
+            self.add(
+                "#BPM_CHANGE",
+                **{
+                    "#BEAT": self.params.beats * i / self.params.bpm_change_count,
+                    "#BPM": self.rng.choice([120.0, 150.0, 180.0]),
+                },
+            )
+
+    def add_timescale_groups(self):
+        chain_length = max(self.params.timescale_chain_length, 1)
+        for _ in range(max(self.params.timescale_group_count, 1)):
+            group = self.add("TimeScaleGroup")
+            self.groups.append(group)
+            previous = group
+            for i in range(chain_length):
+                change = self.add(
+                    "TimeScaleChange",
+                    **{
+                        "#BEAT": self.params.beats * i / chain_length,
+                        "timeScale": self.rng.choice([0.5, 1.0, 1.0, 1.5, 2.0]),
+                    },
+                )
+                self.entities[previous].data["first" if previous == group else "next"] = change
+                previous = change
+
+    def add_tap(self):
+        beat = self.beat()
+        note = self.add(
+            self.rng.choice(TAP_ARCHETYPES),
+            **{
+                "#BEAT": beat,
+                "lane": self.lane(),
+                "size": self.size(),
+                "direction": self.rng.choice([-1, 0, 1]),
+                "timeScaleGroup": self.rng.choice(self.groups),
+            },
+        )
+        if self.rng.random() < self.params.sim_line_ratio:
+            partner = self.add(
+                "NormalTapNote",
+                **{
+                    "#BEAT": beat,
+                    "lane": self.lane(),
+                    "size": self.size(),
+                    "timeScaleGroup": self.rng.choice(self.groups),
+                },
+            )
+            self.add("SimLine", a=note, b=partner)
+
+    def add_slide(self):
+        prefix = self.rng.choice(["Normal", "Normal", "Normal", "Critical"])
+        group = self.rng.choice(self.groups)
+        beat = self.beat()
+
+        def add_point(archetype: str, point_beat: float) -> int:
+            return self.add(
+                archetype,
+                **{"#BEAT": point_beat, "lane": self.lane(), "size": self.size(), "timeScaleGroup": group},
+            )
+
+        points = [add_point(f"{prefix}SlideStartNote", beat)]
+        attached_ticks = []
+        for i in range(1, max(round(self.params.slide_length * 2), 1)):
+            tick_beat = beat + i / 2
+            if self.rng.random() < self.params.attached_tick_ratio:
+                attached_ticks.append(
+                    self.add(f"{prefix}AttachedSlideTickNote", **{"#BEAT": tick_beat, "timeScaleGroup": group})
+                )
+            else:
+                points.append(add_point(self.rng.choice([f"{prefix}SlideTickNote", "HiddenSlideTickNote"]), tick_beat))
+        points.append(add_point(f"{prefix}SlideEndNote", beat + max(self.params.slide_length, 0.5)))
+
+        connectors = [
+            self.add(
+                f"{prefix}SlideConnector",
+                head=head,
+                tail=tail,
+                start=points[0],
+                end=points[-1],
+                ease=self.rng.choice([-1, 0, 1]),
+            )
+            for head, tail in pairwise(points)
+        ]
+        for point in points[1:]:
+            self.entities[point].data["slide"] = connectors[0]
+        for tick in attached_ticks:
+            tick_beat = self.entities[tick].data["#BEAT"]
+            attach = next(
+                c for c in connectors if self.entities[self.entities[c].data["tail"]].data["#BEAT"] > tick_beat
+            )
+            self.entities[tick].data["attach"] = attach
+            self.entities[tick].data["slide"] = connectors[0]
+
+    def add_guides(self):
+        added = 0
+        while added < self.params.guide_count:
+            beat = self.beat()
+            lane = self.lane()
+            size = self.size()
+            group = self.rng.choice(self.groups)
+            color = self.rng.randint(0, 7)
+            for _ in range(min(max(self.params.guide_chain_length, 1), self.params.guide_count - added)):
+                end_beat = beat + self.rng.choice([0.5, 1.0, 2.0])
+                end_lane = self.lane()
+                fields = {}
+                for pos, pos_beat, pos_lane in (
+                    ("start", beat, lane),
+                    ("head", beat, lane),
+                    ("tail", end_beat, end_lane),
+                    ("end", end_beat, end_lane),
+                ):
+                    fields[f"{pos}Beat"] = pos_beat
+                    fields[f"{pos}Lane"] = pos_lane
+                    fields[f"{pos}Size"] = size
+                    fields[f"{pos}TimeScaleGroup"] = group
+                self.add("Guide", **fields, ease=self.rng.choice([-1, 0, 1]), fade=1, color=color)
+                added += 1
+                beat = end_beat
+                lane = end_lane
+
+
+def generate_chart(params: ChartParams) -> ExternalLevelData:
+    """Generate a chart with the given parameters. The same parameters always give the same chart."""
+    return ChartGenerator(params).generate()
@@ -0,0 +1,159 @@
+"""Benchmark ColumnarPJSekaiExtendedLevelData against the dict-based PJSekaiExtendedLevelData.
+
+Usage:
+    python -m sekai.benchmarks.columnar [--scale N]... [--output PATH]
+
+Each case is the default synthetic chart (see sekai.benchmarks.charts) scaled up N times in length and packaged the way
+levels are stored. It's loaded both ways, as the batch converter does with and without --columnar:
+
+- retained: what the loaded source level holds on to, measured with tracemalloc.
+- load: the time to load it from the packaged data.
+- scan: the time to read #BEAT, lane and size of every note, which is the access pattern of the conversion stages.
+"""
+
+import argparse
+import dataclasses
+import gzip
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from sonolus.script.level import ExternalLevelData, parse_external_level_data
+
+from sekai.benchmarks.charts import ChartParams, generate_chart
+from sekai.benchmarks.converter import get_commit
+from sekai.lib.converter import ColumnarPJSekaiExtendedLevelData, PJSekaiExtendedLevelData, SourceLevelData
+
+RESULTS_VERSION = 1
+
+DEFAULT_SCALES = (1, 4, 16)
+
+SCAN_FIELDS = ("#BEAT", "lane", "size")
+
+
+def package_external_level_data(data: ExternalLevelData) -> bytes:
+    raw_entities = [
+        {
+            "archetype": entity.archetype,
+            "data": [{"name": name, "value": value} for name, value in entity.data.items()],
+        }
+        for entity in data.entities
+    ]
+    return gzip.compress(json.dumps({"bgmOffset": data.bgm_offset, "entities": raw_entities}).encode("utf-8"))
+
+
+def load_dict(packaged_data: bytes) -> SourceLevelData:
+    return PJSekaiExtendedLevelData(parse_external_level_data(packaged_data).entities)
+
+
+def load_columnar(packaged_data: bytes) -> SourceLevelData:
+    pjsekai_data, _ = ColumnarPJSekaiExtendedLevelData.from_packaged(packaged_data)
+    return pjsekai_data
+
+
+def scan(pjsekai_data: SourceLevelData) -> float:
+    total = 0.0
+    for _, entity in pjsekai_data.iter_note_archetypes():
+        data = entity.data
+        for field in SCAN_FIELDS:
+            total += data.get(field, 0)
+    return total
+
+
+def measure(load: Callable[[bytes], SourceLevelData], packaged_data: bytes, repeat: int) -> dict[str, Any]:
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        pjsekai_data = load(packaged_data)
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del pjsekai_data
+
+    load_seconds = []
+    scan_seconds = []
+    checksum = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pjsekai_data = load(packaged_data)
+        loaded = time.perf_counter()
+        checksum = scan(pjsekai_data)
+        scanned = time.perf_counter()
+        load_seconds.append(loaded - start)
+        scan_seconds.append(scanned - loaded)
+    return {
+        "retained_bytes": current - baseline,
+        "load_seconds": min(load_seconds),
+        "scan_seconds": min(scan_seconds),
+        "checksum": checksum,
+    }
+
+
+def benchmark_scale(scale: int, repeat: int) -> dict[str, Any]:
+    defaults = ChartParams()
+    params = dataclasses.replace(
+        defaults,
+        beats=defaults.beats * scale,
+        guide_count=defaults.guide_count * scale,
+        timescale_chain_length=defaults.timescale_chain_length * scale,
+    )
+    data = generate_chart(params)
+    packaged_data = package_external_level_data(data)
+    del data
+    result = {
+        "scale": scale,
+        "input_entities": len(load_columnar(packaged_data).entities),
+        "dict": measure(load_dict, packaged_data, repeat),
+        "columnar": measure(load_columnar, packaged_data, repeat),
+    }
+    if result["dict"]["checksum"] != result["columnar"]["checksum"]:
+        raise AssertionError("Columnar scan doesn't match the dict scan")
+    return result
+
+
+def print_result(result: dict[str, Any]):
+    print(f"x{result['scale']}: {result['input_entities']} entities")
+    for name in ("dict", "columnar"):
+        stats = result[name]
+        print(
+            f"  {name:<9} retained {stats['retained_bytes'] / 2**20:7.1f} MiB"
+            f"  load {stats['load_seconds'] * 1000:8.1f} ms  scan {stats['scan_seconds'] * 1000:7.1f} ms"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m sekai.benchmarks.columnar",
+        description="Benchmark the columnar source level view against the dict-based one.",
+    )
+    parser.add_argument(
+        "--scale", action="append", type=int, help="Length of the chart relative to the default, may be repeated"
+    )
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="Number of timed runs per case")
+    parser.add_argument("-o", "--output", type=Path, help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = {
+        "version": RESULTS_VERSION,
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "scales": [],
+    }
+    for scale in args.scale or DEFAULT_SCALES:
+        result = benchmark_scale(scale, args.repeat)
+        results["scales"].append(result)
+        print_result(result)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""Benchmark the level converter stage by stage on synthetic charts.
+
+Usage:
+    python -m sekai.benchmarks.converter [--case NAME]... [--param NAME=VALUE]... [--output PATH] [--compare PATH]
+
+Each case is a synthetic chart (see sekai.benchmarks.charts) converted the same way convert_pjsekai_extended_entities
+does it, timing each stage separately. Stages are timed over several runs without tracing, then run once more under
+tracemalloc to record the peak memory each stage allocates on top of what's already live.
+
+Results are printed as a table and can be written as JSON with --output. Passing a previous JSON file with --compare
+adds the ratio of each stage's median time to the baseline's, so results can be compared across commits.
+"""
+
+import argparse
+import dataclasses
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, get_type_hints
+
+from sonolus.build.level import package_level_data
+from sonolus.script.level import ExternalLevelData, LevelData
+
+from sekai.benchmarks.charts import ChartParams, generate_chart
+from sekai.lib.converter import (
+    PJSekaiExtendedLevelData,
+    convert_bpm_changes,
+    convert_guides,
+    convert_notes,
+    convert_timescale_groups,
+    link_slide_notes,
+    validate_pjsekai_extended_level_data,
+)
+from sekai.play.initialization import Initialization
+
+RESULTS_VERSION = 1
+
+CASES = {
+    "default": ChartParams(),
+    "dense": ChartParams(note_density=12.0, guide_count=100),
+    "long_slides": ChartParams(slide_ratio=0.5, slide_length=8.0, attached_tick_ratio=0.8),
+    "guides": ChartParams(note_density=1.0, guide_count=2000, guide_chain_length=16),
+    "timescales": ChartParams(note_density=2.0, timescale_group_count=32, timescale_chain_length=256),
+}
+
+STAGES = (
+    "index",
+    "validate",
+    "convert_bpm_changes",
+    "convert_timescale_groups",
+    "convert_notes",
+    "convert_guides",
+    "sort",
+    "link_slide_notes",
+    "package",
+)
+
+
+def run_stages(data: ExternalLevelData, record: Callable[[str], None]) -> int:
+    """Convert a level, calling record with each stage's name right after the stage finishes.
+
+    Returns the number of converted entities.
+    """
+    pjsekai_data = PJSekaiExtendedLevelData(data.entities)
+    record("index")
+    diagnostics = validate_pjsekai_extended_level_data(pjsekai_data)
+    if diagnostics:
+        raise ValueError(f"Generated chart is invalid: {diagnostics[0]}")
+    record("validate")
+    bpm_changes = convert_bpm_changes(pjsekai_data)
+    record("convert_bpm_changes")
+    timescale_groups_by_index, timescale_entities = convert_timescale_groups(pjsekai_data)
+    record("convert_timescale_groups")
+    notes = convert_notes(pjsekai_data, timescale_groups_by_index)
+    record("convert_notes")
+    guides = convert_guides(pjsekai_data, timescale_groups_by_index)
+    record("convert_guides")
+    entities = sorted([*bpm_changes, *timescale_entities, *notes, *guides], key=lambda e: getattr(e, "beat", -1))
+    record("sort")
+    link_slide_notes(entities)
+    record("link_slide_notes")
+    entities = [Initialization(), *entities]
+    package_level_data(LevelData(bgm_offset=data.bgm_offset, entities=entities))
+    record("package")
+    return len(entities)
+
+
+def time_stages(data: ExternalLevelData) -> tuple[dict[str, float], int]:
+    durations = {}
+    last_time = time.perf_counter()
+
+    def record(stage: str):
+        nonlocal last_time
+        now = time.perf_counter()
+        durations[stage] = now - last_time
+        last_time = now
+
+    output_entities = run_stages(data, record)
+    return durations, output_entities
+
+
+def trace_stages(data: ExternalLevelData) -> dict[str, int]:
+    peaks = {}
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+
+        def record(stage: str):
+            nonlocal baseline
+            current, peak = tracemalloc.get_traced_memory()
+            peaks[stage] = peak - baseline
+            tracemalloc.reset_peak()
+            baseline = current
+
+        run_stages(data, record)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def benchmark_case(params: ChartParams, repeat: int) -> dict[str, Any]:
+    data = generate_chart(params)
+    runs = []
+    output_entities = 0
+    for _ in range(repeat):
+        durations, output_entities = time_stages(data)
+        runs.append(durations)
+    peaks = trace_stages(data)
+    stages = {
+        stage: {
+            "seconds": statistics.median(run[stage] for run in runs),
+            "min_seconds": min(run[stage] for run in runs),
+            "peak_bytes": peaks[stage],
+        }
+        for stage in STAGES
+    }
+    return {
+        "params": dataclasses.asdict(params),
+        "input_entities": len(data.entities),
+        "output_entities": output_entities,
+        "total_seconds": sum(stage["seconds"] for stage in stages.values()),
+        "peak_bytes": max(stage["peak_bytes"] for stage in stages.values()),
+        "stages": stages,
+    }
+
+
+def get_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def parse_param(value: str) -> tuple[str, Any]:
+    name, sep, raw = value.partition("=")
+    field_types = get_type_hints(ChartParams)
+    if not sep or name not in field_types:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE with NAME one of {', '.join(field_types)}")
+    try:
+        return name, field_types[name](raw)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from e
+
+
+def format_ratio(seconds: float, baseline: dict[str, Any] | None) -> str:
+    if not baseline or not baseline.get("seconds"):
+        return ""
+    return f"{seconds / baseline['seconds']:7.2f}x"
+
+
+def print_case(name: str, result: dict[str, Any], baseline: dict[str, Any] | None):
+    print(f"{name}: {result['input_entities']} -> {result['output_entities']} entities")
+    baseline_stages = baseline["stages"] if baseline else {}
+    for stage, stage_result in result["stages"].items():
+        print(
+            f"  {stage:<26}{stage_result['seconds'] * 1000:10.1f} ms{stage_result['peak_bytes'] / 2**20:10.2f} MiB"
+            f"{format_ratio(stage_result['seconds'], baseline_stages.get(stage))}"
+        )
+    print(
+        f"  {'total':<26}{result['total_seconds'] * 1000:10.1f} ms{result['peak_bytes'] / 2**20:10.2f} MiB"
+        f"{format_ratio(result['total_seconds'], baseline and {'seconds': baseline['total_seconds']})}"
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m sekai.benchmarks.converter", description="Benchmark the level converter stage by stage."
+    )
+    parser.add_argument(
+        "--case", action="append", choices=list(CASES), help="Case to run, may be repeated (default: all)"
+    )
+    parser.add_argument(
+        "--param",
+        action="append",
+        type=parse_param,
+        default=[],
+        metavar="NAME=VALUE",
+        help="Override a chart parameter for every case, may be repeated",
+    )
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="Number of timed runs per case")
+    parser.add_argument("-o", "--output", type=Path, help="Write results as JSON to this path")
+    parser.add_argument("--compare", type=Path, help="JSON results of a previous run to compare against")
+    args = parser.parse_args(argv)
+
+    baseline_cases = json.loads(args.compare.read_text(encoding="utf-8"))["cases"] if args.compare else {}
+    overrides = dict(args.param)
+    results = {
+        "version": RESULTS_VERSION,
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "cases": {},
+    }
+    for name in args.case or CASES:
+        params = dataclasses.replace(CASES[name], **overrides)
+        result = benchmark_case(params, max(args.repeat, 1))
+        results["cases"][name] = result
+        print_case(name, result, baseline_cases.get(name))
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
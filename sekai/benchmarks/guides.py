@@ -0,0 +1,226 @@
+"""Benchmark matching guide anchors on charts with many overlapping guides.
+
+Usage:
+    python -m sekai.benchmarks.guides [--count N]... [--overlap N] [--baseline-limit N] [--output PATH]
+
+Guides are generated in chains that share anchors, with about --overlap guides at each beat. Every count is matched with
+AnchorMatcher, which indexes anchors by identity, and, up to --baseline-limit guides, with LinearAnchorMatcher, which
+scans every anchor at the same beat like convert_guides used to. Both create plain anchor objects rather than
+AnchorNote, since constructing archetypes costs the same either way and would otherwise dominate the measurement.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import Any, cast
+
+from sonolus.script.level import ExternalEntityData
+
+from sekai.lib.converter import ANCHOR_POSITIONS, AnchorMatcher, AnchorPosition, get_guide_anchor_args
+
+RESULTS_VERSION = 1
+
+DEFAULT_COUNTS = (10_000, 100_000, 1_000_000)
+
+# A guide as (start beat, start lane, end beat, end lane, size, timescale group, ease, color), in source units.
+type Guide = tuple[float, float, float, float, float, int, int, int]
+
+
+class PlainAnchor:
+    __slots__ = (
+        "beat",
+        "connector_ease",
+        "lane",
+        "ordinal",
+        "segment_alpha",
+        "segment_kind",
+        "size",
+        "timescale_group",
+    )
+
+    def __init__(self, ordinal: int, **fields: Any):
+        self.ordinal = ordinal
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+
+class PlainAnchorMatcher(AnchorMatcher):
+    def create_anchor(self, **fields: Any) -> Any:
+        return PlainAnchor(len(self.anchors), **fields)
+
+
+class LinearAnchorMatcher(PlainAnchorMatcher):
+    """Matches anchors the way convert_guides did before anchors were indexed by identity."""
+
+    def __init__(self, entities: list[Any]):
+        super().__init__(entities)
+        self.anchors_by_beat: dict[float, list[Any]] = {}
+        self.anchor_positions: dict[Any, set[AnchorPosition]] = {}
+
+    def get_anchor(
+        self,
+        beat: float,
+        lane: float,
+        size: float,
+        timescale_group: Any,
+        pos: AnchorPosition,
+        segment_kind: Any = None,
+        segment_alpha: float | None = None,
+        connector_ease: Any = None,
+    ) -> Any:
+        for anchor in self.anchors_by_beat.get(beat, ()):
+            if pos in self.anchor_positions[anchor]:
+                continue
+            if (
+                anchor.lane == lane
+                and anchor.size == size
+                and anchor.timescale_group == timescale_group
+                and (segment_kind is None or anchor.segment_kind in (segment_kind, -1))
+                and (segment_alpha is None or anchor.segment_alpha in (segment_alpha, -1))
+                and (connector_ease is None or anchor.connector_ease in (connector_ease, -1))
+            ):
+                if segment_kind is not None and anchor.segment_kind == -1:
+                    anchor.segment_kind = segment_kind
+                if segment_alpha is not None and anchor.segment_alpha == -1:
+                    anchor.segment_alpha = segment_alpha
+                if connector_ease is not None and anchor.connector_ease == -1:
+                    anchor.connector_ease = connector_ease
+                self.anchor_positions[anchor].add(pos)
+                return anchor
+        anchor = self.create_anchor(
+            beat=beat,
+            lane=lane,
+            size=size,
+            timescale_group=timescale_group,
+            segment_kind=segment_kind if segment_kind is not None else -1,
+            segment_alpha=segment_alpha if segment_alpha is not None else -1,
+            connector_ease=connector_ease if connector_ease is not None else -1,
+        )
+        self.entities.append(anchor)
+        self.anchors.append(anchor)
+        self.anchors_by_beat.setdefault(beat, []).append(anchor)
+        self.anchor_positions[anchor] = {pos}
+        return anchor
+
+
+def generate_guides(count: int, overlap: int, seed: int = 0) -> list[Guide]:
+    """Generate guides in chains of four, spread over count / overlap quarter beats."""
+    rng = random.Random(seed)
+    positions = max(count // max(overlap, 1), 1)
+    guides = []
+    while len(guides) < count:
+        beat = rng.randrange(positions) / 4
+        lane = float(rng.randint(-5, 5))
+        size = rng.choice([1.0, 2.0])
+        group = rng.randrange(4)
+        color = rng.randrange(8)
+        for _ in range(min(4, count - len(guides))):
+            end_beat = beat + rng.choice([0.25, 0.5, 1.0])
+            end_lane = float(rng.randint(-5, 5))
+            guides.append((beat, lane, end_beat, end_lane, size, group, rng.randint(-1, 1), color))
+            beat = end_beat
+            lane = end_lane
+    return guides
+
+
+def match_guides(matcher: AnchorMatcher, guides: list[Guide]) -> array:
+    """Claim every guide's anchors in the order convert_guides does, returning the ordinal of each claimed anchor."""
+    claimed = array("i")
+    for beat, lane, end_beat, end_lane, size, group, ease, color in guides:
+        data: dict[str, Any] = {"ease": ease, "fade": 1, "color": color}
+        for pos, pos_beat, pos_lane in (
+            ("start", beat, lane),
+            ("head", beat, lane),
+            ("tail", end_beat, end_lane),
+            ("end", end_beat, end_lane),
+        ):
+            data[f"{pos}Beat"] = pos_beat
+            data[f"{pos}Lane"] = pos_lane
+            data[f"{pos}Size"] = size
+            data[f"{pos}TimeScaleGroup"] = group
+        for args in get_guide_anchor_args(ExternalEntityData("Guide", data)):
+            claimed.append(cast(PlainAnchor, matcher.get_anchor(**args)).ordinal)
+    matcher.apply_defaults()
+    return claimed
+
+
+def time_matcher(matcher_type: type[AnchorMatcher], guides: list[Guide]) -> tuple[float, int, array]:
+    start = time.perf_counter()
+    matcher = matcher_type([])
+    claimed = match_guides(matcher, guides)
+    return time.perf_counter() - start, len(matcher.anchors), claimed
+
+
+def benchmark_count(count: int, overlap: int, run_baseline: bool) -> dict[str, Any]:
+    guides = generate_guides(count, overlap)
+    seconds, anchors, claimed = time_matcher(PlainAnchorMatcher, guides)
+    result: dict[str, Any] = {
+        "guides": count,
+        "claims": count * len(ANCHOR_POSITIONS),
+        "anchors": anchors,
+        "seconds": seconds,
+        "baseline_seconds": None,
+    }
+    if run_baseline:
+        baseline_seconds, baseline_anchors, baseline_claimed = time_matcher(LinearAnchorMatcher, guides)
+        if baseline_anchors != anchors or baseline_claimed != claimed:
+            raise AssertionError(f"Matchers disagree on {count} guides")
+        result["baseline_seconds"] = baseline_seconds
+    return result
+
+
+def print_result(result: dict[str, Any]):
+    baseline_seconds = result["baseline_seconds"]
+    if baseline_seconds is None:
+        baseline = f"{'skipped':>12}"
+        speedup = ""
+    else:
+        baseline = f"{baseline_seconds:10.2f} s"
+        speedup = f"{baseline_seconds / result['seconds']:9.1f}x"
+    print(
+        f"{result['guides']:>10} guides {result['anchors']:>10} anchors {baseline}{result['seconds']:10.2f} s{speedup}"
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m sekai.benchmarks.guides", description="Benchmark matching guide anchors."
+    )
+    parser.add_argument(
+        "--count", action="append", type=int, help="Number of guides, may be repeated (default: 10k, 100k and 1M)"
+    )
+    parser.add_argument("--overlap", type=int, default=50, help="Average number of guides at each beat")
+    parser.add_argument(
+        "--baseline-limit",
+        type=int,
+        default=DEFAULT_COUNTS[-1],
+        help="Largest number of guides to also run through the linear matcher",
+    )
+    parser.add_argument("-o", "--output", type=Path, help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "overlap": args.overlap,
+        "counts": [],
+    }
+    print(f"{'':>17} {'':>18} {'linear':>12}{'indexed':>12}")
+    for count in args.count or DEFAULT_COUNTS:
+        result = benchmark_count(count, args.overlap, count <= args.baseline_limit)
+        results["counts"].append(result)
+        print_result(result)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
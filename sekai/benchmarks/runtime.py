@@ -0,0 +1,185 @@
+"""Run engine callbacks outside of Sonolus for benchmarking.
+
+Callbacks are compiled the same way a build compiles them and run with sonolus-py's node interpreter against simulated
+entity blocks. Cost is reported as the number of nodes evaluated, which is what the Sonolus runtime spends its time on,
+so it's comparable across machines and commits, unlike wall time in an interpreter written in Python.
+"""
+
+from collections.abc import Callable
+from typing import Any, cast
+
+from sonolus.backend.blocks import PlayBlock, WatchBlock
+from sonolus.backend.finalize import cfg_to_engine_node
+from sonolus.backend.interpret import Interpreter
+from sonolus.backend.mode import Mode
+from sonolus.backend.node import EngineNode, FunctionNode
+from sonolus.backend.ops import Op
+from sonolus.backend.optimize.optimize import STANDARD_PASSES
+from sonolus.backend.optimize.passes import OptimizerConfig, run_passes
+from sonolus.build.compile import callback_to_cfg
+from sonolus.build.engine import build_engine_configuration
+from sonolus.script.archetype import (
+    _ENTITY_DATA_SIZE,
+    _ENTITY_MEMORY_SIZE,
+    _ENTITY_SHARED_MEMORY_SIZE,
+    PlayEntityInfo,
+    WatchEntityInfo,
+    _BaseArchetype,
+)
+from sonolus.script.internal.context import ModeContextState, ProjectContextState
+
+from sekai.lib.options import Options
+from sekai.lib.ui import ui_config
+
+RUNTIME_UPDATE_TIME = 0
+
+
+class CountingInterpreter(Interpreter):
+    """A node interpreter that counts the nodes it evaluates and implements timing for a constant bpm."""
+
+    def __init__(self, bpm: float):
+        super().__init__()
+        self.bpm = bpm
+        self.evaluated = 0
+        self.block_values: dict[int, list[float]] = {}
+
+    def run(self, node: EngineNode) -> float:
+        self.evaluated += 1
+        if isinstance(node, FunctionNode):
+            match node.func:
+                case Op.BeatToTime:
+                    return self.run(node.args[0]) * 60 / self.bpm
+                case Op.BeatToBPM:
+                    self.run(node.args[0])
+                    return self.bpm
+        return super().run(node)
+
+    # The base interpreter caps indices at what fits in a single block, which entity arrays outgrow on large levels, so
+    # blocks are kept here instead.
+
+    def get(self, block: float, index: float) -> float:
+        values = self.block_values.setdefault(int(block), [])
+        index = int(index)
+        if index >= len(values):
+            values.extend([-1.0] * (index - len(values) + 1))
+        return values[index]
+
+    def set(self, block: float, index: float, value: float):
+        values = self.block_values.setdefault(int(block), [])
+        index = int(index)
+        if index >= len(values):
+            values.extend([-1.0] * (index - len(values) + 1))
+        values[index] = value
+        return value
+
+
+class EngineHarness:
+    """Compiles and runs callbacks of a mode's archetypes against simulated entities.
+
+    Entity 0 is left empty, since refs to it mean no entity.
+    """
+
+    def __init__(self, mode: Mode, archetypes: list[type[_BaseArchetype]], bpm: float = 60.0):
+        self.mode = mode
+        self.blocks = {Mode.PLAY: PlayBlock, Mode.WATCH: WatchBlock}[mode]
+        self.info_size = {Mode.PLAY: PlayEntityInfo, Mode.WATCH: WatchEntityInfo}[mode]._size_()
+        self.project_state = ProjectContextState()
+        self.mode_state = ModeContextState(mode, archetypes)
+        for archetype in archetypes:
+            archetype._init_fields()
+        self.archetype_ids = self.mode_state.archetypes
+        self.interpreter = CountingInterpreter(bpm)
+        self.entity_count = 1
+        self.entity_memory: dict[int, list[float]] = {}
+        self.compiled: dict[Any, EngineNode] = {}
+        for i, default in enumerate(get_option_defaults()):
+            self.interpreter.set(self.blocks.LevelOption, i, default)
+
+    def set_option(self, name: str, value: float):
+        # Options are stored in the order they're declared in.
+        index = list(Options.__annotations__).index(name)
+        self.interpreter.set(self.blocks.LevelOption, index, float(value))
+
+    def compile(self, callback: Callable, callback_name: str, archetype: type[_BaseArchetype] | None = None):
+        key = (callback, callback_name, archetype)
+        if key not in self.compiled:
+            cfg = callback_to_cfg(self.project_state, self.mode_state, callback, callback_name, archetype)
+            cfg = run_passes(cfg, STANDARD_PASSES, OptimizerConfig(mode=self.mode, callback=callback_name))
+            self.compiled[key] = cfg_to_engine_node(cfg)
+        return self.compiled[key]
+
+    def compile_callback(self, archetype: type[_BaseArchetype], py_name: str) -> EngineNode:
+        return self.compile(archetype._callbacks_[py_name], archetype._supported_callbacks_[py_name].name, archetype)
+
+    def add_entity(self, archetype: type[_BaseArchetype], **data: float) -> int:
+        index = self.entity_count
+        self.entity_count += 1
+        info = [index, self.archetype_ids[archetype], 0]
+        for i, value in enumerate(info[: self.info_size]):
+            self.interpreter.set(self.blocks.EntityInfoArray, index * self.info_size + i, value)
+        for i in range(_ENTITY_DATA_SIZE):
+            self.interpreter.set(self.blocks.EntityDataArray, index * _ENTITY_DATA_SIZE + i, 0.0)
+        for i in range(_ENTITY_SHARED_MEMORY_SIZE):
+            self.interpreter.set(self.blocks.EntitySharedMemoryArray, index * _ENTITY_SHARED_MEMORY_SIZE + i, 0.0)
+        self.entity_memory[index] = [0.0] * _ENTITY_MEMORY_SIZE
+        for name, value in data.items():
+            self.set_field(archetype, index, name, value)
+        return index
+
+    def field_place(self, archetype: type[_BaseArchetype], index: int, name: str) -> tuple[Any, int]:
+        if name in archetype._imported_fields_:
+            return self.blocks.EntityDataArray, index * _ENTITY_DATA_SIZE + archetype._imported_fields_[name].offset
+        if name in archetype._shared_memory_fields_:
+            field = archetype._shared_memory_fields_[name]
+            return self.blocks.EntitySharedMemoryArray, index * _ENTITY_SHARED_MEMORY_SIZE + field.offset
+        raise KeyError(f"{archetype.__name__} has no entity data or shared memory field {name!r}")
+
+    def set_field(self, archetype: type[_BaseArchetype], index: int, name: str, value: float):
+        self.interpreter.set(*self.field_place(archetype, index, name), float(value))
+
+    def get_field(self, archetype: type[_BaseArchetype], index: int, name: str) -> float:
+        return self.interpreter.get(*self.field_place(archetype, index, name))
+
+    def run(self, node: EngineNode, index: int = 0, time: float = 0.0) -> tuple[float, int]:
+        """Run a compiled callback as the given entity at the given time.
+
+        Returns the callback's result and the number of nodes evaluated.
+        """
+        interpreter = self.interpreter
+        for i, value in enumerate(self.project_state.rom.values):
+            interpreter.set(self.blocks.EngineRom, i, value)
+        interpreter.set(self.blocks.RuntimeUpdate, RUNTIME_UPDATE_TIME, time)
+        self.copy_entity_blocks(index, into_current=True)
+        start = interpreter.evaluated
+        result = interpreter.run(node)
+        evaluated = interpreter.evaluated - start
+        self.copy_entity_blocks(index, into_current=False)
+        return result, evaluated
+
+    def copy_entity_blocks(self, index: int, into_current: bool):
+        if index <= 0:
+            return
+        interpreter = self.interpreter
+        for current, array, size in (
+            (self.blocks.EntityData, self.blocks.EntityDataArray, _ENTITY_DATA_SIZE),
+            (self.blocks.EntitySharedMemory, self.blocks.EntitySharedMemoryArray, _ENTITY_SHARED_MEMORY_SIZE),
+            (self.blocks.EntityInfo, self.blocks.EntityInfoArray, self.info_size),
+        ):
+            for i in range(size):
+                if into_current:
+                    interpreter.set(current, i, interpreter.get(array, index * size + i))
+                elif current is not self.blocks.EntityInfo:
+                    interpreter.set(array, index * size + i, interpreter.get(current, i))
+        memory = self.entity_memory[index]
+        for i in range(_ENTITY_MEMORY_SIZE):
+            if into_current:
+                interpreter.set(self.blocks.EntityMemory, i, memory[i])
+            else:
+                memory[i] = interpreter.get(self.blocks.EntityMemory, i)
+
+
+def get_option_defaults() -> list[float]:
+    # The engine configuration lists options in the order they're declared in, which is their order in the level option
+    # block too.
+    configuration = cast(dict[str, Any], build_engine_configuration(Options, ui_config))
+    return [float(option["def"]) for option in configuration["options"]]
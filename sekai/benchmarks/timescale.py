@@ -0,0 +1,209 @@
+"""Benchmark timescale lookups on groups of different sizes.
+
+Usage:
+    python -m sekai.benchmarks.timescale [--changes N]... [--output PATH] [--compare PATH]
+
+Each case is a single timescale group with the given number of changes, queried through the compiled engine code (see
+sekai.benchmarks.runtime). Costs are nodes evaluated per query:
+
+- idle: the group's per-frame update while nothing reads from the group.
+- playback: the group's per-frame update with time moving forward frame by frame, with the group read from throughout.
+- shared: the per-frame update of a second group with the same changes as the first, apart from hide_notes.
+- seek: the same update at random times, as after a seek or a restart.
+- scrub: the same update in watch mode along a scripted scrub: dragging back through the whole chart, then jumping to
+  random times, nudging back a frame at a time and playing on from there.
+- inverse: scaled time to first time lookups at random scaled times.
+- spawn: visual spawn time lookups at sorted random scaled times, as notes do in level order when they preprocess.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+from math import inf
+from pathlib import Path
+from typing import Any
+
+from sonolus.backend.mode import Mode
+from sonolus.script.runtime import time
+from sonolus.script.timing import TimescaleEase
+
+from sekai.benchmarks.converter import get_commit
+from sekai.benchmarks.runtime import EngineHarness
+from sekai.lib.note import get_visual_spawn_time
+from sekai.lib.timescale import group_scaled_time_to_first_time, mark_timescale_group_active
+from sekai.play.mode import play_mode
+from sekai.play.timescale import TimescaleChange, TimescaleGroup
+from sekai.watch.mode import watch_mode
+from sekai.watch.timescale import WatchTimescaleChange, WatchTimescaleGroup
+
+RESULTS_VERSION = 1
+
+DEFAULT_CHANGE_COUNTS = (10, 1000, 10000)
+CHANGE_INTERVAL = 0.05
+FRAME_TIME = 1 / 60
+PLAYBACK_FRAMES = 600
+RANDOM_QUERIES = 50
+SPAWN_QUERIES = 200
+SCRUB_DRAG_STEPS = 200
+SCRUB_NUDGE_FRAMES = 30
+SCRUB_RESUME_FRAMES = 30
+
+# Notes look up scaled times of the group at index 1, which is where every case puts its group.
+QUERY_GROUP = 1
+
+
+def inverse_query() -> float:
+    return group_scaled_time_to_first_time(QUERY_GROUP, time())
+
+
+def spawn_query() -> float:
+    return get_visual_spawn_time(QUERY_GROUP, time())
+
+
+def mark_query_group_active():
+    mark_timescale_group_active(QUERY_GROUP, -inf, inf)
+
+
+def build_group(
+    harness: EngineHarness,
+    change_count: int,
+    seed: int,
+    group_archetype: type[TimescaleGroup | WatchTimescaleGroup] = TimescaleGroup,
+    change_archetype: type[TimescaleChange | WatchTimescaleChange] = TimescaleChange,
+) -> int:
+    rng = random.Random(seed)
+    group = harness.add_entity(group_archetype)
+    previous = group
+    for i in range(change_count):
+        change = harness.add_entity(
+            change_archetype,
+            beat=i * CHANGE_INTERVAL,
+            timescale=rng.choice([0.5, 1.0, 1.0, 1.5, 2.0]),
+            timescale_skip=rng.choice([0.0, 0.0, 0.0, 0.1]),
+            timescale_ease=rng.choice([TimescaleEase.NONE, TimescaleEase.NONE, TimescaleEase.LINEAR]),
+            timescale_group=group,
+        )
+        harness.set_field(
+            group_archetype if previous == group else change_archetype,
+            previous,
+            "first_ref" if previous == group else "next_ref",
+            change,
+        )
+        previous = change
+    return group
+
+
+def scrub_times(duration: float, rng: random.Random) -> list[float]:
+    times = [duration - duration * step / SCRUB_DRAG_STEPS for step in range(SCRUB_DRAG_STEPS + 1)]
+    for _ in range(RANDOM_QUERIES):
+        start = rng.uniform(0, duration)
+        times.extend(start - frame * FRAME_TIME for frame in range(SCRUB_NUDGE_FRAMES))
+        start -= SCRUB_NUDGE_FRAMES * FRAME_TIME
+        times.extend(start + frame * FRAME_TIME for frame in range(SCRUB_RESUME_FRAMES))
+    return times
+
+
+def benchmark_scrub(change_count: int, seed: int) -> list[int]:
+    harness = EngineHarness(Mode.WATCH, watch_mode.archetypes, bpm=60.0)
+    group = build_group(harness, change_count, seed, WatchTimescaleGroup, WatchTimescaleChange)
+    harness.run(harness.compile_callback(WatchTimescaleGroup, "preprocess"), group)
+    harness.run(harness.compile(mark_query_group_active, "preprocess"))
+    update = harness.compile_callback(WatchTimescaleGroup, "update_sequential")
+    times = scrub_times(change_count * CHANGE_INTERVAL, random.Random(seed))
+    return [harness.run(update, group, t)[1] for t in times]
+
+
+def benchmark_case(change_count: int, seed: int) -> dict[str, Any]:
+    # The chart runs at 60 bpm, so beats are seconds.
+    harness = EngineHarness(Mode.PLAY, play_mode.archetypes, bpm=60.0)
+    group = build_group(harness, change_count, seed)
+    rng = random.Random(seed)
+    assert group == QUERY_GROUP
+    duration = change_count * CHANGE_INTERVAL
+
+    _, preprocess_cost = harness.run(harness.compile_callback(TimescaleGroup, "preprocess"), group)
+    shared_group = build_group(harness, change_count, seed)
+    harness.run(harness.compile_callback(TimescaleGroup, "preprocess"), shared_group)
+
+    update = harness.compile_callback(TimescaleGroup, "update_sequential")
+    playback_start = duration / 2
+    idle = [harness.run(update, group, playback_start + frame * FRAME_TIME)[1] for frame in range(PLAYBACK_FRAMES)]
+    harness.run(harness.compile(mark_query_group_active, "preprocess"))
+    harness.run(harness.compile(lambda: mark_timescale_group_active(shared_group, -inf, inf), "preprocess"))
+    playback = [harness.run(update, group, playback_start + frame * FRAME_TIME)[1] for frame in range(PLAYBACK_FRAMES)]
+    shared = [
+        harness.run(update, shared_group, playback_start + frame * FRAME_TIME)[1] for frame in range(PLAYBACK_FRAMES)
+    ]
+    seek = [harness.run(update, group, rng.uniform(0, duration))[1] for _ in range(RANDOM_QUERIES)]
+
+    inverse_node = harness.compile(inverse_query, "preprocess")
+    max_scaled_time = harness.get_field(TimescaleGroup, group, "current_scaled_time")
+    harness.run(update, group, duration)
+    max_scaled_time = max(max_scaled_time, harness.get_field(TimescaleGroup, group, "current_scaled_time"))
+    inverse = [harness.run(inverse_node, 0, rng.uniform(0, max_scaled_time))[1] for _ in range(RANDOM_QUERIES)]
+    spawn_node = harness.compile(spawn_query, "preprocess")
+    spawn = [
+        harness.run(spawn_node, 0, scaled_time)[1]
+        for scaled_time in sorted(rng.uniform(0, max_scaled_time) for _ in range(SPAWN_QUERIES))
+    ]
+    scrub = benchmark_scrub(change_count, seed)
+
+    return {
+        "changes": change_count,
+        "preprocess": preprocess_cost,
+        "queries": {
+            name: {"mean": statistics.fmean(costs), "max": max(costs)}
+            for name, costs in (
+                ("idle", idle),
+                ("playback", playback),
+                ("shared", shared),
+                ("seek", seek),
+                ("scrub", scrub),
+                ("inverse", inverse),
+                ("spawn", spawn),
+            )
+        },
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m sekai.benchmarks.timescale", description="Benchmark timescale lookups."
+    )
+    parser.add_argument("--changes", action="append", type=int, help="Number of changes in the group, may be repeated")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("-o", "--output", type=Path, help="Write results as JSON to this path")
+    parser.add_argument("--compare", type=Path, help="JSON results of a previous run to compare against")
+    args = parser.parse_args(argv)
+
+    baseline_cases = {}
+    if args.compare:
+        baseline_cases = {
+            case["changes"]: case for case in json.loads(args.compare.read_text(encoding="utf-8"))["cases"]
+        }
+    results = {"version": RESULTS_VERSION, "commit": get_commit(), "seed": args.seed, "cases": []}
+    print(f"{'changes':>8}{'query':>12}{'mean nodes':>14}{'max nodes':>12}")
+    for change_count in args.changes or DEFAULT_CHANGE_COUNTS:
+        result = benchmark_case(change_count, args.seed)
+        results["cases"].append(result)
+        baseline = baseline_cases.get(change_count)
+        rows = [("preprocess", {"mean": result["preprocess"], "max": result["preprocess"]}), *result["queries"].items()]
+        for name, costs in rows:
+            line = f"{change_count:>8}{name:>12}{costs['mean']:>14.1f}{costs['max']:>12}"
+            if baseline:
+                if name == "preprocess":
+                    line += f"{costs['mean'] / max(baseline['preprocess'], 1):>9.3f}x"
+                elif name in baseline["queries"]:
+                    line += f"{costs['mean'] / max(baseline['queries'][name]['mean'], 1):>9.3f}x"
+            print(line)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Batch-convert exported PJSekai extended levels.
+
+Usage:
+    python -m sekai.convert INPUT OUTPUT [--jobs N]
+
+INPUT is either a .scp archive or a directory laid out like the resources folder, i.e. containing .scp files and/or
+levels/<name>/item.json with the level's data next to it. Converted levels are written to OUTPUT in the same
+levels/<name> layout, and levels that need no conversion are copied unchanged, so the output can be used as a resources
+folder directly.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from sonolus.build.collection import Collection
+from sonolus.build.level import package_level_data
+from sonolus.script.level import parse_external_level_data
+
+from sekai.lib.converter import (
+    ColumnarPJSekaiExtendedLevelData,
+    ConversionReport,
+    Diagnostic,
+    InvalidLevelDataError,
+    convert_pjsekai_extended_entities,
+    convert_pjsekai_extended_level_data,
+)
+
+
+class ConversionResult(NamedTuple):
+    name: str
+    input_entities: int
+    output_entities: int
+    duration: float
+    data: bytes | None
+    error: str | None
+    report: ConversionReport
+    diagnostics: tuple[Diagnostic, ...] = ()
+
+
+def load_levels(path: Path) -> Collection:
+    collection = Collection()
+    if path.is_dir():
+        for scp_path in sorted(path.rglob("*.scp")):
+            collection.load_from_scp(scp_path)
+        collection.load_from_source(path)
+    else:
+        collection.load_from_scp(path)
+    return collection
+
+
+def convert_level(
+    name: str,
+    packaged_data: bytes,
+    compact_timescales: bool = False,
+    prune_unreferenced: bool = False,
+    columnar: bool = False,
+) -> ConversionResult:
+    start_time = time.perf_counter()
+    input_entities = 0
+    report = ConversionReport()
+    try:
+        if columnar:
+            # Skip building a dict per source entity, which matters for memory use on large levels.
+            pjsekai_data, bgm_offset = ColumnarPJSekaiExtendedLevelData.from_packaged(packaged_data)
+            input_entities = len(pjsekai_data.entities)
+            level_data = convert_pjsekai_extended_entities(
+                pjsekai_data,
+                bgm_offset,
+                compact_timescales=compact_timescales,
+                prune_unreferenced=prune_unreferenced,
+                report=report,
+            )
+        else:
+            data = parse_external_level_data(packaged_data)
+            input_entities = len(data.entities)
+            level_data = convert_pjsekai_extended_level_data(
+                data, compact_timescales=compact_timescales, prune_unreferenced=prune_unreferenced, report=report
+            )
+        if level_data is None:
+            return ConversionResult(name, input_entities, 0, time.perf_counter() - start_time, None, None, report)
+        return ConversionResult(
+            name,
+            input_entities,
+            len(level_data.entities),
+            time.perf_counter() - start_time,
+            package_level_data(level_data),
+            None,
+            report,
+        )
+    except InvalidLevelDataError as e:
+        return ConversionResult(
+            name,
+            input_entities,
+            0,
+            time.perf_counter() - start_time,
+            None,
+            f"{len(e.diagnostics)} problem(s) in level data",
+            report,
+            tuple(e.diagnostics),
+        )
+    except Exception as e:
+        return ConversionResult(
+            name, input_entities, 0, time.perf_counter() - start_time, None, f"{type(e).__name__}: {e}", report
+        )
+
+
+def write_level(output_dir: Path, collection: Collection, item: dict[str, Any], data: bytes):
+    level_dir = output_dir / "levels" / item["name"]
+    level_dir.mkdir(parents=True, exist_ok=True)
+    item = dict(item)
+    for key, value in list(item.items()):
+        if isinstance(value, dict) and "hash" in value:
+            del item[key]
+            if key != "data" and value["hash"] in collection.repository:
+                (level_dir / key).write_bytes(collection.repository[value["hash"]])
+    (level_dir / "data").write_bytes(data)
+    (level_dir / "item.json").write_text(json.dumps(item, ensure_ascii=False), encoding="utf-8")
+
+
+def positive_int(value: str) -> int:
+    result = int(value)
+    if result < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {result}")
+    return result
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m sekai.convert", description="Batch-convert PJSekai extended levels."
+    )
+    parser.add_argument("input", type=Path, help="A .scp archive or a directory of exported levels")
+    parser.add_argument("output", type=Path, help="Directory to write converted levels to")
+    parser.add_argument(
+        "-j", "--jobs", type=positive_int, default=os.cpu_count() or 1, help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--compact-timescales",
+        action="store_true",
+        help="Merge no-op timescale changes and fold identical timescale groups",
+    )
+    parser.add_argument(
+        "--prune-unreferenced",
+        action="store_true",
+        help="Drop anchors and timescale changes that no other entity references",
+    )
+    parser.add_argument(
+        "--columnar",
+        action="store_true",
+        help="Load source levels into compact columns instead of per-entity dicts",
+    )
+    args = parser.parse_args(argv)
+
+    collection = load_levels(args.input)
+    levels = {name: details["item"] for name, details in sorted(collection.categories.get("levels", {}).items())}
+    names = list(levels)
+    packaged_data = [collection.repository[levels[name]["data"]["hash"]] for name in names]
+
+    start_time = time.perf_counter()
+    converted = skipped = failed = total_entities = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        # map preserves input order, so the report and output are deterministic regardless of scheduling.
+        results = executor.map(
+            convert_level,
+            names,
+            packaged_data,
+            [args.compact_timescales] * len(names),
+            [args.prune_unreferenced] * len(names),
+            [args.columnar] * len(names),
+        )
+        for source_data, result in zip(packaged_data, results, strict=True):
+            if result.error is not None:
+                failed += 1
+                print(f"FAIL {result.name} ({result.input_entities} entities): {result.error}", file=sys.stderr)
+                for diagnostic in result.diagnostics:
+                    print(f"     {diagnostic}", file=sys.stderr)
+                continue
+            if result.data is None:
+                skipped += 1
+                write_level(args.output, collection, levels[result.name], source_data)
+                print(f"SKIP {result.name} ({result.input_entities} entities): no conversion needed, copied as is")
+                continue
+            converted += 1
+            total_entities += result.output_entities
+            write_level(args.output, collection, levels[result.name], result.data)
+            details = ""
+            if args.compact_timescales:
+                details += f", {result.report.removed_timescale_entities} timescale entities compacted"
+            if args.prune_unreferenced:
+                details += f", {result.report.pruned_entities} entities pruned"
+            print(
+                f"OK   {result.name} ({result.input_entities} -> {result.output_entities} entities{details}) "
+                f"in {result.duration:.2f}s"
+            )
+    duration = time.perf_counter() - start_time
+
+    print(
+        f"{len(names)} levels: {converted} converted, {skipped} skipped, {failed} failed; "
+        f"{total_entities} entities in {duration:.2f}s ({total_entities / max(duration, 1e-9):.0f} entities/s, "
+        f"{args.jobs} jobs)"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,19 @@
 from enum import IntEnum
-from math import ceil, cos, pi
+from math import ceil, cos, floor, pi
 from typing import Literal, assert_never
 
 from sonolus.script.archetype import EntityRef
+from sonolus.script.array import Array, Dim
+from sonolus.script.containers import VarArray
+from sonolus.script.debug import debug_log, runtime_checks_enabled
 from sonolus.script.easing import ease_out_cubic
 from sonolus.script.effect import Effect, LoopedEffectHandle
+from sonolus.script.globals import level_memory
 from sonolus.script.interval import clamp, lerp, remap, remap_clamped, unlerp_clamped
 from sonolus.script.particle import Particle, ParticleHandle
 from sonolus.script.quad import Quad, QuadLike
 from sonolus.script.record import Record
-from sonolus.script.runtime import time
+from sonolus.script.runtime import delta_time, time
 from sonolus.script.sprite import Sprite
 from sonolus.script.timing import beat_to_time
 
@@ -24,14 +28,16 @@ from sekai.lib.layer import (
 )
 from sekai.lib.layout import (
     CONNECTOR_APPROACH_CUTOFF,
+    DynamicLayout,
     Layout,
     approach,
     get_alpha,
+    get_visible_lane_range,
     iter_slot_lanes,
     layout_circular_effect,
     layout_hitbox,
     layout_linear_effect,
-    layout_slide_connector_segment,
+    layout_slide_connector_strip,
     layout_slot_glow_effect,
     transformed_vec_at,
 )
@@ -57,6 +63,27 @@ from sekai.lib.timescale import iter_timescale_changes_in_group_after_time_inclu
 CONNECTOR_TRAIL_SPAWN_PERIOD = 0.1
 CONNECTOR_SLOT_SPAWN_PERIOD = 0.2
 
+# Fits in a connector's entity memory, and is enough for a curve a few times as tall as the screen.
+CONNECTOR_TESSELLATION_MAX_SEGMENTS = 48
+# One more than the max segments, as a literal type so it can size arrays.
+CONNECTOR_TESSELLATION_SAMPLE_COUNT = Literal[49]
+
+# How far, in pixels of a 1080p screen, adaptively split connectors may stray from the true curve at 100% quality.
+CONNECTOR_SCREEN_TOLERANCE = 2
+CONNECTOR_SCREEN_TOLERANCE_REFERENCE_HEIGHT = 1080
+# How much the alpha of an adaptively split connector may change across a segment at 100% quality.
+CONNECTOR_ALPHA_TOLERANCE = 0.08
+CONNECTOR_ADAPTIVE_MAX_SEGMENTS = 32
+# One more than the max segments, as a literal type so it can size arrays.
+CONNECTOR_ADAPTIVE_SPLIT_COUNT = Literal[33]
+# Shared between the connectors drawn each frame, so dense charts are split more coarsely rather than dropping frames.
+CONNECTOR_FRAME_SEGMENT_BUDGET = 512
+# How many quads connectors should draw each frame between them, see update_connector_draw_budget.
+CONNECTOR_FRAME_QUAD_BUDGET = 1500
+CONNECTOR_MIN_QUALITY_SCALE = 0.2
+# How long it takes quality to get halfway to where the budget wants it.
+CONNECTOR_QUALITY_SCALE_HALF_LIFE = 0.25
+
 
 class ConnectorKind(IntEnum):
     NONE = 0
@@ -273,35 +300,14 @@ def apply_guide_alpha_curve(a: float) -> float:
     return a
 
 
-def draw_connector(
+def adjust_connector_shape(
     kind: ConnectorKind,
-    visual_state: ConnectorVisualState,
     ease_type: EaseType,
     head_lane: float,
     head_size: float,
-    head_progress: float,
-    head_target_time: float,
-    head_ease_frac: float,
-    head_is_segment_head: bool,
     tail_lane: float,
     tail_size: float,
-    tail_progress: float,
-    tail_target_time: float,
-    tail_ease_frac: float,
-    tail_is_segment_tail: bool,
-    segment_head_target_time: float,
-    segment_head_lane: float,
-    segment_head_alpha: float,
-    segment_tail_target_time: float,
-    segment_tail_alpha: float,
-):
-    if time() < head_target_time and (
-        (head_progress < Layout.progress_start and tail_progress < Layout.progress_start)
-        or (head_progress > Layout.progress_cutoff and tail_progress > Layout.progress_cutoff)
-        or head_progress == tail_progress
-    ):
-        return
-
+) -> tuple[float, float, float, float]:
     if ease_type == EaseType.NONE:
         tail_lane = head_lane
         tail_size = head_size
@@ -324,6 +330,515 @@ def draw_connector(
         case _:
             assert_never(Options.slide_mod)
 
+    return head_lane, head_size, tail_lane, tail_size
+
+
+class ConnectorTessellation(Record):
+    """How far a connector has eased from its head to its tail, sampled at even steps from head to tail.
+
+    The lanes and sizes along a connector don't change after preprocessing, only which part of it is on screen does,
+    so frames draw a segment between each pair of samples in view instead of working out how finely to split the
+    connector and easing each split. A segment count of 0 means the connector is split each frame instead.
+    """
+
+    segment_count: int
+    interp_fracs: Array[float, Dim[CONNECTOR_TESSELLATION_SAMPLE_COUNT]]
+
+    def interp_frac_at(self, frac: float) -> float:
+        x = frac * self.segment_count
+        i = int(clamp(floor(x), 0, self.segment_count - 1))
+        return lerp(self.interp_fracs[i], self.interp_fracs[i + 1], x - i)
+
+
+@level_memory
+class ConnectorDrawBudget:
+    """Keeps the quads connectors draw each frame within CONNECTOR_FRAME_QUAD_BUDGET by lowering their quality.
+
+    Connectors reserve what they'd draw at full quality as they update, and the quality each frame is scaled by how far
+    the previous frame's reservations went over the budget. Active slides get the budget first and guides get what's
+    left, and draw_connector lowers quality further for connectors far from the judge line.
+    """
+
+    # Counted by connectors as they update each frame, so each knows its share of the segment budget by the time it's
+    # drawn.
+    connector_count: int
+    active_demand: float
+    guide_demand: float
+    active_scale: float
+    guide_scale: float
+    # The lowest guide_scale so far, only kept when runtime checks are enabled.
+    min_guide_scale: float
+
+
+def init_connector_draw_budget():
+    ConnectorDrawBudget.active_scale = 1.0
+    ConnectorDrawBudget.guide_scale = 1.0
+    ConnectorDrawBudget.min_guide_scale = 1.0
+
+
+def update_connector_draw_budget():
+    """Move the quality scales toward what last frame's reservations call for and start counting this frame's.
+
+    When the guide scale drops below any it has before and runtime checks are enabled, as they are in dev, the active
+    and guide scales are written to the debug log, in that order.
+    """
+    active_target = clamp(
+        CONNECTOR_FRAME_QUAD_BUDGET / max(ConnectorDrawBudget.active_demand, 1e-6), CONNECTOR_MIN_QUALITY_SCALE, 1
+    )
+    guide_budget = max(CONNECTOR_FRAME_QUAD_BUDGET - ConnectorDrawBudget.active_demand * active_target, 0)
+    guide_target = clamp(guide_budget / max(ConnectorDrawBudget.guide_demand, 1e-6), CONNECTOR_MIN_QUALITY_SCALE, 1)
+    # Time can go backwards when seeking in watch mode.
+    smoothing = 0.5 ** (max(delta_time(), 0) / CONNECTOR_QUALITY_SCALE_HALF_LIFE)
+    ConnectorDrawBudget.active_scale = lerp(active_target, ConnectorDrawBudget.active_scale, smoothing)
+    ConnectorDrawBudget.guide_scale = lerp(guide_target, ConnectorDrawBudget.guide_scale, smoothing)
+    ConnectorDrawBudget.connector_count = 0
+    ConnectorDrawBudget.active_demand = 0
+    ConnectorDrawBudget.guide_demand = 0
+    if runtime_checks_enabled() and ConnectorDrawBudget.guide_scale < ConnectorDrawBudget.min_guide_scale - 0.05:
+        ConnectorDrawBudget.min_guide_scale = ConnectorDrawBudget.guide_scale
+        debug_log(ConnectorDrawBudget.active_scale)
+        debug_log(ConnectorDrawBudget.guide_scale)
+
+
+def reserve_connector_draw_budget(kind: ConnectorKind, quads: float):
+    """Reserve the quads a connector would draw this frame at full quality, going by what it drew last frame."""
+    if Options.adaptive_connector_tessellation:
+        ConnectorDrawBudget.connector_count += 1
+    match kind:
+        case (
+            ConnectorKind.ACTIVE_NORMAL
+            | ConnectorKind.ACTIVE_CRITICAL
+            | ConnectorKind.ACTIVE_FAKE_NORMAL
+            | ConnectorKind.ACTIVE_FAKE_CRITICAL
+        ):
+            ConnectorDrawBudget.active_demand += quads
+        case (
+            ConnectorKind.NONE
+            | ConnectorKind.GUIDE_NEUTRAL
+            | ConnectorKind.GUIDE_RED
+            | ConnectorKind.GUIDE_GREEN
+            | ConnectorKind.GUIDE_BLUE
+            | ConnectorKind.GUIDE_YELLOW
+            | ConnectorKind.GUIDE_PURPLE
+            | ConnectorKind.GUIDE_CYAN
+            | ConnectorKind.GUIDE_BLACK
+        ):
+            ConnectorDrawBudget.guide_demand += quads
+        case _:
+            assert_never(kind)
+
+
+def get_connector_quality_scale(kind: ConnectorKind) -> float:
+    """Get how much the draw budget scales the quality of connectors of a kind this frame, from 0 to 1."""
+    match kind:
+        case (
+            ConnectorKind.ACTIVE_NORMAL
+            | ConnectorKind.ACTIVE_CRITICAL
+            | ConnectorKind.ACTIVE_FAKE_NORMAL
+            | ConnectorKind.ACTIVE_FAKE_CRITICAL
+        ):
+            return ConnectorDrawBudget.active_scale
+        case (
+            ConnectorKind.NONE
+            | ConnectorKind.GUIDE_NEUTRAL
+            | ConnectorKind.GUIDE_RED
+            | ConnectorKind.GUIDE_GREEN
+            | ConnectorKind.GUIDE_BLUE
+            | ConnectorKind.GUIDE_YELLOW
+            | ConnectorKind.GUIDE_PURPLE
+            | ConnectorKind.GUIDE_CYAN
+            | ConnectorKind.GUIDE_BLACK
+        ):
+            return ConnectorDrawBudget.guide_scale
+        case _:
+            assert_never(kind)
+
+
+def get_connector_segment_limit() -> int:
+    share = floor(CONNECTOR_FRAME_SEGMENT_BUDGET / max(ConnectorDrawBudget.connector_count, 1))
+    return int(clamp(share, 1, CONNECTOR_ADAPTIVE_MAX_SEGMENTS))
+
+
+class ConnectorSplit(Record):
+    frac: float
+    interp_frac: float
+
+
+class ConnectorSample(Record):
+    """A point along a connector, with its edges in lanes at the judge line."""
+
+    frac: float
+    interp_frac: float
+    travel: float
+    l: float
+    r: float
+    alpha: float
+
+    def init(
+        self,
+        frac: float,
+        ease_type: EaseType,
+        head_lane: float,
+        head_size: float,
+        head_progress: float,
+        head_target_time: float,
+        head_ease_frac: float,
+        eased_head_ease_frac: float,
+        head_alpha: float,
+        tail_lane: float,
+        tail_size: float,
+        tail_progress: float,
+        tail_target_time: float,
+        tail_ease_frac: float,
+        eased_tail_ease_frac: float,
+        tail_alpha: float,
+    ):
+        ease_frac = lerp(head_ease_frac, tail_ease_frac, frac)
+        interp_frac = unlerp_clamped(eased_head_ease_frac, eased_tail_ease_frac, ease(ease_type, ease_frac))
+        lane = lerp(head_lane, tail_lane, interp_frac)
+        size = max(1e-3, lerp(head_size, tail_size, interp_frac))
+        travel = approach(lerp(head_progress, tail_progress, frac))
+        self.frac = frac
+        self.interp_frac = interp_frac
+        self.travel = travel
+        self.l = (lane - size) * travel
+        self.r = (lane + size) * travel
+        self.alpha = lerp(head_alpha, tail_alpha, frac)
+        if Options.fade_mod != FadeMod.NONE:
+            self.alpha *= get_alpha(lerp(head_target_time, tail_target_time, frac))
+
+
+def init_connector_tessellation(
+    tessellation: ConnectorTessellation,
+    kind: ConnectorKind,
+    ease_type: EaseType,
+    head_lane: float,
+    head_size: float,
+    head_target_time: float,
+    head_ease_frac: float,
+    tail_lane: float,
+    tail_size: float,
+    tail_target_time: float,
+    tail_ease_frac: float,
+    progress_span: float,
+    segment_head_target_time: float,
+    segment_head_alpha: float,
+    segment_tail_target_time: float,
+    segment_tail_alpha: float,
+):
+    """Tessellate a connector ahead of time, as finely as draw_connector would split the part of it on screen.
+
+    The connector is laid out with its head and tail progress_span apart, and split as finely as the most demanding
+    screenful of it needs. Connectors that need more than CONNECTOR_TESSELLATION_MAX_SEGMENTS segments for that are
+    left to be split each frame.
+    """
+    tessellation.segment_count = 0
+    if kind == ConnectorKind.NONE or progress_span < 1e-6 or Options.adaptive_connector_tessellation:
+        return
+
+    head_lane, head_size, tail_lane, tail_size = adjust_connector_shape(
+        kind, ease_type, head_lane, head_size, tail_lane, tail_size
+    )
+    head_alpha = 1.0
+    tail_alpha = 1.0
+    match kind:
+        case (
+            ConnectorKind.ACTIVE_NORMAL
+            | ConnectorKind.ACTIVE_CRITICAL
+            | ConnectorKind.ACTIVE_FAKE_NORMAL
+            | ConnectorKind.ACTIVE_FAKE_CRITICAL
+        ):
+            pass
+        case (
+            ConnectorKind.GUIDE_NEUTRAL
+            | ConnectorKind.GUIDE_RED
+            | ConnectorKind.GUIDE_GREEN
+            | ConnectorKind.GUIDE_BLUE
+            | ConnectorKind.GUIDE_YELLOW
+            | ConnectorKind.GUIDE_PURPLE
+            | ConnectorKind.GUIDE_CYAN
+            | ConnectorKind.GUIDE_BLACK
+        ):
+            head_alpha = remap_clamped(
+                segment_head_target_time,
+                segment_tail_target_time,
+                segment_head_alpha,
+                segment_tail_alpha,
+                head_target_time,
+            )
+            tail_alpha = remap_clamped(
+                segment_head_target_time,
+                segment_tail_target_time,
+                segment_head_alpha,
+                segment_tail_alpha,
+                tail_target_time,
+            )
+        case _:
+            assert_never(kind)
+
+    view_end_progress = min(Layout.progress_cutoff, CONNECTOR_APPROACH_CUTOFF, 1.0)
+    view_progress = view_end_progress - Layout.progress_start
+    if view_progress < 1e-6:
+        return
+    view_count = ceil(progress_span / view_progress)
+    if view_count > CONNECTOR_TESSELLATION_MAX_SEGMENTS:
+        return
+
+    eased_head_ease_frac = ease(ease_type, head_ease_frac)
+    eased_tail_ease_frac = ease(ease_type, tail_ease_frac)
+    segments_per_frac = 0.0
+    for view_i in range(view_count):
+        # Views overlap where needed so each is a whole screen, with the last one ending at the tail.
+        head_progress = view_end_progress + min(view_i * view_progress, max(progress_span - view_progress, 0))
+        tail_progress = head_progress - progress_span
+        start_progress = view_end_progress
+        end_progress = max(tail_progress, Layout.progress_start)
+        start_frac = unlerp_clamped(head_progress, tail_progress, start_progress)
+        end_frac = unlerp_clamped(head_progress, tail_progress, end_progress)
+        start_ease_frac = lerp(head_ease_frac, tail_ease_frac, start_frac)
+        end_ease_frac = lerp(head_ease_frac, tail_ease_frac, end_frac)
+        start_interp_frac = unlerp_clamped(eased_head_ease_frac, eased_tail_ease_frac, ease(ease_type, start_ease_frac))
+        end_interp_frac = unlerp_clamped(eased_head_ease_frac, eased_tail_ease_frac, ease(ease_type, end_ease_frac))
+        start_alpha = lerp(head_alpha, tail_alpha, start_frac)
+        end_alpha = lerp(head_alpha, tail_alpha, end_frac)
+        alpha_change = abs(start_alpha - end_alpha)
+        if Options.fade_mod != FadeMod.NONE:
+            # Fading depends on where on screen the connector is, so assume it goes all the way in or out.
+            alpha_change = max(alpha_change, start_alpha, end_alpha)
+        segment_estimate = get_connector_segment_estimate(
+            kind=kind,
+            ease_type=ease_type,
+            head_lane=head_lane,
+            head_size=head_size,
+            tail_lane=tail_lane,
+            tail_size=tail_size,
+            eased_head_ease_frac=eased_head_ease_frac,
+            eased_tail_ease_frac=eased_tail_ease_frac,
+            start_ease_frac=start_ease_frac,
+            end_ease_frac=end_ease_frac,
+            start_progress=start_progress,
+            end_progress=end_progress,
+            start_travel=approach(start_progress),
+            end_travel=approach(end_progress),
+            start_lane=lerp(head_lane, tail_lane, start_interp_frac),
+            start_size=max(1e-3, lerp(head_size, tail_size, start_interp_frac)),
+            end_lane=lerp(head_lane, tail_lane, end_interp_frac),
+            end_size=max(1e-3, lerp(head_size, tail_size, end_interp_frac)),
+            alpha_change=alpha_change,
+        )
+        segments_per_frac = max(segments_per_frac, segment_estimate / max(end_frac - start_frac, 1e-6))
+
+    segment_count = max(1, ceil(segments_per_frac))
+    if segment_count > CONNECTOR_TESSELLATION_MAX_SEGMENTS:
+        return
+    tessellation.segment_count = segment_count
+    for i in range(segment_count + 1):
+        ease_frac = lerp(head_ease_frac, tail_ease_frac, i / segment_count)
+        tessellation.interp_fracs[i] = unlerp_clamped(
+            eased_head_ease_frac, eased_tail_ease_frac, ease(ease_type, ease_frac)
+        )
+
+
+def split_connector_adaptively(
+    splits: VarArray[ConnectorSplit, Dim[CONNECTOR_ADAPTIVE_SPLIT_COUNT]],
+    kind: ConnectorKind,
+    ease_type: EaseType,
+    quality: float,
+    head_lane: float,
+    head_size: float,
+    head_progress: float,
+    head_target_time: float,
+    head_ease_frac: float,
+    head_alpha: float,
+    tail_lane: float,
+    tail_size: float,
+    tail_progress: float,
+    tail_target_time: float,
+    tail_ease_frac: float,
+    tail_alpha: float,
+    start_frac: float,
+    end_frac: float,
+):
+    """Split the part of a connector in view until each segment is within a pixel or two of the curve on screen.
+
+    Segments are halved depth first from the start, so the splits come out in order. A segment is left alone once
+    it's close enough to the curve and its alpha changes little enough across it, or once the connector has used up
+    its share of the frame's segment budget, in which case the rest of it stays coarser.
+    """
+    eased_head_ease_frac = ease(ease_type, head_ease_frac)
+    eased_tail_ease_frac = ease(ease_type, tail_ease_frac)
+    # Errors are measured in lanes at the judge line, as that's what the edges of connectors are laid out in.
+    tolerance = (
+        CONNECTOR_SCREEN_TOLERANCE
+        * Layout.field_h
+        / CONNECTOR_SCREEN_TOLERANCE_REFERENCE_HEIGHT
+        / Options.zoom
+        / DynamicLayout.w_scale
+        / quality
+    )
+    alpha_tolerance = CONNECTOR_ALPHA_TOLERANCE / (get_connector_alpha_option(kind) * quality)
+    limit = get_connector_segment_limit()
+
+    start = +ConnectorSample
+    # Samples at the ends of the segments still to be looked at, with the nearest on top.
+    pending = +Array[ConnectorSample, Dim[CONNECTOR_ADAPTIVE_MAX_SEGMENTS]]
+    pending_count = 1
+    for sample, frac in ((start, start_frac), (pending[0], end_frac)):
+        sample.init(
+            frac=frac,
+            ease_type=ease_type,
+            head_lane=head_lane,
+            head_size=head_size,
+            head_progress=head_progress,
+            head_target_time=head_target_time,
+            head_ease_frac=head_ease_frac,
+            eased_head_ease_frac=eased_head_ease_frac,
+            head_alpha=head_alpha,
+            tail_lane=tail_lane,
+            tail_size=tail_size,
+            tail_progress=tail_progress,
+            tail_target_time=tail_target_time,
+            tail_ease_frac=tail_ease_frac,
+            eased_tail_ease_frac=eased_tail_ease_frac,
+            tail_alpha=tail_alpha,
+        )
+    splits.append(ConnectorSplit(frac=start.frac, interp_frac=start.interp_frac))
+    while pending_count > 0:
+        end = pending[pending_count - 1]
+        # Splitting adds a segment to those done and pending, so this also keeps pending from overflowing.
+        if len(splits) + pending_count <= limit and end.frac - start.frac > 1e-4:
+            mid = pending[pending_count]
+            mid.init(
+                frac=(start.frac + end.frac) / 2,
+                ease_type=ease_type,
+                head_lane=head_lane,
+                head_size=head_size,
+                head_progress=head_progress,
+                head_target_time=head_target_time,
+                head_ease_frac=head_ease_frac,
+                eased_head_ease_frac=eased_head_ease_frac,
+                head_alpha=head_alpha,
+                tail_lane=tail_lane,
+                tail_size=tail_size,
+                tail_progress=tail_progress,
+                tail_target_time=tail_target_time,
+                tail_ease_frac=tail_ease_frac,
+                eased_tail_ease_frac=eased_tail_ease_frac,
+                tail_alpha=tail_alpha,
+            )
+            travel_frac = unlerp_clamped(start.travel, end.travel, mid.travel)
+            error = max(
+                abs(mid.l - lerp(start.l, end.l, travel_frac)),
+                abs(mid.r - lerp(start.r, end.r, travel_frac)),
+            )
+            if (
+                error > tolerance
+                or abs(end.alpha - start.alpha) > alpha_tolerance
+                # A curve can cross back over the line between its ends, which checking the middle alone would miss.
+                or (len(splits) == 1 and pending_count == 1)
+            ):
+                pending_count += 1
+                continue
+        start @= end
+        pending_count -= 1
+        splits.append(ConnectorSplit(frac=start.frac, interp_frac=start.interp_frac))
+
+
+def get_connector_segment_estimate(
+    kind: ConnectorKind,
+    ease_type: EaseType,
+    head_lane: float,
+    head_size: float,
+    tail_lane: float,
+    tail_size: float,
+    eased_head_ease_frac: float,
+    eased_tail_ease_frac: float,
+    start_ease_frac: float,
+    end_ease_frac: float,
+    start_progress: float,
+    end_progress: float,
+    start_travel: float,
+    end_travel: float,
+    start_lane: float,
+    start_size: float,
+    end_lane: float,
+    end_size: float,
+    alpha_change: float,
+) -> float:
+    """Estimate how many segments to split the part of a connector between two points on screen into.
+
+    That's more the further the connector strays from a straight line between them on screen, and the more its alpha
+    changes between them. The estimate isn't rounded, so it can be scaled to other lengths of the connector.
+    """
+    pos_offset = 0
+    for sl, el, hl, tl in (
+        (start_lane - start_size, end_lane - end_size, head_lane - head_size, tail_lane - tail_size),
+        (start_lane + start_size, end_lane + end_size, head_lane + head_size, tail_lane + tail_size),
+    ):
+        start_ref = transformed_vec_at(sl, start_travel)
+        end_ref = transformed_vec_at(el, end_travel)
+        pos_offset_this_side = 0
+        for r in (0.25, 0.5, 0.75):
+            ease_frac = lerp(start_ease_frac, end_ease_frac, r)
+            interp_frac = unlerp_clamped(eased_head_ease_frac, eased_tail_ease_frac, ease(ease_type, ease_frac))
+            progress = lerp(start_progress, end_progress, r)
+            travel = approach(progress)
+            lane = lerp(hl, tl, interp_frac)
+            pos = transformed_vec_at(lane, travel)
+            ref_pos = lerp(start_ref, end_ref, unlerp_clamped(start_travel, end_travel, travel))
+            pos_offset_this_side += abs(pos.x - ref_pos.x)
+        pos_offset = max(pos_offset, pos_offset_this_side)
+    start_pos_y = transformed_vec_at(start_lane, start_travel).y
+    end_pos_y = transformed_vec_at(end_lane, end_travel).y
+    curve_change_scale = pos_offset**0.4 * 1.2
+    alpha_change_scale = max(
+        (alpha_change * get_connector_alpha_option(kind)) ** 0.8 * 2.5,
+        (alpha_change * get_connector_alpha_option(kind)) ** 0.5 * min(abs(start_pos_y - end_pos_y), 1) * 2.5,
+    )
+    quality = get_connector_quality_option(kind)
+    return max(curve_change_scale, alpha_change_scale) * quality * 10
+
+
+def draw_connector(
+    kind: ConnectorKind,
+    visual_state: ConnectorVisualState,
+    ease_type: EaseType,
+    head_lane: float,
+    head_size: float,
+    head_progress: float,
+    head_target_time: float,
+    head_ease_frac: float,
+    head_is_segment_head: bool,
+    tail_lane: float,
+    tail_size: float,
+    tail_progress: float,
+    tail_target_time: float,
+    tail_ease_frac: float,
+    tail_is_segment_tail: bool,
+    segment_head_target_time: float,
+    segment_head_lane: float,
+    segment_head_alpha: float,
+    segment_tail_target_time: float,
+    segment_tail_alpha: float,
+    tessellation: ConnectorTessellation | None = None,
+    quality_scale: float = 1.0,
+) -> int:
+    """Draw the part of a connector on screen, returning how many quads were drawn.
+
+    The quality is multiplied by quality_scale, and by up to as much again the further the connector is from the judge
+    line.
+    """
+    if time() < head_target_time and (
+        (head_progress < Layout.progress_start and tail_progress < Layout.progress_start)
+        or (head_progress > Layout.progress_cutoff and tail_progress > Layout.progress_cutoff)
+        or head_progress == tail_progress
+    ):
+        return 0
+
+    head_lane, head_size, tail_lane, tail_size = adjust_connector_shape(
+        kind, ease_type, head_lane, head_size, tail_lane, tail_size
+    )
+
     normal_sprite = Sprite(-1)
     active_sprite = Sprite(-1)
     match kind:
@@ -355,7 +870,7 @@ def draw_connector(
             else:
                 normal_sprite @= sprites.fallback
         case ConnectorKind.NONE:
-            return
+            return 0
         case _:
             assert_never(kind)
 
@@ -390,7 +905,7 @@ def draw_connector(
     )
 
     if time() >= tail_target_time:
-        return
+        return 0
     if time() >= head_target_time:
         head_frac = unlerp_clamped(head_target_time, tail_target_time, time())
         head_progress = remap(head_frac, 1.0, 1.0, tail_progress, 0.0)
@@ -405,12 +920,23 @@ def draw_connector(
     end_progress = clamp(tail_progress, Layout.progress_start, min(Layout.progress_cutoff, CONNECTOR_APPROACH_CUTOFF))
     start_frac = unlerp_clamped(head_progress, tail_progress, start_progress)
     end_frac = unlerp_clamped(head_progress, tail_progress, end_progress)
-    start_ease_frac = lerp(head_ease_frac, tail_ease_frac, start_frac)
-    end_ease_frac = lerp(head_ease_frac, tail_ease_frac, end_frac)
-    eased_head_ease_frac = ease(ease_type, head_ease_frac)
-    eased_tail_ease_frac = ease(ease_type, tail_ease_frac)
-    start_interp_frac = unlerp_clamped(eased_head_ease_frac, eased_tail_ease_frac, ease(ease_type, start_ease_frac))
-    end_interp_frac = unlerp_clamped(eased_head_ease_frac, eased_tail_ease_frac, ease(ease_type, end_ease_frac))
+    use_tessellation = False
+    if tessellation is not None:
+        use_tessellation = tessellation.segment_count > 0
+    start_ease_frac = 0.0
+    end_ease_frac = 0.0
+    eased_head_ease_frac = 0.0
+    eased_tail_ease_frac = 0.0
+    if tessellation is not None and use_tessellation:
+        start_interp_frac = tessellation.interp_frac_at(start_frac)
+        end_interp_frac = tessellation.interp_frac_at(end_frac)
+    else:
+        start_ease_frac = lerp(head_ease_frac, tail_ease_frac, start_frac)
+        end_ease_frac = lerp(head_ease_frac, tail_ease_frac, end_frac)
+        eased_head_ease_frac = ease(ease_type, head_ease_frac)
+        eased_tail_ease_frac = ease(ease_type, tail_ease_frac)
+        start_interp_frac = unlerp_clamped(eased_head_ease_frac, eased_tail_ease_frac, ease(ease_type, start_ease_frac))
+        end_interp_frac = unlerp_clamped(eased_head_ease_frac, eased_tail_ease_frac, ease(ease_type, end_ease_frac))
     start_travel = approach(start_progress)
     end_travel = approach(end_progress)
     start_lane = lerp(head_lane, tail_lane, start_interp_frac)
@@ -421,46 +947,90 @@ def draw_connector(
     end_alpha = lerp(head_alpha, tail_alpha, end_frac)
     start_target_time = lerp(head_target_time, tail_target_time, start_frac)
     end_target_time = lerp(head_target_time, tail_target_time, end_frac)
-
-    pos_offset = 0
-    for sl, el, hl, tl in (
-        (start_lane - start_size, end_lane - end_size, head_lane - head_size, tail_lane - tail_size),
-        (start_lane + start_size, end_lane + end_size, head_lane + head_size, tail_lane + tail_size),
-    ):
-        start_ref = transformed_vec_at(sl, start_travel)
-        end_ref = transformed_vec_at(el, end_travel)
-        pos_offset_this_side = 0
-        for r in (0.25, 0.5, 0.75):
-            ease_frac = lerp(start_ease_frac, end_ease_frac, r)
-            interp_frac = unlerp_clamped(eased_head_ease_frac, eased_tail_ease_frac, ease(ease_type, ease_frac))
-            progress = lerp(start_progress, end_progress, r)
-            travel = approach(progress)
-            lane = lerp(hl, tl, interp_frac)
-            pos = transformed_vec_at(lane, travel)
-            ref_pos = lerp(start_ref, end_ref, unlerp_clamped(start_travel, end_travel, travel))
-            pos_offset_this_side += abs(pos.x - ref_pos.x)
-        pos_offset = max(pos_offset, pos_offset_this_side)
-    start_pos_y = transformed_vec_at(start_lane, start_travel).y
-    end_pos_y = transformed_vec_at(end_lane, end_travel).y
-    curve_change_scale = pos_offset**0.4 * 1.2
-    alpha_change = abs(start_alpha - end_alpha)
-    match Options.fade_mod:
-        case FadeMod.NONE:
-            pass
-        case FadeMod.FADE_IN | FadeMod.FADE_OUT:
-            alpha_change = max(
-                alpha_change, abs(start_alpha * get_alpha(start_target_time) - end_alpha * get_alpha(end_target_time))
-            )
-        case FadeMod.FADE_IN_OUT:
-            alpha_change = max(start_alpha, end_alpha)
-    alpha_change_scale = max(
-        (alpha_change * get_connector_alpha_option(kind)) ** 0.8 * 2.5,
-        (alpha_change * get_connector_alpha_option(kind)) ** 0.5 * min(abs(start_pos_y - end_pos_y), 1) * 2.5,
-    )
-    quality = get_connector_quality_option(kind)
-    segment_count = max(1, ceil(max(curve_change_scale, alpha_change_scale) * quality * 10))
+    # Easing only goes one way, so the lanes in view lie between those at either end and whether any of them can be
+    # seen is known before splitting the connector. Segments are only checked one by one if some lanes may not be seen.
+    min_l = min(start_lane, end_lane) - max(start_size, end_size)
+    max_r = max(start_lane, end_lane) + max(start_size, end_size)
+    min_visible_l, max_visible_r = get_visible_lane_range(min(start_travel, end_travel))
+    if max_r <= min_visible_l or min_l >= max_visible_r:
+        return 0
+    max_visible_l, min_visible_r = get_visible_lane_range(max(start_travel, end_travel))
+    is_partly_visible = min_l < max_visible_l or max_r > min_visible_r
+    # Spare the quality of the parts of connectors near the judge line, where they're biggest and most looked at.
+    quality_scale **= 2 - unlerp_clamped(Layout.progress_start, 1.0, start_progress)
+    quality = get_connector_quality_option(kind) * quality_scale
+
+    first_sample_i = 0
+    sample_stride = 1
+    splits = VarArray[ConnectorSplit, Dim[CONNECTOR_ADAPTIVE_SPLIT_COUNT]].new()
+    if tessellation is not None and use_tessellation:
+        # Split at each sample between the ends of the part in view, leaving out those within half a segment of either
+        # end so the segments at the ends are no shorter than half a segment and no longer than one and a half.
+        # Samples are skipped evenly when the quality is scaled down.
+        sample_stride = max(1, floor(1 / quality_scale + 0.5))
+        sample_count = tessellation.segment_count / sample_stride
+        first_sample_i = floor(start_frac * sample_count + 0.5) + 1
+        last_sample_i = ceil(end_frac * sample_count - 0.5) - 1
+        segment_count = max(last_sample_i - first_sample_i + 1, 0) + 1
+    elif Options.adaptive_connector_tessellation:
+        split_connector_adaptively(
+            splits,
+            kind=kind,
+            ease_type=ease_type,
+            quality=quality,
+            head_lane=head_lane,
+            head_size=head_size,
+            head_progress=head_progress,
+            head_target_time=head_target_time,
+            head_ease_frac=head_ease_frac,
+            head_alpha=head_alpha,
+            tail_lane=tail_lane,
+            tail_size=tail_size,
+            tail_progress=tail_progress,
+            tail_target_time=tail_target_time,
+            tail_ease_frac=tail_ease_frac,
+            tail_alpha=tail_alpha,
+            start_frac=start_frac,
+            end_frac=end_frac,
+        )
+        segment_count = len(splits) - 1
+    else:
+        alpha_change = abs(start_alpha - end_alpha)
+        match Options.fade_mod:
+            case FadeMod.NONE:
+                pass
+            case FadeMod.FADE_IN | FadeMod.FADE_OUT:
+                alpha_change = max(
+                    alpha_change,
+                    abs(start_alpha * get_alpha(start_target_time) - end_alpha * get_alpha(end_target_time)),
+                )
+            case FadeMod.FADE_IN_OUT:
+                alpha_change = max(start_alpha, end_alpha)
+        segment_estimate = get_connector_segment_estimate(
+            kind=kind,
+            ease_type=ease_type,
+            head_lane=head_lane,
+            head_size=head_size,
+            tail_lane=tail_lane,
+            tail_size=tail_size,
+            eased_head_ease_frac=eased_head_ease_frac,
+            eased_tail_ease_frac=eased_tail_ease_frac,
+            start_ease_frac=start_ease_frac,
+            end_ease_frac=end_ease_frac,
+            start_progress=start_progress,
+            end_progress=end_progress,
+            start_travel=start_travel,
+            end_travel=end_travel,
+            start_lane=start_lane,
+            start_size=start_size,
+            end_lane=end_lane,
+            end_size=end_size,
+            alpha_change=alpha_change,
+        )
+        segment_count = max(1, ceil(segment_estimate * quality_scale))
 
     z = get_connector_z(kind, segment_head_target_time, segment_head_lane)
+    quad_count = 0
 
     last_travel = start_travel
     last_lane = start_lane
@@ -473,11 +1043,28 @@ def draw_connector(
     last_target_time = start_target_time
 
     for v_segment_i in range(1, segment_count + 1):
-        segment_frac = v_segment_i / segment_count
-        next_frac = lerp(start_frac, end_frac, segment_frac)
-        next_ease_frac = lerp(start_ease_frac, end_ease_frac, segment_frac)
-        next_interp_frac = unlerp_clamped(eased_head_ease_frac, eased_tail_ease_frac, ease(ease_type, next_ease_frac))
-        next_progress = lerp(start_progress, end_progress, segment_frac)
+        if tessellation is not None and use_tessellation:
+            if v_segment_i < segment_count:
+                sample_i = (first_sample_i + v_segment_i - 1) * sample_stride
+                next_frac = sample_i / tessellation.segment_count
+                next_progress = lerp(head_progress, tail_progress, next_frac)
+                next_interp_frac = tessellation.interp_fracs[sample_i]
+            else:
+                next_frac = end_frac
+                next_progress = end_progress
+                next_interp_frac = end_interp_frac
+        elif Options.adaptive_connector_tessellation:
+            next_frac = splits[v_segment_i].frac
+            next_progress = lerp(head_progress, tail_progress, next_frac)
+            next_interp_frac = splits[v_segment_i].interp_frac
+        else:
+            segment_frac = v_segment_i / segment_count
+            next_frac = lerp(start_frac, end_frac, segment_frac)
+            next_ease_frac = lerp(start_ease_frac, end_ease_frac, segment_frac)
+            next_interp_frac = unlerp_clamped(
+                eased_head_ease_frac, eased_tail_ease_frac, ease(ease_type, next_ease_frac)
+            )
+            next_progress = lerp(start_progress, end_progress, segment_frac)
         next_travel = approach(next_progress)
         next_lane = lerp(head_lane, tail_lane, next_interp_frac)
         next_size = max(1e-3, lerp(head_size, tail_size, next_interp_frac))
@@ -496,7 +1083,15 @@ def draw_connector(
             1,
         )
 
-        if base_a <= 1e-3:
+        is_visible = base_a > 1e-3
+        if is_visible and is_partly_visible:
+            segment_visible_l, segment_visible_r = get_visible_lane_range(min(last_travel, next_travel))
+            is_visible = (
+                max(last_lane + last_size, next_r) > segment_visible_l
+                and min(last_lane - last_size, next_l) < segment_visible_r
+            )
+
+        if not is_visible:
             last_travel = next_travel
             last_lane = next_lane
             last_size = next_size
@@ -507,7 +1102,6 @@ def draw_connector(
         if Options.arc_mode == ArcMode.DISABLED:
             start_arc_n = 1
             end_arc_n = 1
-            arc_n = 1
         else:
             start_arc_factor = 0.8
             end_arc_factor = 0.8
@@ -521,90 +1115,37 @@ def draw_connector(
             end_arc_factor *= Options.arc_quality
             start_arc_n = max(1, ceil(quality * Options.arc_quality * last_size * start_arc_factor))
             end_arc_n = max(1, ceil(quality * Options.arc_quality * next_size * end_arc_factor))
-            arc_n = max(start_arc_n, end_arc_n)
 
-        start_layout = layout_slide_connector_segment(
+        for segment in layout_slide_connector_strip(
             start_lane=last_lane,
             start_size=last_size,
             start_travel=last_travel,
+            start_n=start_arc_n,
             end_lane=next_lane,
             end_size=next_size,
             end_travel=next_travel,
-            n=start_arc_n,
-        )
-        end_layout = layout_slide_connector_segment(
-            start_lane=last_lane,
-            start_size=last_size,
-            start_travel=last_travel,
-            end_lane=next_lane,
-            end_size=next_size,
-            end_travel=next_travel,
-            n=end_arc_n,
-        )
-
-        start_segment_i = 0
-        end_segment_i = 0
-        start_segment = +Quad
-        end_segment = +Quad
-        start_subsegment_i = 0
-        end_subsegment_i = 0
-        start_subsegment_n = 0
-        end_subsegment_n = 0
-        for h_segment_i in range(arc_n):
-            if h_segment_i * start_arc_n >= start_segment_i * arc_n:
-                start_segment @= next(start_layout)
-                start_segment_i += 1
-                start_subsegment_i = 0
-                succeeding_h_segment_i = ceil(start_segment_i * arc_n / start_arc_n)
-                # Paranoia about rounding errors
-                if succeeding_h_segment_i * start_arc_n >= (start_segment_i + 1) * arc_n:
-                    succeeding_h_segment_i -= 1
-                elif succeeding_h_segment_i * start_arc_n < start_segment_i * arc_n:
-                    succeeding_h_segment_i += 1
-                start_subsegment_n = succeeding_h_segment_i - h_segment_i
-            else:
-                start_subsegment_i += 1
-            if h_segment_i * end_arc_n >= end_segment_i * arc_n:
-                end_segment @= next(end_layout)
-                end_segment_i += 1
-                end_subsegment_i = 0
-                succeeding_h_segment_i = ceil(end_segment_i * arc_n / end_arc_n)
-                if succeeding_h_segment_i * end_arc_n >= (end_segment_i + 1) * arc_n:
-                    succeeding_h_segment_i -= 1
-                elif succeeding_h_segment_i * end_arc_n < end_segment_i * arc_n:
-                    succeeding_h_segment_i += 1
-                end_subsegment_n = succeeding_h_segment_i - h_segment_i
-            else:
-                end_subsegment_i += 1
-
-            start_segment_l_frac = start_subsegment_i / start_subsegment_n
-            start_segment_r_frac = (start_subsegment_i + 1) / start_subsegment_n
-            end_segment_l_frac = end_subsegment_i / end_subsegment_n
-            end_segment_r_frac = (end_subsegment_i + 1) / end_subsegment_n
-
-            segment = Quad(
-                bl=lerp(start_segment.bl, start_segment.br, start_segment_l_frac),
-                br=lerp(start_segment.bl, start_segment.br, start_segment_r_frac),
-                tl=lerp(end_segment.tl, end_segment.tr, end_segment_l_frac),
-                tr=lerp(end_segment.tl, end_segment.tr, end_segment_r_frac),
-            )
-
+            end_n=end_arc_n,
+        ):
             if visual_state == ConnectorVisualState.ACTIVE and active_sprite.is_available:
                 if Options.connector_animation:
                     a_modifier = (cos(2 * pi * time()) + 1) / 2
                     normal_sprite.draw(segment, z=z + 1 / 128, a=base_a * ease_out_cubic(a_modifier))
                     active_sprite.draw(segment, z=z, a=base_a * ease_out_cubic(1 - a_modifier))
+                    quad_count += 2
                 else:
                     active_sprite.draw(segment, z=z, a=base_a)
+                    quad_count += 1
             else:
                 normal_sprite.draw(
                     segment, z=z, a=base_a * (1 if visual_state != ConnectorVisualState.INACTIVE else 0.5)
                 )
+                quad_count += 1
         last_travel = next_travel
         last_lane = next_lane
         last_size = next_size
         last_alpha = next_alpha
         last_target_time = next_target_time
+    return quad_count
 
 
 class ActiveConnectorInfo(Record):
@@ -1,6 +1,11 @@
-from typing import Any, Literal
-
-from sonolus.script.archetype import PlayArchetype
+import gzip
+import json
+from array import array
+from collections.abc import Callable, Collection, Iterable, Iterator, Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any, Literal, NamedTuple, Protocol, TypeGuard, get_args, overload
+
+from sonolus.script.archetype import EntityRef, PlayArchetype
 from sonolus.script.level import ExternalEntityData, ExternalLevelData, LevelData
 from sonolus.script.timing import TimescaleEase
 
@@ -106,6 +111,41 @@ guide_kind_mapping = {
     7: ConnectorKind.GUIDE_BLACK,
 }
 
+AnchorPosition = Literal["segment_head", "segment_tail", "head", "tail"]
+ANCHOR_POSITIONS: tuple[AnchorPosition, ...] = get_args(AnchorPosition)
+
+
+class SourceEntity(Protocol):
+    """An entity of source level data, either an ExternalEntityData or a view of one."""
+
+    @property
+    def archetype(self) -> str: ...
+
+    @property
+    def data(self) -> Mapping[str, Any]: ...
+
+
+class SourceLevelData(Protocol):
+    """The interface conversion reads source level data through.
+
+    Implemented by PJSekaiExtendedLevelData and ColumnarPJSekaiExtendedLevelData.
+    """
+
+    @property
+    def entities(self) -> Sequence[SourceEntity]: ...
+
+    def has_archetype(self, archetype: str) -> bool: ...
+
+    def iter_by_archetype(self, archetype: str) -> Iterator[SourceEntity]: ...
+
+    def enumerate_by_archetype(self, archetype: str) -> Iterator[tuple[int, SourceEntity]]: ...
+
+    def __getitem__(self, index: int) -> SourceEntity: ...
+
+    def iter_note_archetypes(self) -> Iterator[tuple[int, SourceEntity]]: ...
+
+    def iter_active_connector_archetypes(self) -> Iterator[tuple[int, SourceEntity]]: ...
+
 
 class PJSekaiExtendedLevelData:
     entities: list[ExternalEntityData]
@@ -134,56 +174,541 @@ class PJSekaiExtendedLevelData:
     def enumerate_all(self):
         return enumerate(self.entities)
 
-    def iter_by_archetype(self, archetype: str):
+    def has_archetype(self, archetype: str) -> bool:
+        return archetype in self.entities_by_archetype
+
+    def iter_by_archetype(self, archetype: str) -> Iterator[ExternalEntityData]:
         return (entity for i, entity in self.entities_by_archetype.get(archetype, []))
 
-    def enumerate_by_archetype(self, archetype: str):
+    def enumerate_by_archetype(self, archetype: str) -> Iterator[tuple[int, ExternalEntityData]]:
         return iter(self.entities_by_archetype.get(archetype, []))
 
     def __getitem__(self, index: int) -> ExternalEntityData:
         return self.entities[index]
 
-    def iter_note_archetypes(self):
+    def iter_note_archetypes(self) -> Iterator[tuple[int, ExternalEntityData]]:
         return iter(self.note_entities)
 
-    def iter_active_connector_archetypes(self):
+    def iter_active_connector_archetypes(self) -> Iterator[tuple[int, ExternalEntityData]]:
         return iter(self.connector_entities)
 
 
-def convert_pjsekai_extended_level_data(data: ExternalLevelData) -> LevelData | None:
+# Fields stored in integer columns by ColumnarPJSekaiExtendedLevelData. Other numeric fields are stored as doubles.
+INT_FIELDS = frozenset(
+    {
+        "first",
+        "next",
+        "head",
+        "tail",
+        "start",
+        "end",
+        "attach",
+        "slide",
+        "a",
+        "b",
+        "timeScaleGroup",
+        "startTimeScaleGroup",
+        "headTimeScaleGroup",
+        "tailTimeScaleGroup",
+        "endTimeScaleGroup",
+        "direction",
+        "ease",
+        "fade",
+        "color",
+    }
+)
+# Marks a missing value in a column. Values that collide with it are kept out of the columns.
+MISSING = -(2**31)
+NOT_FOUND = object()
+
+
+class ColumnarEntityData(Mapping[str, Any]):
+    """Read-only view of one entity's data in a ColumnarPJSekaiExtendedLevelData."""
+
+    __slots__ = ("columns", "extra", "row")
+
+    def __init__(self, columns: dict[str, array], extra: dict[str, Any] | None, row: int):
+        self.columns = columns
+        self.extra = extra
+        self.row = row
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, NOT_FOUND)
+        if value is NOT_FOUND:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        column = self.columns.get(key)
+        if column is not None:
+            value = column[self.row]
+            if value != MISSING:
+                return value
+        if self.extra is not None:
+            return self.extra.get(key, default)
+        return default
+
+    def __iter__(self) -> Iterator[str]:
+        for key, column in self.columns.items():
+            value = column[self.row]
+            if value != MISSING:
+                yield key
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class ColumnarEntity(NamedTuple):
+    archetype: str
+    data: ColumnarEntityData
+
+
+class ColumnarEntities(Sequence[ColumnarEntity]):
+    __slots__ = ("level_data",)
+
+    def __init__(self, level_data: "ColumnarPJSekaiExtendedLevelData"):
+        self.level_data = level_data
+
+    @overload
+    def __getitem__(self, index: int) -> ColumnarEntity: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[ColumnarEntity]: ...
+
+    def __getitem__(self, index: int | slice) -> ColumnarEntity | list[ColumnarEntity]:
+        if isinstance(index, slice):
+            return [self.level_data[i] for i in range(len(self))[index]]
+        return self.level_data[index]
+
+    def __len__(self) -> int:
+        return len(self.level_data.archetype_ids)
+
+
+class ColumnarPJSekaiExtendedLevelData:
+    """A columnar alternative to PJSekaiExtendedLevelData with the same interface.
+
+    Archetype names are interned to small ints, and entity indices are grouped by archetype so that each archetype
+    occupies a contiguous range of the order array. Each archetype has its own numeric columns, holding only the fields
+    that archetype uses, so an entity costs a few bytes per field rather than a dict of boxed values. Entities are
+    materialized as lightweight ColumnarEntity views on access. Values that don't fit a column (non-numeric values,
+    or non-integral values of integer fields) are kept as is in a per-entity overflow dict, so every lookup returns a
+    value equal to what the source data held, though ints of fields other than INT_FIELDS come back as floats.
+    """
+
+    archetypes: list[str]
+    archetype_ids: array
+    rows: array
+    order: array
+    ranges: dict[str, range]
+    columns: list[dict[str, array]]
+    extra: dict[int, dict[str, Any]]
+    note_indices: array
+    connector_indices: array
+
+    def __init__(self, archetypes: Iterable[str], get_fields: Callable[[int], Iterable[tuple[str, Any]]]):
+        """Build the columns from each entity's archetype name, and a function returning an entity's fields by index."""
+        self.archetypes = []
+        archetype_ids_by_name = {}
+        self.archetype_ids = array("H")
+        for name in archetypes:
+            if name not in archetype_ids_by_name:
+                archetype_ids_by_name[name] = len(self.archetypes)
+                self.archetypes.append(name)
+            self.archetype_ids.append(archetype_ids_by_name[name])
+        count = len(self.archetype_ids)
+
+        # A stable counting sort by archetype, so iterating an archetype's range yields its entities in index order.
+        sizes = [0] * len(self.archetypes)
+        self.rows = array("i", [0]) * count
+        for i, archetype_id in enumerate(self.archetype_ids):
+            self.rows[i] = sizes[archetype_id]
+            sizes[archetype_id] += 1
+        self.ranges = {}
+        start = 0
+        for name, size in zip(self.archetypes, sizes, strict=True):
+            self.ranges[name] = range(start, start + size)
+            start += size
+        self.order = array("i", [0]) * count
+        for i, archetype_id in enumerate(self.archetype_ids):
+            self.order[self.ranges[self.archetypes[archetype_id]].start + self.rows[i]] = i
+
+        self.columns = [{} for _ in self.archetypes]
+        self.extra = {}
+        for i, archetype_id in enumerate(self.archetype_ids):
+            columns = self.columns[archetype_id]
+            row = self.rows[i]
+            for field, value in get_fields(i):
+                column = columns.get(field)
+                if column is None:
+                    typecode = "i" if field in INT_FIELDS else "d"
+                    column = columns[field] = array(typecode, [MISSING]) * sizes[archetype_id]
+                if fits_column(column, value):
+                    column[row] = value
+                else:
+                    self.extra.setdefault(i, {})[field] = value
+
+        self.note_indices = array("i")
+        self.connector_indices = array("i")
+        note_ids = {archetype_ids_by_name[name] for name in note_type_mapping if name in archetype_ids_by_name}
+        connector_ids = {
+            archetype_ids_by_name[name] for name in active_connector_kind_mapping if name in archetype_ids_by_name
+        }
+        for i, archetype_id in enumerate(self.archetype_ids):
+            if archetype_id in note_ids:
+                self.note_indices.append(i)
+            if archetype_id in connector_ids:
+                self.connector_indices.append(i)
+
+    @classmethod
+    def from_packaged(cls, packaged_data: bytes) -> tuple["ColumnarPJSekaiExtendedLevelData", float]:
+        """Build the columns straight from packaged level data, returning them along with the bgm offset.
+
+        Refs are resolved the same way as parse_external_level_data, without building a dict per entity.
+        """
+        raw_data = json.loads(gzip.decompress(packaged_data).decode("utf-8"))
+        raw_entities = raw_data["entities"]
+        entity_name_to_index = {e["name"]: i for i, e in enumerate(raw_entities) if "name" in e}
+
+        def get_fields(i: int) -> Iterator[tuple[str, Any]]:
+            for entry in raw_entities[i].get("data", []):
+                if "value" in entry:
+                    yield entry["name"], entry["value"]
+                elif "ref" in entry:
+                    yield entry["name"], entity_name_to_index.get(entry["ref"], 0)
+
+        return cls((e["archetype"] for e in raw_entities), get_fields), raw_data["bgmOffset"]
+
+    @property
+    def entities(self) -> Sequence[ColumnarEntity]:
+        return ColumnarEntities(self)
+
+    def iter_all(self):
+        return (self[i] for i in range(len(self.archetype_ids)))
+
+    def enumerate_all(self):
+        return ((i, self[i]) for i in range(len(self.archetype_ids)))
+
+    def has_archetype(self, archetype: str) -> bool:
+        return archetype in self.ranges
+
+    def iter_by_archetype(self, archetype: str) -> Iterator[ColumnarEntity]:
+        return (self[self.order[j]] for j in self.ranges.get(archetype, ()))
+
+    def enumerate_by_archetype(self, archetype: str) -> Iterator[tuple[int, ColumnarEntity]]:
+        return ((self.order[j], self[self.order[j]]) for j in self.ranges.get(archetype, ()))
+
+    def __getitem__(self, index: int) -> ColumnarEntity:
+        if index < 0:
+            index += len(self.archetype_ids)
+        archetype_id = self.archetype_ids[index]
+        return ColumnarEntity(
+            self.archetypes[archetype_id],
+            ColumnarEntityData(self.columns[archetype_id], self.extra.get(index), self.rows[index]),
+        )
+
+    def iter_note_archetypes(self) -> Iterator[tuple[int, ColumnarEntity]]:
+        return ((i, self[i]) for i in self.note_indices)
+
+    def iter_active_connector_archetypes(self) -> Iterator[tuple[int, ColumnarEntity]]:
+        return ((i, self[i]) for i in self.connector_indices)
+
+
+def fits_column(column: array, value: Any) -> bool:
+    if isinstance(value, bool) or not isinstance(value, int | float) or value == MISSING:
+        return False
+    if column.typecode == "i":
+        return isinstance(value, int) and -(2**31) < value < 2**31
+    return True
+
+
+@dataclass
+class ConversionReport:
+    removed_timescale_entities: int = 0
+    pruned_entities: int = 0
+
+
+@dataclass(frozen=True)
+class Diagnostic:
+    index: int
+    archetype: str
+    field: str | None
+    message: str
+
+    def __str__(self):
+        location = f"entity {self.index} ({self.archetype})"
+        if self.field is not None:
+            location += f" {self.field}"
+        return f"{location}: {self.message}"
+
+
+class InvalidLevelDataError(ValueError):
+    def __init__(self, diagnostics: list[Diagnostic]):
+        self.diagnostics = diagnostics
+        super().__init__(f"{len(diagnostics)} problem(s) in level data, first: {diagnostics[0]}")
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    name: str
+    required: bool = True
+    # If set, the field is a ref, considered present only when positive, that must point at one of these archetypes.
+    targets: Collection[str] | None = None
+    # If set, the field is a value that must be one of these.
+    values: Collection[Any] | None = None
+
+
+NOTE_FIELDS = (
+    FieldSpec("#BEAT"),
+    FieldSpec("direction", required=False, values=flick_direction_mapping),
+    FieldSpec("attach", required=False, targets=active_connector_kind_mapping),
+    FieldSpec("slide", required=False, targets=active_connector_kind_mapping),
+)
+ACTIVE_CONNECTOR_FIELDS = (
+    FieldSpec("head", targets=note_type_mapping),
+    FieldSpec("tail", targets=note_type_mapping),
+    FieldSpec("start", targets=note_type_mapping),
+    FieldSpec("end", targets=note_type_mapping),
+    FieldSpec("ease", values=ease_type_mapping),
+)
+fields_by_archetype: dict[str, tuple[FieldSpec, ...]] = {
+    **dict.fromkeys(note_type_mapping, NOTE_FIELDS),
+    **dict.fromkeys(active_connector_kind_mapping, ACTIVE_CONNECTOR_FIELDS),
+    "#BPM_CHANGE": (FieldSpec("#BEAT"), FieldSpec("#BPM")),
+    "TimeScaleGroup": (FieldSpec("first", targets=("TimeScaleChange",)),),
+    "TimeScaleChange": (
+        FieldSpec("#BEAT"),
+        FieldSpec("timeScale"),
+        FieldSpec("next", required=False, targets=("TimeScaleChange",)),
+    ),
+    "SimLine": (
+        FieldSpec("a", targets=note_type_mapping),
+        FieldSpec("b", targets=note_type_mapping),
+    ),
+    "Guide": (
+        *(
+            FieldSpec(f"{pos}{name}")
+            for pos in ("start", "head", "tail", "end")
+            for name in ("Beat", "Lane", "Size", "TimeScaleGroup")
+        ),
+        FieldSpec("ease", required=False, values=ease_type_mapping),
+        FieldSpec("fade", required=False, values=fade_alpha_mapping),
+        FieldSpec("color", required=False, values=guide_kind_mapping),
+    ),
+}
+# Guides refer to timescale groups by plain index rather than by (positive) ref, so they're checked separately.
+GUIDE_TIMESCALE_GROUP_FIELDS = ("startTimeScaleGroup", "headTimeScaleGroup", "tailTimeScaleGroup", "endTimeScaleGroup")
+
+MAX_DIAGNOSTICS = 100
+
+
+def convert_pjsekai_extended_level_data(
+    data: ExternalLevelData,
+    *,
+    compact_timescales: bool = False,
+    prune_unreferenced: bool = False,
+    report: ConversionReport | None = None,
+) -> LevelData | None:
     if not any(e.archetype == "TimeScaleGroup" for e in data.entities):
         return None
-    pjsekai_data = PJSekaiExtendedLevelData(data.entities)
+    return convert_pjsekai_extended_entities(
+        PJSekaiExtendedLevelData(data.entities),
+        data.bgm_offset,
+        compact_timescales=compact_timescales,
+        prune_unreferenced=prune_unreferenced,
+        report=report,
+    )
+
+
+def convert_pjsekai_extended_entities(
+    pjsekai_data: SourceLevelData,
+    bgm_offset: float,
+    *,
+    compact_timescales: bool = False,
+    prune_unreferenced: bool = False,
+    report: ConversionReport | None = None,
+) -> LevelData | None:
+    if not pjsekai_data.has_archetype("TimeScaleGroup"):
+        return None
+    # Validation takes under 1% of a conversion (see the validate stage of sekai.benchmarks.converter), and is what keeps
+    # malformed levels from hanging the dev server, so it always runs.
+    diagnostics = validate_pjsekai_extended_level_data(pjsekai_data)
+    if diagnostics:
+        raise InvalidLevelDataError(diagnostics)
     bpm_changes = convert_bpm_changes(pjsekai_data)
-    timescale_groups_by_index, timescale_entities = convert_timescale_groups(pjsekai_data)
+    timescale_groups_by_index, timescale_entities = convert_timescale_groups(
+        pjsekai_data, compact=compact_timescales, report=report
+    )
     notes = convert_notes(pjsekai_data, timescale_groups_by_index)
     guides = convert_guides(pjsekai_data, timescale_groups_by_index)
     entities = [
-        Initialization(),
         *bpm_changes,
         *timescale_entities,
         *notes,
         *guides,
     ]
-    entities = sorted(entities, key=lambda e: (not isinstance(e, Initialization), (getattr(e, "beat", -1))))
+    entities = sorted(entities, key=lambda e: getattr(e, "beat", -1))
     link_slide_notes(entities)
+    if prune_unreferenced:
+        entity_count = len(entities)
+        entities = prune_unreferenced_entities(entities)
+        if report is not None:
+            report.pruned_entities = entity_count - len(entities)
     return LevelData(
-        bgm_offset=data.bgm_offset,
-        entities=entities,
+        bgm_offset=bgm_offset,
+        entities=[Initialization(), *entities],
     )
 
 
-def convert_timescale_groups(data: PJSekaiExtendedLevelData) -> tuple[dict[int, TimescaleChange], list[PlayArchetype]]:
+def validate_pjsekai_extended_level_data(
+    data: SourceLevelData, max_diagnostics: int = MAX_DIAGNOSTICS
+) -> list[Diagnostic]:
+    """Check that every field the converter reads is present and every link it follows is well-formed.
+
+    Runs in O(n) total: each entity's own fields are checked once, and each timescale chain is walked with a shared
+    visited table, so a change is never walked twice even if chains share a suffix. A cycle in a chain is reported
+    instead of being followed forever. Stops after max_diagnostics problems.
+    """
+    diagnostics = []
+    entities = data.entities
+
+    def get_entity(index: int) -> SourceEntity | None:
+        return entities[index] if 0 <= index < len(entities) else None
+
+    for i, entity in enumerate(entities):
+        for field, message in iter_field_problems(get_entity, entity):
+            diagnostics.append(Diagnostic(i, entity.archetype, field, message))
+            if len(diagnostics) >= max_diagnostics:
+                return diagnostics
+    if diagnostics:
+        # Chains can only be walked safely once every link is known to point at a change.
+        return diagnostics
+
+    # Index of the group whose chain first visited each change, or -1 if none has.
+    visited_by = array("i", [-1]) * len(entities)
+    for i, entity in data.enumerate_by_archetype("TimeScaleGroup"):
+        index = int(entity.data["first"])
+        while visited_by[index] < 0:
+            visited_by[index] = i
+            next_index = entities[index].data.get("next", 0)
+            if next_index <= 0:
+                break
+            index = int(next_index)
+        else:
+            # Either a cycle, or the rest of the chain is shared with an earlier group and was already checked.
+            if visited_by[index] == i:
+                diagnostics.append(Diagnostic(i, entity.archetype, "first", f"chain has a cycle at entity {index}"))
+                if len(diagnostics) >= max_diagnostics:
+                    return diagnostics
+    return diagnostics
+
+
+def iter_field_problems(
+    get_entity: Callable[[int], SourceEntity | None], entity: SourceEntity
+) -> Iterator[tuple[str, str]]:
+    """Yield (field, message) pairs for problems in an entity's own fields, looking up referenced entities by index."""
+    for spec in fields_by_archetype.get(entity.archetype, ()):
+        value = entity.data.get(spec.name)
+        if spec.targets is not None and is_index(value) and value <= 0:
+            value = None
+        if value is None:
+            if spec.required:
+                yield spec.name, "is missing"
+        elif spec.targets is not None:
+            yield from iter_ref_problems(get_entity, spec.name, value, spec.targets)
+        elif spec.values is not None and value not in spec.values:
+            yield spec.name, f"has unsupported value {value!r}"
+    if entity.archetype == "Guide":
+        for field in GUIDE_TIMESCALE_GROUP_FIELDS:
+            if field in entity.data:
+                yield from iter_ref_problems(get_entity, field, entity.data[field], ("TimeScaleGroup",))
+
+
+def iter_ref_problems(
+    get_entity: Callable[[int], SourceEntity | None], field: str, value: Any, targets: Collection[str]
+) -> Iterator[tuple[str, str]]:
+    if not is_index(value) or (target := get_entity(int(value))) is None:
+        yield field, f"refers to missing entity {value!r}"
+    elif target.archetype not in targets:
+        yield field, f"refers to entity {int(value)} of unexpected archetype {target.archetype}"
+
+
+def is_index(value: Any) -> TypeGuard[float]:
+    return isinstance(value, int | float) and not isinstance(value, bool) and float(value).is_integer()
+
+
+def prune_unreferenced_entities(entities: list[PlayArchetype]) -> list[PlayArchetype]:
+    """Drop unscored notes and timescale changes that no other kept entity references.
+
+    Everything else (scored notes, connectors, sim lines, timescale groups, and global entities like bpm changes) is
+    kept unconditionally, and anything reachable from those through entity refs is kept too. Refs are resolved when the
+    level is packaged, so the kept entities are renumbered densely without any extra work.
+    """
+    # Outside of compilation, refs to level data entities compare equal when they point to the same entity.
+    entities_by_ref = {entity.ref(): entity for entity in entities}
+    reachable = set()
+    pending = [entity for entity in entities if not is_prunable(entity)]
+    while pending:
+        entity = pending.pop()
+        if entity in reachable:
+            continue
+        reachable.add(entity)
+        pending.extend(iter_referenced_entities(entity, entities_by_ref))
+    return [entity for entity in entities if entity in reachable]
+
+
+def is_prunable(entity: PlayArchetype) -> bool:
+    return (isinstance(entity, BaseNote) and not entity.is_scored) or isinstance(entity, TimescaleChange)
+
+
+def iter_referenced_entities(
+    entity: PlayArchetype, entities_by_ref: Mapping[EntityRef, PlayArchetype]
+) -> Iterator[PlayArchetype]:
+    for name in type(entity).schema()["fields"]:
+        value = getattr(entity, name)
+        if isinstance(value, EntityRef) and (referenced := entities_by_ref.get(value)) is not None:
+            yield referenced
+
+
+def convert_timescale_groups(
+    data: SourceLevelData,
+    compact: bool = False,
+    report: ConversionReport | None = None,
+) -> tuple[dict[int, TimescaleGroup], list[PlayArchetype]]:
+    """Convert timescale groups and their change chains.
+
+    If compact is set, changes that keep the previous timescale are merged into the previous change, and groups whose
+    (merged) change lists are identical are folded into one group which every original index maps to. Neither affects
+    the scaled time of any group beyond rounding, since this format has no skips, eases or hidden notes.
+    """
     groups_by_original_index = {}
+    groups_by_changes = {}
     entities = []
+    source_count = 0
     for i, entity in data.enumerate_by_archetype("TimeScaleGroup"):
+        source_count += 1
+        raw_changes = []
+        raw_change = data[int(entity.data["first"])]
+        while True:
+            source_count += 1
+            beat = raw_change.data["#BEAT"]
+            timescale = raw_change.data["timeScale"]
+            if not (compact and raw_changes and raw_changes[-1][1] == timescale and raw_changes[-1][0] <= beat):
+                raw_changes.append((beat, timescale))
+            if raw_change.data.get("next", 0) <= 0:
+                break
+            raw_change = data[int(raw_change.data["next"])]
+        key = tuple(raw_changes)
+        if compact and key in groups_by_changes:
+            groups_by_original_index[i] = groups_by_changes[key]
+            continue
         group = TimescaleGroup()
         changes = []
-        raw_change = data[entity.data["first"]]
-        while True:
+        for beat, timescale in raw_changes:
             change = TimescaleChange(
-                beat=raw_change.data["#BEAT"],
-                timescale=raw_change.data["timeScale"],
+                beat=beat,
+                timescale=timescale,
                 timescale_skip=0.0,
                 timescale_group=group.ref(),
                 timescale_ease=TimescaleEase.NONE,
@@ -191,18 +716,18 @@ def convert_timescale_groups(data: PJSekaiExtendedLevelData) -> tuple[dict[int,
             if changes:
                 changes[-1].next_ref = change.ref()
             changes.append(change)
-            if raw_change.data.get("next", 0) <= 0:
-                break
-            raw_change = data[raw_change.data["next"]]
         if changes:
             group.first_ref = changes[0].ref()
         groups_by_original_index[i] = group
+        groups_by_changes[key] = group
         entities.append(group)
         entities.extend(changes)
+    if report is not None:
+        report.removed_timescale_entities = source_count - len(entities)
     return groups_by_original_index, entities
 
 
-def convert_bpm_changes(data: PJSekaiExtendedLevelData) -> list[PlayArchetype]:
+def convert_bpm_changes(data: SourceLevelData) -> list[PlayArchetype]:
     entities = []
     for entity in data.iter_by_archetype("#BPM_CHANGE"):
         bpm_change = BpmChange(
@@ -214,31 +739,16 @@ def convert_bpm_changes(data: PJSekaiExtendedLevelData) -> list[PlayArchetype]:
 
 
 def convert_notes(
-    data: PJSekaiExtendedLevelData, timescale_groups_by_index: dict[int, TimescaleChange]
+    data: SourceLevelData, timescale_groups_by_index: Mapping[int, TimescaleGroup]
 ) -> list[PlayArchetype]:
     entities = []
     notes_by_original_index = {}
-    connectors_by_original_index = {}
     for i, entity in data.iter_note_archetypes():
-        note_class = note_type_mapping[entity.archetype]
-        note = note_class(
-            beat=entity.data["#BEAT"],
-            lane=entity.data.get("lane", 0.0),
-            size=entity.data.get("size", 0.0),
-            direction=flick_direction_mapping[entity.data.get("direction", 0)],
-            segment_kind=ConnectorKind.ACTIVE_NORMAL,
-        )
+        note = create_note(entity)
         entities.append(note)
         notes_by_original_index[i] = note
-    for i, entity in data.iter_active_connector_archetypes():
-        connector = Connector(
-            head_ref=notes_by_original_index[entity.data["head"]].ref(),
-            tail_ref=notes_by_original_index[entity.data["tail"]].ref(),
-            segment_head_ref=notes_by_original_index[entity.data["start"]].ref(),
-            segment_tail_ref=notes_by_original_index[entity.data["end"]].ref(),
-            active_head_ref=notes_by_original_index[entity.data["start"]].ref(),
-            active_tail_ref=notes_by_original_index[entity.data["end"]].ref(),
-        )
+    for _, entity in data.iter_active_connector_archetypes():
+        connector = create_connector(entity, notes_by_original_index)
         head = notes_by_original_index[entity.data["head"]]
         tail = notes_by_original_index[entity.data["tail"]]
         segment_head = notes_by_original_index[entity.data["start"]]
@@ -248,58 +758,99 @@ def convert_notes(
         tail.segment_kind = connector_kind
         segment_head.segment_kind = connector_kind
         entities.append(connector)
-        connectors_by_original_index[i] = connector
     for i, note in notes_by_original_index.items():
-        entity = data[i]
-        timescale_group_index = entity.data.get("timeScaleGroup", -1)
-        if timescale_group_index in timescale_groups_by_index:
-            note.timescale_group = timescale_groups_by_index[timescale_group_index].ref()
-        attach_index = entity.data.get("attach", -1)
-        if attach_index > 0:
-            attach_connector = connectors_by_original_index[attach_index]
-            note.attach_head_ref = attach_connector.head_ref
-            note.attach_tail_ref = attach_connector.tail_ref
-            note.is_attached = True
-        slide_index = entity.data.get("slide", -1)
-        if slide_index > 0:
-            slide_connector = connectors_by_original_index[slide_index]
-            note.active_head_ref = slide_connector.active_head_ref
+        link_note(note, data[i], data, notes_by_original_index, timescale_groups_by_index)
     for entity in data.iter_by_archetype("SimLine"):
-        sim_line = SimLine(
-            left_ref=notes_by_original_index[entity.data["a"]].ref(),
-            right_ref=notes_by_original_index[entity.data["b"]].ref(),
-        )
+        sim_line = create_sim_line(entity, notes_by_original_index)
         entities.append(sim_line)
     return entities
 
 
-def convert_guides(
-    data: PJSekaiExtendedLevelData, timescale_groups_by_index: dict[int, TimescaleChange]
-) -> list[PlayArchetype]:
-    entities = []
+def create_note(entity: SourceEntity) -> BaseNote:
+    note_class = note_type_mapping[entity.archetype]
+    return note_class(
+        beat=entity.data["#BEAT"],
+        lane=entity.data.get("lane", 0.0),
+        size=entity.data.get("size", 0.0),
+        direction=flick_direction_mapping[entity.data.get("direction", 0)],
+        segment_kind=ConnectorKind.ACTIVE_NORMAL,
+    )
+
 
-    anchors_by_beat = {}
-    anchor_positions = {}
+def create_connector(entity: SourceEntity, notes_by_original_index: Mapping[int, BaseNote]) -> Connector:
+    return Connector(
+        head_ref=notes_by_original_index[entity.data["head"]].ref(),
+        tail_ref=notes_by_original_index[entity.data["tail"]].ref(),
+        segment_head_ref=notes_by_original_index[entity.data["start"]].ref(),
+        segment_tail_ref=notes_by_original_index[entity.data["end"]].ref(),
+        active_head_ref=notes_by_original_index[entity.data["start"]].ref(),
+        active_tail_ref=notes_by_original_index[entity.data["end"]].ref(),
+    )
+
+
+def create_sim_line(entity: SourceEntity, notes_by_original_index: Mapping[int, BaseNote]) -> SimLine:
+    return SimLine(
+        left_ref=notes_by_original_index[entity.data["a"]].ref(),
+        right_ref=notes_by_original_index[entity.data["b"]].ref(),
+    )
+
+
+def link_note(
+    note: BaseNote,
+    entity: SourceEntity,
+    data: Any,
+    notes_by_original_index: Mapping[int, BaseNote],
+    timescale_groups_by_index: Mapping[int, TimescaleGroup],
+):
+    """Set the refs of a note that come from its own data: its timescale group, and attach and slide connectors.
+
+    The data is anything source entities can be looked up in by index.
+    """
+    timescale_group_index = entity.data.get("timeScaleGroup", -1)
+    if timescale_group_index in timescale_groups_by_index:
+        note.timescale_group = timescale_groups_by_index[timescale_group_index].ref()
+    attach_index = entity.data.get("attach", -1)
+    if attach_index > 0:
+        attach_connector = data[int(attach_index)]
+        note.attach_head_ref = notes_by_original_index[attach_connector.data["head"]].ref()
+        note.attach_tail_ref = notes_by_original_index[attach_connector.data["tail"]].ref()
+        note.is_attached = True
+    slide_index = entity.data.get("slide", -1)
+    if slide_index > 0:
+        slide_connector = data[int(slide_index)]
+        note.active_head_ref = notes_by_original_index[slide_connector.data["start"]].ref()
+
+
+class AnchorMatcher:
+    """Finds or creates the anchors that guides are attached to.
+
+    Each anchor can be claimed once per position. Anchors are indexed by their identity (beat, lane, size, timescale
+    group) and a position they still have open, kept in creation order so the first compatible anchor is picked just
+    like a linear scan would. Only claims with the same identity ever interact.
+    """
+
+    def __init__(self, entities: list[PlayArchetype]):
+        self.entities = entities
+        self.anchors = []
+        self.open_anchors_by_key: dict[tuple[Any, ...], dict[BaseNote, None]] = {}
 
     def get_anchor(
+        self,
         beat: float,
         lane: float,
         size: float,
         timescale_group: Any,
-        pos: Literal["segment_head", "segment_tail", "head", "tail"],
+        pos: AnchorPosition,
         segment_kind: ConnectorKind | None = None,
         segment_alpha: float | None = None,
         connector_ease: EaseType | None = None,
     ) -> BaseNote:
-        if beat in anchors_by_beat:
-            for anchor in anchors_by_beat[beat]:
-                if pos in anchor_positions[anchor]:
-                    continue
+        identity = (beat, lane, size, timescale_group)
+        open_anchors = self.open_anchors_by_key.get((*identity, pos))
+        if open_anchors:
+            for anchor in open_anchors:
                 if (
-                    anchor.lane == lane
-                    and anchor.size == size
-                    and anchor.timescale_group == timescale_group
-                    and (segment_kind is None or anchor.segment_kind in (segment_kind, -1))
+                    (segment_kind is None or anchor.segment_kind in (segment_kind, -1))
                     and (segment_alpha is None or anchor.segment_alpha in (segment_alpha, -1))
                     and (connector_ease is None or anchor.connector_ease in (connector_ease, -1))
                 ):
@@ -309,9 +860,11 @@ def convert_guides(
                         anchor.segment_alpha = segment_alpha
                     if connector_ease is not None and anchor.connector_ease == -1:
                         anchor.connector_ease = connector_ease
-                    anchor_positions[anchor].add(pos)
+                    del open_anchors[anchor]
+                    if not open_anchors:
+                        del self.open_anchors_by_key[(*identity, pos)]
                     return anchor
-        anchor = AnchorNote(
+        anchor = self.create_anchor(
             beat=beat,
             lane=lane,
             size=size,
@@ -320,79 +873,18 @@ def convert_guides(
             segment_alpha=segment_alpha if segment_alpha is not None else -1,
             connector_ease=connector_ease if connector_ease is not None else -1,
         )
-        entities.append(anchor)
-        if beat not in anchors_by_beat:
-            anchors_by_beat[beat] = []
-        anchors_by_beat[beat].append(anchor)
-        anchor_positions[anchor] = {pos}
+        self.entities.append(anchor)
+        self.anchors.append(anchor)
+        for other_pos in ANCHOR_POSITIONS:
+            if other_pos != pos:
+                self.open_anchors_by_key.setdefault((*identity, other_pos), {})[anchor] = None
         return anchor
 
-    for entity in data.iter_by_archetype("Guide"):
-        start_beat = entity.data["startBeat"]
-        start_lane = entity.data["startLane"]
-        start_size = entity.data["startSize"]
-        start_timescale_group = timescale_groups_by_index[entity.data["startTimeScaleGroup"]].ref()
-        head_beat = entity.data["headBeat"]
-        head_lane = entity.data["headLane"]
-        head_size = entity.data["headSize"]
-        head_timescale_group = timescale_groups_by_index[entity.data["headTimeScaleGroup"]].ref()
-        tail_beat = entity.data["tailBeat"]
-        tail_lane = entity.data["tailLane"]
-        tail_size = entity.data["tailSize"]
-        tail_timescale_group = timescale_groups_by_index[entity.data["tailTimeScaleGroup"]].ref()
-        end_beat = entity.data["endBeat"]
-        end_lane = entity.data["endLane"]
-        end_size = entity.data["endSize"]
-        end_timescale_group = timescale_groups_by_index[entity.data["endTimeScaleGroup"]].ref()
-        ease = ease_type_mapping[entity.data.get("ease", 0)]
-        start_alpha, end_alpha = fade_alpha_mapping[entity.data.get("fade", 1)]
-        kind = guide_kind_mapping[entity.data.get("color", 0)]
-
-        start = get_anchor(
-            beat=start_beat,
-            lane=start_lane,
-            size=start_size,
-            pos="segment_head",
-            timescale_group=start_timescale_group,
-            segment_kind=kind,
-            segment_alpha=start_alpha,
-        )
-        end = get_anchor(
-            beat=end_beat,
-            lane=end_lane,
-            size=end_size,
-            pos="segment_tail",
-            timescale_group=end_timescale_group,
-            segment_kind=kind,
-            segment_alpha=end_alpha,
-        )
-        head = get_anchor(
-            beat=head_beat,
-            lane=head_lane,
-            size=head_size,
-            pos="head",
-            timescale_group=head_timescale_group,
-            segment_kind=kind,
-            connector_ease=ease,
-        )
-        tail = get_anchor(
-            beat=tail_beat,
-            lane=tail_lane,
-            size=tail_size,
-            pos="tail",
-            timescale_group=tail_timescale_group,
-            segment_kind=kind,
-        )
-        connector = Connector(
-            head_ref=head.ref(),
-            tail_ref=tail.ref(),
-            segment_head_ref=start.ref(),
-            segment_tail_ref=end.ref(),
-        )
-        entities.append(connector)
+    def create_anchor(self, **fields: Any) -> BaseNote:
+        return AnchorNote(**fields)
 
-    for anchor_list in anchors_by_beat.values():
-        for anchor in anchor_list:
+    def apply_defaults(self):
+        for anchor in self.anchors:
             if anchor.segment_kind == -1:
                 anchor.segment_kind = ConnectorKind.GUIDE_NEUTRAL
             if anchor.segment_alpha == -1:
@@ -400,6 +892,75 @@ def convert_guides(
             if anchor.connector_ease == -1:
                 anchor.connector_ease = EaseType.LINEAR
 
+
+def get_guide_anchor_args(entity: SourceEntity) -> list[dict[str, Any]]:
+    """Get the AnchorMatcher.get_anchor arguments for a guide's start, end, head and tail, in the order they're claimed.
+
+    Timescale groups are given as source indices.
+    """
+    ease = ease_type_mapping[entity.data.get("ease", 0)]
+    start_alpha, end_alpha = fade_alpha_mapping[entity.data.get("fade", 1)]
+    kind = guide_kind_mapping[entity.data.get("color", 0)]
+    return [
+        {
+            "beat": entity.data["startBeat"],
+            "lane": entity.data["startLane"],
+            "size": entity.data["startSize"],
+            "timescale_group": entity.data["startTimeScaleGroup"],
+            "pos": "segment_head",
+            "segment_kind": kind,
+            "segment_alpha": start_alpha,
+        },
+        {
+            "beat": entity.data["endBeat"],
+            "lane": entity.data["endLane"],
+            "size": entity.data["endSize"],
+            "timescale_group": entity.data["endTimeScaleGroup"],
+            "pos": "segment_tail",
+            "segment_kind": kind,
+            "segment_alpha": end_alpha,
+        },
+        {
+            "beat": entity.data["headBeat"],
+            "lane": entity.data["headLane"],
+            "size": entity.data["headSize"],
+            "timescale_group": entity.data["headTimeScaleGroup"],
+            "pos": "head",
+            "segment_kind": kind,
+            "connector_ease": ease,
+        },
+        {
+            "beat": entity.data["tailBeat"],
+            "lane": entity.data["tailLane"],
+            "size": entity.data["tailSize"],
+            "timescale_group": entity.data["tailTimeScaleGroup"],
+            "pos": "tail",
+            "segment_kind": kind,
+        },
+    ]
+
+
+def create_guide_connector(start: BaseNote, end: BaseNote, head: BaseNote, tail: BaseNote) -> Connector:
+    return Connector(
+        head_ref=head.ref(),
+        tail_ref=tail.ref(),
+        segment_head_ref=start.ref(),
+        segment_tail_ref=end.ref(),
+    )
+
+
+def convert_guides(
+    data: SourceLevelData, timescale_groups_by_index: Mapping[int, TimescaleGroup]
+) -> list[PlayArchetype]:
+    entities = []
+    matcher = AnchorMatcher(entities)
+    for entity in data.iter_by_archetype("Guide"):
+        start, end, head, tail = (
+            matcher.get_anchor(**{**args, "timescale_group": timescale_groups_by_index[args["timescale_group"]].ref()})
+            for args in get_guide_anchor_args(entity)
+        )
+        entities.append(create_guide_connector(start, end, head, tail))
+    matcher.apply_defaults()
     return entities
 
 
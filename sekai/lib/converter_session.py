@@ -0,0 +1,461 @@
+import heapq
+from bisect import bisect_left, insort
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from typing import Any, TypeGuard
+
+from sonolus.script.archetype import PlayArchetype
+from sonolus.script.level import ExternalEntityData, ExternalLevelData, LevelData
+from sonolus.script.timing import TimescaleEase
+
+from sekai.lib.converter import (
+    GUIDE_TIMESCALE_GROUP_FIELDS,
+    MAX_DIAGNOSTICS,
+    AnchorMatcher,
+    Diagnostic,
+    InvalidLevelDataError,
+    active_connector_kind_mapping,
+    create_connector,
+    create_guide_connector,
+    create_note,
+    create_sim_line,
+    ease_type_mapping,
+    fields_by_archetype,
+    get_guide_anchor_args,
+    is_index,
+    iter_field_problems,
+    link_note,
+    note_type_mapping,
+)
+from sekai.play.bpm_change import BpmChange
+from sekai.play.initialization import Initialization
+from sekai.play.note import BaseNote
+from sekai.play.timescale import TimescaleChange, TimescaleGroup
+
+# The runs convert_pjsekai_extended_entities concatenates, in order, before its stable sort by beat. Entities sort by
+# (beat, run, position in run), where the position reproduces the order the full conversion creates entities in, so
+# the order matches it.
+BPM_RUN = 0
+TIMESCALE_RUN = 1
+NOTE_RUN = 2
+GUIDE_RUN = 3
+
+
+class ConversionSession:
+    """Converts a PJSekai extended level, then keeps the converted level up to date as the source is edited.
+
+    Source entities are identified by keys, which start out as their indices in the initial level. Added entities get
+    new keys above every existing one, so keys are always in source order, and refs in entity data are keys. Each update
+    only rebuilds the converted entities its edits can affect: changed notes and the notes their connectors touch,
+    connectors and sim lines referring to rebuilt notes, timescale groups whose chains were edited, and guide anchors
+    sharing an identity (beat, lane, size, timescale group) with an edited guide. The result always matches converting
+    source() from scratch with convert_pjsekai_extended_level_data, without compaction or pruning.
+    """
+
+    def __init__(self, data: ExternalLevelData):
+        self.bgm_offset = data.bgm_offset
+        self.entities: dict[int, ExternalEntityData] = {}
+        self.next_key = 0
+        # Keys of the entities whose refs point at each key.
+        self.referrers: dict[int, set[int]] = {}
+
+        self.initialization = Initialization()
+        self.sort_keys: dict[PlayArchetype, tuple[Any, ...]] = {}
+        self.entities_by_sort_key: dict[tuple[Any, ...], PlayArchetype] = {}
+        self.order: list[tuple[Any, ...]] = []
+        self.pending_sort_keys: set[tuple[Any, ...]] = set()
+
+        self.bpm_changes: dict[int, BpmChange] = {}
+        self.groups: dict[int, TimescaleGroup] = {}
+        self.chains: dict[int, list[int]] = {}
+        self.changes: dict[int, list[TimescaleChange]] = {}
+        self.groups_by_change: dict[int, set[int]] = {}
+        self.notes: dict[int, BaseNote] = {}
+        self.connectors: dict[int, PlayArchetype] = {}
+        self.sim_lines: dict[int, PlayArchetype] = {}
+        # Each guide claims four anchors, and a claim is identified by (guide key, call index) in claim order.
+        self.guide_identities: dict[int, list[tuple[Any, ...]]] = {}
+        self.claims_by_identity: dict[tuple[Any, ...], dict[tuple[int, int], dict[str, Any]]] = {}
+        self.anchors_by_identity: dict[tuple[Any, ...], list[BaseNote]] = {}
+        self.anchors_by_claim: dict[tuple[int, int], BaseNote] = {}
+        self.guide_connectors: dict[int, PlayArchetype] = {}
+
+        self.cached_level_data: LevelData | None = None
+        self.update(added=data.entities)
+
+    @property
+    def level_data(self) -> LevelData | None:
+        """The converted level, or None if the level doesn't need conversion."""
+        if not self.groups:
+            return None
+        if self.cached_level_data is None:
+            self.cached_level_data = LevelData(
+                bgm_offset=self.bgm_offset,
+                entities=[self.initialization, *(self.entities_by_sort_key[key] for key in self.order)],
+            )
+        return self.cached_level_data
+
+    def update(
+        self,
+        *,
+        added: Sequence[ExternalEntityData] = (),
+        changed: Mapping[int, ExternalEntityData] | None = None,
+        removed: Iterable[int] = (),
+    ) -> list[int]:
+        """Apply a diff to the source level and update level_data to match.
+
+        Added entities get the keys next_key, next_key + 1, and so on, which refs in the diff may already use. Returns
+        those keys. If the edited level is invalid, raises InvalidLevelDataError and leaves the session unchanged.
+        """
+        edits: dict[int, ExternalEntityData | None] = {}
+        for key in removed:
+            if key not in self.entities:
+                raise KeyError(key)
+            if key == 0:
+                raise ValueError("The first entity can't be removed, since a ref to it means no ref")
+            edits[key] = None
+        for key, entity in (changed or {}).items():
+            if key not in self.entities or key in edits:
+                raise KeyError(key)
+            edits[key] = entity
+        added_keys = list(range(self.next_key, self.next_key + len(added)))
+        edits.update(zip(added_keys, added, strict=True))
+
+        dirty_groups = {
+            key
+            for key, entity in edits.items()
+            if is_archetype(entity, "TimeScaleGroup") or is_archetype(self.entities.get(key), "TimeScaleGroup")
+        }
+        for key in edits:
+            dirty_groups.update(self.groups_by_change.get(key, ()))
+        self.validate(edits, dirty_groups)
+
+        previous = {key: self.entities.get(key) for key in edits}
+        for key, entity in edits.items():
+            old_entity = previous[key]
+            if old_entity is not None:
+                for ref in iter_refs(old_entity):
+                    self.referrers[ref].discard(key)
+            if entity is None:
+                del self.entities[key]
+            else:
+                self.entities[key] = entity
+                for ref in iter_refs(entity):
+                    self.referrers.setdefault(ref, set()).add(key)
+        self.next_key += len(added)
+
+        self.update_bpm_changes(previous)
+        replaced_groups = self.update_timescale_groups(dirty_groups)
+        self.update_notes(previous, replaced_groups)
+        self.update_guides(previous, replaced_groups)
+
+        self.update_order()
+        self.cached_level_data = None
+        return added_keys
+
+    def source(self) -> ExternalLevelData:
+        """Get the current source level, with keys renumbered to dense indices."""
+        index_by_key = {key: i for i, key in enumerate(self.entities)}
+        entities = []
+        for entity in self.entities.values():
+            data = dict(entity.data)
+            for field in iter_ref_fields(entity):
+                value = data[field]
+                if is_index(value) and int(value) in index_by_key:
+                    data[field] = index_by_key[int(value)]
+                elif field == "timeScaleGroup":
+                    # Notes with a missing group are converted without one.
+                    data[field] = -1
+            entities.append(ExternalEntityData(entity.archetype, data))
+        return ExternalLevelData(bgm_offset=self.bgm_offset, entities=entities)
+
+    def validate(self, edits: Mapping[int, ExternalEntityData | None], dirty_groups: set[int]):
+        def get_entity(key: int) -> ExternalEntityData | None:
+            return edits[key] if key in edits else self.entities.get(key)
+
+        # Entities referring to an edited entity may have been left with a dangling or mistyped ref.
+        keys = {key for key, entity in edits.items() if entity is not None}
+        for key in edits:
+            keys.update(self.referrers.get(key, ()))
+        diagnostics = []
+        for key in sorted(keys):
+            entity = get_entity(key)
+            if entity is None:
+                continue
+            diagnostics.extend(
+                Diagnostic(key, entity.archetype, field, message)
+                for field, message in iter_field_problems(get_entity, entity)
+            )
+        if not diagnostics:
+            for key in sorted(dirty_groups):
+                entity = get_entity(key)
+                if not is_archetype(entity, "TimeScaleGroup"):
+                    continue
+                visited = set()
+                change_key = int(entity.data["first"])
+                while change_key not in visited:
+                    visited.add(change_key)
+                    change = get_entity(change_key)
+                    if change is None or change.data.get("next", 0) <= 0:
+                        break
+                    change_key = int(change.data["next"])
+                else:
+                    diagnostics.append(
+                        Diagnostic(key, entity.archetype, "first", f"chain has a cycle at entity {change_key}")
+                    )
+        if diagnostics:
+            raise InvalidLevelDataError(diagnostics[:MAX_DIAGNOSTICS])
+
+    def update_bpm_changes(self, previous: Mapping[int, ExternalEntityData | None]):
+        for key, old_entity in previous.items():
+            entity = self.entities.get(key)
+            if is_archetype(old_entity, "#BPM_CHANGE"):
+                self.drop(self.bpm_changes.pop(key))
+            if is_archetype(entity, "#BPM_CHANGE"):
+                bpm_change = BpmChange(
+                    beat=entity.data["#BEAT"],
+                    bpm=entity.data["#BPM"],
+                )
+                self.bpm_changes[key] = bpm_change
+                self.put(bpm_change, (entity.data["#BEAT"], BPM_RUN, key))
+
+    def update_timescale_groups(self, dirty_groups: set[int]) -> set[int]:
+        """Rebuild the change chains of the given groups, returning the keys whose group was created or removed.
+
+        Groups that still exist keep their object, so nothing referring to them needs to be updated.
+        """
+        replaced_groups = set()
+        for key in sorted(dirty_groups):
+            for change in self.changes.pop(key, ()):
+                self.drop(change)
+            for change_key in self.chains.pop(key, ()):
+                self.groups_by_change[change_key].discard(key)
+            entity = self.entities.get(key)
+            group = self.groups.get(key)
+            if not is_archetype(entity, "TimeScaleGroup"):
+                if group is not None:
+                    self.drop(self.groups.pop(key))
+                    replaced_groups.add(key)
+                continue
+            if group is None:
+                group = TimescaleGroup()
+                self.groups[key] = group
+                self.put(group, (-1, TIMESCALE_RUN, key, 0))
+                replaced_groups.add(key)
+            chain = []
+            changes = []
+            change_key = int(entity.data["first"])
+            while True:
+                chain.append(change_key)
+                change_entity = self.entities[change_key]
+                change = TimescaleChange(
+                    beat=change_entity.data["#BEAT"],
+                    timescale=change_entity.data["timeScale"],
+                    timescale_skip=0.0,
+                    timescale_group=group.ref(),
+                    timescale_ease=TimescaleEase.NONE,
+                )
+                if changes:
+                    changes[-1].next_ref = change.ref()
+                changes.append(change)
+                self.put(change, (change_entity.data["#BEAT"], TIMESCALE_RUN, key, len(changes)))
+                self.groups_by_change.setdefault(change_key, set()).add(key)
+                if change_entity.data.get("next", 0) <= 0:
+                    break
+                change_key = int(change_entity.data["next"])
+            group.first_ref = changes[0].ref()
+            self.chains[key] = chain
+            self.changes[key] = changes
+        return replaced_groups
+
+    def update_notes(self, previous: Mapping[int, ExternalEntityData | None], replaced_groups: set[int]):
+        # Notes that were edited, or whose connector-derived fields may have changed, are rebuilt from scratch since
+        # refs can't be unset in place.
+        rebuilt_notes = set()
+        for key, old_entity in previous.items():
+            entity = self.entities.get(key)
+            if is_note(old_entity):
+                self.drop(self.notes.pop(key))
+            if is_note(entity):
+                rebuilt_notes.add(key)
+            for connector in (old_entity, entity):
+                if is_active_connector(connector):
+                    rebuilt_notes.update(int(connector.data[field]) for field in ("head", "tail", "start"))
+            if is_active_connector(old_entity):
+                self.drop(self.connectors.pop(key))
+            if is_archetype(old_entity, "SimLine"):
+                self.drop(self.sim_lines.pop(key))
+        for key in replaced_groups:
+            rebuilt_notes.update(
+                ref for ref in self.referrers.get(key, ()) if self.entities[ref].data.get("timeScaleGroup") == key
+            )
+        rebuilt_notes = {key for key in rebuilt_notes if is_note(self.entities.get(key))}
+        for key in rebuilt_notes:
+            if key in self.notes:
+                self.drop(self.notes[key])
+            entity = self.entities[key]
+            note = create_note(entity)
+            self.notes[key] = note
+            self.put(note, (entity.data["#BEAT"], NOTE_RUN, 0, key))
+
+        # Connectors and sim lines are never referred to, so they're simply recreated.
+        rebuilt_connectors = {key for key in previous if is_active_connector(self.entities.get(key))}
+        rebuilt_sim_lines = {key for key in previous if is_archetype(self.entities.get(key), "SimLine")}
+        for key in rebuilt_notes:
+            for ref in self.referrers.get(key, ()):
+                if is_active_connector(self.entities[ref]):
+                    rebuilt_connectors.add(ref)
+                elif is_archetype(self.entities[ref], "SimLine"):
+                    rebuilt_sim_lines.add(ref)
+        for key in rebuilt_connectors:
+            if key in self.connectors:
+                self.drop(self.connectors[key])
+            connector = create_connector(self.entities[key], self.notes)
+            self.connectors[key] = connector
+            self.put(connector, (-1, NOTE_RUN, 1, key))
+        for key in rebuilt_sim_lines:
+            if key in self.sim_lines:
+                self.drop(self.sim_lines[key])
+            sim_line = create_sim_line(self.entities[key], self.notes)
+            self.sim_lines[key] = sim_line
+            self.put(sim_line, (-1, NOTE_RUN, 2, key))
+
+        # Existing notes pointing at rebuilt notes through a connector have their refs repointed in place.
+        relinked_notes = set(rebuilt_notes)
+        for key in rebuilt_connectors:
+            relinked_notes.add(int(self.entities[key].data["head"]))
+            relinked_notes.update(ref for ref in self.referrers.get(key, ()) if is_note(self.entities[ref]))
+        for key in sorted(relinked_notes):
+            self.link_note(key)
+
+    def link_note(self, key: int):
+        note = self.notes[key]
+        # Later connectors overwrite earlier ones, as in convert_notes.
+        for connector_key in sorted(self.referrers.get(key, ())):
+            connector = self.entities[connector_key]
+            if not is_active_connector(connector):
+                continue
+            if connector.data["head"] == key:
+                note.next_ref = self.notes[connector.data["tail"]].ref()
+                note.connector_ease = ease_type_mapping[connector.data["ease"]]
+            if key in (connector.data["head"], connector.data["tail"], connector.data["start"]):
+                note.segment_kind = active_connector_kind_mapping[connector.archetype]
+        link_note(note, self.entities[key], self.entities, self.notes, self.groups)
+
+    def update_guides(self, previous: Mapping[int, ExternalEntityData | None], replaced_groups: set[int]):
+        edited_guides = {
+            key
+            for key, old_entity in previous.items()
+            if is_archetype(old_entity, "Guide") or is_archetype(self.entities.get(key), "Guide")
+        }
+        for key in replaced_groups:
+            edited_guides.update(
+                ref for ref in self.referrers.get(key, ()) if is_archetype(self.entities[ref], "Guide")
+            )
+
+        dirty_identities = set()
+        for key in edited_guides:
+            for call_index, identity in enumerate(self.guide_identities.pop(key, ())):
+                del self.claims_by_identity[identity][key, call_index]
+                del self.anchors_by_claim[key, call_index]
+                dirty_identities.add(identity)
+            if key in self.guide_connectors:
+                self.drop(self.guide_connectors.pop(key))
+            entity = self.entities.get(key)
+            if not is_archetype(entity, "Guide"):
+                continue
+            identities = []
+            for call_index, args in enumerate(get_guide_anchor_args(entity)):
+                identity = (args["beat"], args["lane"], args["size"], args["timescale_group"])
+                self.claims_by_identity.setdefault(identity, {})[key, call_index] = args
+                identities.append(identity)
+                dirty_identities.add(identity)
+            self.guide_identities[key] = identities
+
+        # Claims only interact with claims of the same identity, so each dirty identity is replayed on its own.
+        dirty_guides = set(edited_guides)
+        for identity in dirty_identities:
+            for anchor in self.anchors_by_identity.pop(identity, ()):
+                self.drop(anchor)
+            claims = self.claims_by_identity.get(identity)
+            if not claims:
+                self.claims_by_identity.pop(identity, None)
+                continue
+            anchors = []
+            matcher = AnchorMatcher(anchors)
+            for claim in sorted(claims):
+                args = claims[claim]
+                anchor_count = len(anchors)
+                anchor = matcher.get_anchor(**{**args, "timescale_group": self.groups[args["timescale_group"]].ref()})
+                if len(anchors) > anchor_count:
+                    self.put(anchor, (args["beat"], GUIDE_RUN, *claim))
+                self.anchors_by_claim[claim] = anchor
+                dirty_guides.add(claim[0])
+            matcher.apply_defaults()
+            self.anchors_by_identity[identity] = anchors
+
+        for key in dirty_guides:
+            if not is_archetype(self.entities.get(key), "Guide"):
+                continue
+            if key in self.guide_connectors:
+                self.drop(self.guide_connectors[key])
+            start, end, head, tail = (self.anchors_by_claim[key, call_index] for call_index in range(4))
+            connector = create_guide_connector(start, end, head, tail)
+            # Each anchor is the head of at most one guide, so this matches what link_slide_notes does.
+            head.next_ref = tail.ref()
+            self.guide_connectors[key] = connector
+            self.put(connector, (-1, GUIDE_RUN, key, 4))
+
+    def update_order(self):
+        pending = self.pending_sort_keys
+        added_sort_keys = sorted(key for key in pending if key in self.entities_by_sort_key)
+        if len(pending) * 64 < len(self.order):
+            # Small edits are spliced in, which is much cheaper than a full merge on large levels.
+            for key in pending:
+                i = bisect_left(self.order, key)
+                if i < len(self.order) and self.order[i] == key:
+                    del self.order[i]
+            for key in added_sort_keys:
+                insort(self.order, key)
+        else:
+            self.order = list(heapq.merge((key for key in self.order if key not in pending), added_sort_keys))
+        pending.clear()
+
+    def put(self, entity: PlayArchetype, sort_key: tuple[Any, ...]):
+        self.sort_keys[entity] = sort_key
+        self.entities_by_sort_key[sort_key] = entity
+        self.pending_sort_keys.add(sort_key)
+
+    def drop(self, entity: PlayArchetype):
+        sort_key = self.sort_keys.pop(entity)
+        if self.entities_by_sort_key.get(sort_key) is entity:
+            del self.entities_by_sort_key[sort_key]
+        self.pending_sort_keys.add(sort_key)
+
+
+def iter_ref_fields(entity: ExternalEntityData) -> Iterator[str]:
+    for spec in fields_by_archetype.get(entity.archetype, ()):
+        if spec.targets is not None and spec.name in entity.data:
+            yield spec.name
+    if is_note(entity) and "timeScaleGroup" in entity.data:
+        yield "timeScaleGroup"
+    if entity.archetype == "Guide":
+        yield from (field for field in GUIDE_TIMESCALE_GROUP_FIELDS if field in entity.data)
+
+
+def iter_refs(entity: ExternalEntityData) -> Iterator[int]:
+    for field in iter_ref_fields(entity):
+        value = entity.data[field]
+        if is_index(value) and value >= 0:
+            yield int(value)
+
+
+def is_archetype(entity: ExternalEntityData | None, archetype: str) -> TypeGuard[ExternalEntityData]:
+    return entity is not None and entity.archetype == archetype
+
+
+def is_note(entity: ExternalEntityData | None) -> TypeGuard[ExternalEntityData]:
+    return entity is not None and entity.archetype in note_type_mapping
+
+
+def is_active_connector(entity: ExternalEntityData | None) -> TypeGuard[ExternalEntityData]:
+    return entity is not None and entity.archetype in active_connector_kind_mapping
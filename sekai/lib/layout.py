@@ -7,6 +7,7 @@ from sonolus.script.easing import ease_in_quad
 from sonolus.script.globals import level_data, level_memory
 from sonolus.script.interval import clamp, interp, lerp, remap, unlerp
 from sonolus.script.quad import Quad, QuadLike, Rect
+from sonolus.script.record import Record
 from sonolus.script.runtime import aspect_ratio, is_preview, is_tutorial, screen, time
 from sonolus.script.values import swap
 from sonolus.script.vec import Vec2
@@ -276,6 +277,66 @@ def arc(q: QuadLike, n: int | None = None) -> Iterator[Quad]:
         yield arc_adjust_quad(segment)
 
 
+class ArcStripEdge(Record):
+    """An edge of an arc strip, split into n arc adjusted pieces.
+
+    Each piece is split evenly between the strip_n quads of the strip that it spans.
+    """
+
+    l: Vec2
+    r: Vec2
+    n: int
+    strip_n: int
+    piece_i: int
+    piece_start_i: int
+    piece_end_i: int
+    piece_l: Vec2
+    piece_r: Vec2
+
+    @classmethod
+    def of(cls, l: Vec2, r: Vec2, n: int, strip_n: int) -> "ArcStripEdge":
+        return cls(
+            l=l,
+            r=r,
+            n=n,
+            strip_n=strip_n,
+            piece_i=0,
+            piece_start_i=0,
+            piece_end_i=ceil(strip_n / n),
+            piece_l=arc_adjust_vec(l),
+            piece_r=arc_adjust_vec(lerp(l, r, 1 / n)),
+        )
+
+    def vertex_at(self, i: int) -> Vec2:
+        """Get the vertex between the i-th quad of the strip and the one before it, with i never decreasing."""
+        if i > self.piece_end_i:
+            self.piece_i += 1
+            self.piece_start_i = self.piece_end_i
+            self.piece_end_i = ceil((self.piece_i + 1) * self.strip_n / self.n)
+            self.piece_l @= self.piece_r
+            self.piece_r @= arc_adjust_vec(lerp(self.l, self.r, (self.piece_i + 1) / self.n))
+        return lerp(self.piece_l, self.piece_r, (i - self.piece_start_i) / (self.piece_end_i - self.piece_start_i))
+
+
+def arc_strip(q: QuadLike, bottom_n: int, top_n: int) -> Iterator[Quad]:
+    """Like arc, but with the bottom and top edges split into different numbers of arc adjusted pieces.
+
+    Yields as many quads as the edge with more pieces has, with each piece of the other edge split evenly between the
+    quads it spans, so the corners of both edges are kept. Each vertex along either edge is only arc adjusted once.
+    """
+    n = max(bottom_n, top_n)
+    bottom = ArcStripEdge.of(q.bl, q.br, bottom_n, n)
+    top = ArcStripEdge.of(q.tl, q.tr, top_n, n)
+    last_bottom = bottom.vertex_at(0)
+    last_top = top.vertex_at(0)
+    for i in range(1, n + 1):
+        next_bottom = bottom.vertex_at(i)
+        next_top = top.vertex_at(i)
+        yield Quad(bl=last_bottom, br=next_bottom, tl=last_top, tr=next_top)
+        last_bottom @= next_bottom
+        last_top @= next_top
+
+
 def get_center_and_angle_at_judge_line(lane: float) -> tuple[Vec2, float]:
     a = arc_adjust_vec(perspective_vec(lane, 1))
     b = arc_adjust_vec(perspective_vec(lane, 0.5))
@@ -317,6 +378,27 @@ def perspective_rect(l: float, r: float, t: float, b: float, travel: float = 1.0
     )
 
 
+def get_visible_lane_range(travel: float) -> tuple[float, float]:
+    """Get the lanes that can be in view at the given travel.
+
+    Lanes are clamped to the visible lanes before being laid out, so nothing outside of them has any width. In the modes
+    that only move things vertically, lanes past either side of the screen are out of view too, and since lanes spread
+    out as they travel, fewer of them are in view the greater the travel.
+    """
+    min_lane = Layout.min_visible_lane
+    max_lane = Layout.max_visible_lane
+    match Options.arc_mode:
+        case ArcMode.ARC | ArcMode.SWING:
+            pass
+        case ArcMode.DISABLED | ArcMode.CONVEX | ArcMode.CONCAVE | ArcMode.WAVE:
+            x_scale = DynamicLayout.w_scale * Options.zoom * travel
+            min_lane = max(min_lane, screen().l / x_scale)
+            max_lane = min(max_lane, screen().r / x_scale)
+        case _:
+            assert_never(Options.arc_mode)
+    return min_lane, max_lane
+
+
 def layout_sekai_stage() -> Quad:
     w = (2048 / 1420) * 12 / 2
     h = 1176 / 850
@@ -619,20 +701,22 @@ def layout_tick_effect(lane: float) -> Quad:
     )
 
 
-def layout_slide_connector_segment(
+def layout_slide_connector_strip(
     start_lane: float,
     start_size: float,
     start_travel: float,
+    start_n: int,
     end_lane: float,
     end_size: float,
     end_travel: float,
-    n: int,
+    end_n: int,
 ) -> Iterator[Quad]:
     if start_travel < end_travel:
         start_lane, end_lane = end_lane, start_lane
         start_size, end_size = end_size, start_size
         start_travel, end_travel = end_travel, start_travel
-    return arc(
+        start_n, end_n = end_n, start_n
+    return arc_strip(
         transform_quad(
             Quad(
                 bl=Vec2(start_lane - start_size, 1) * start_travel,
@@ -641,7 +725,8 @@ def layout_slide_connector_segment(
                 tr=Vec2(end_lane + end_size, 1) * end_travel,
             )
         ),
-        n,
+        bottom_n=start_n,
+        top_n=end_n,
     )
 
 
@@ -118,7 +118,7 @@ from sekai.lib.slot_effect import (
     slot_glow_effect_duration,
 )
 from sekai.lib.streams import Streams
-from sekai.lib.timescale import group_scaled_time_to_first_time, group_scaled_time_to_first_time_2
+from sekai.lib.timescale import group_scaled_time_window_to_first_time
 
 
 class NoteKind(IntEnum):
@@ -1039,8 +1039,9 @@ def get_visual_spawn_time(
     target_scaled_time: float,
 ):
     return min(
-        group_scaled_time_to_first_time(timescale_group, target_scaled_time - preempt_time()),
-        group_scaled_time_to_first_time_2(timescale_group, target_scaled_time + preempt_time()),
+        group_scaled_time_window_to_first_time(
+            timescale_group, target_scaled_time - preempt_time(), target_scaled_time + preempt_time()
+        ),
         -2 if 0 <= progress_to(target_scaled_time, -2) <= 2 else 1e8,
     )
 
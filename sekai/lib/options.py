@@ -342,6 +342,11 @@ class Options:
         step=0.1,
         unit=StandardText.PERCENTAGE_UNIT,
     )
+    adaptive_connector_tessellation: bool = toggle_option(
+        name="Adaptive Connector Tessellation",
+        scope="Next Sekai Arc",
+        default=False,
+    )
     note_margin: float = slider_option(
         name="Note Margin",
         scope="Next Sekai",
@@ -1,12 +1,16 @@
 from __future__ import annotations
 
 from collections.abc import Iterator
+from enum import IntEnum
 from math import inf
 from typing import Protocol, assert_never, cast
 
 from sonolus.script import runtime
 from sonolus.script.archetype import EntityRef, get_archetype_by_name
-from sonolus.script.interval import remap
+from sonolus.script.array import Array, Dim
+from sonolus.script.debug import debug_log, runtime_checks_enabled
+from sonolus.script.globals import level_memory
+from sonolus.script.interval import Interval, remap
 from sonolus.script.record import Record
 from sonolus.script.timing import TimescaleEase, beat_to_bpm, beat_to_time
 
@@ -15,6 +19,11 @@ from sekai.lib.options import Options
 
 MIN_START_TIME = -2.0
 
+# Padding on the scaled time range of each segment, so rounding in the root finding of linear segments can't find a
+# first time just outside of it.
+SCALED_TIME_RANGE_EPSILON = 1e-6
+MAX_CURSOR_STEPS = 2
+
 
 class TimescaleChangeLike(Protocol):
     beat: float
@@ -24,6 +33,25 @@ class TimescaleChangeLike(Protocol):
     hide_notes: bool
     next_ref: EntityRef
 
+    # Filled in by preprocess_timescale_changes, in order along the group's chain.
+    time: float
+    scaled_time: float
+    skip_scaled_time: float
+    max_time: float
+    min_scaled_time: float
+    max_scaled_time: float
+    prev_ref: EntityRef
+    jump_ref: EntityRef
+    ordinal: int
+    is_monotonic: bool
+    # Of the segment leading up to the change, for inverse lookups.
+    unskipped_scaled_time: float
+    segment_min_scaled_time: float
+    segment_max_scaled_time: float
+    timescale_slope: float
+    # Filled in by preprocess_timescale_hide_notes.
+    hide_notes_end_time: float
+
     @classmethod
     def at(cls, index: int) -> TimescaleChangeLike: ...
 
@@ -33,10 +61,14 @@ class TimescaleChangeLike(Protocol):
 
 class TimescaleGroupLike(Protocol):
     first_ref: EntityRef
+    curve_ref: EntityRef
+    prev_curve_ref: EntityRef
+    hide_notes_start_time: float
     time_to_scaled_time: TimeToScaledTime
     time_to_last_change_index: TimeToLastChangeIndex
     scaled_time_to_first_time: ScaledTimeToFirstTime
-    scaled_time_to_first_time_2: ScaledTimeToFirstTime
+    scaled_time_window_to_first_time: ScaledTimeWindowToFirstTime
+    active_interval: Interval
     current_scaled_time: float
     hide_notes: bool
 
@@ -44,188 +76,532 @@ class TimescaleGroupLike(Protocol):
     def at(cls, index: int) -> TimescaleGroupLike: ...
 
 
-class TimeToScaledTime(Record):
-    last_timescale: float
-    last_time: float
-    last_scaled_time: float
-    last_ease: TimescaleEase
-    first_change_index: int
-    next_change_index: int
+@level_memory
+class TimescaleMemory:
+    # The last group with changes unlike those of any group before it, see share_timescale_curve.
+    last_curve_group_index: int
+
+
+class TimescaleSearch(IntEnum):
+    TIME_AT_OR_AFTER = 0
+    TIME_AFTER = 1
+    SCALED_TIME = 2
+
+
+@level_memory
+class TimescaleStats:
+    # Only kept when runtime checks are enabled.
+    queries: int
+    changes_walked: int
+    # Lookups where the cursor was too far from the result, by search.
+    resets: Array[int, Dim[3]]
+    # The group that walked the most changes in a single frame, see record_timescale_group_frame.
+    worst_group_index: int
+    worst_group_changes_walked: int
+
+
+class TimescaleWork(Record):
+    queries: int
+    changes_walked: int
+
+
+def timescale_work() -> TimescaleWork:
+    if runtime_checks_enabled():
+        return TimescaleWork(queries=TimescaleStats.queries, changes_walked=TimescaleStats.changes_walked)
+    return TimescaleWork(queries=0, changes_walked=0)
+
+
+def record_timescale_query():
+    if runtime_checks_enabled():
+        TimescaleStats.queries += 1
+
+
+def record_timescale_change_walked():
+    if runtime_checks_enabled():
+        TimescaleStats.changes_walked += 1
+
+
+def record_timescale_reset(search: TimescaleSearch):
+    if runtime_checks_enabled():
+        TimescaleStats.resets[search] += 1
+
+
+def record_timescale_group_frame(group_index: int, start_work: TimescaleWork):
+    if runtime_checks_enabled():
+        queries = TimescaleStats.queries - start_work.queries
+        changes_walked = TimescaleStats.changes_walked - start_work.changes_walked
+        if changes_walked > TimescaleStats.worst_group_changes_walked:
+            TimescaleStats.worst_group_index = group_index
+            TimescaleStats.worst_group_changes_walked = changes_walked
+            # Logged as they come up, so the log lists the worst groups.
+            debug_log(group_index)
+            debug_log(queries)
+            debug_log(changes_walked)
+
+
+class TimescaleSegment(Record):
+    time: float
+    scaled_time: float
+    timescale: float
+    ease: TimescaleEase
+
+
+def preprocess_timescale_changes(first_index: int) -> int:
+    segment = initial_timescale_segment()
+    max_time = -inf
+    min_scaled_time = inf
+    max_scaled_time = -inf
+    is_monotonic = True
+    prev_index = 0
+    for change in iter_timescale_changes(first_index):
+        next_time = beat_to_time(change.beat)
+        next_timescale = change.timescale
+        timescale_slope = 0.0
+        match segment.ease:
+            case TimescaleEase.NONE:
+                next_scaled_time = segment.scaled_time + (next_time - segment.time) * segment.timescale
+                lo_scaled_time = min(segment.scaled_time, next_scaled_time)
+                hi_scaled_time = max(segment.scaled_time, next_scaled_time)
+            case TimescaleEase.LINEAR:
+                next_scaled_time = (
+                    segment.scaled_time + (next_time - segment.time) * (next_timescale + segment.timescale) / 2
+                )
+                # Lookups treat nearly constant timescales as constant, so include where that would end up too.
+                linear_scaled_time = segment.scaled_time + (next_time - segment.time) * segment.timescale
+                lo_scaled_time = min(segment.scaled_time, next_scaled_time, linear_scaled_time)
+                hi_scaled_time = max(segment.scaled_time, next_scaled_time, linear_scaled_time)
+                if abs(next_time - segment.time) >= 1e-6:
+                    timescale_slope = (next_timescale - segment.timescale) / (next_time - segment.time)
+                if segment.timescale * next_timescale < 0:
+                    # The timescale crosses zero, so the scaled time turns around partway through.
+                    turn_scaled_time = (
+                        segment.scaled_time
+                        + (next_time - segment.time)
+                        * segment.timescale
+                        * segment.timescale
+                        / (segment.timescale - next_timescale)
+                        / 2
+                    )
+                    lo_scaled_time = min(lo_scaled_time, turn_scaled_time)
+                    hi_scaled_time = max(hi_scaled_time, turn_scaled_time)
+            case _:
+                assert_never(segment.ease)
+        lo_scaled_time = min(lo_scaled_time, next_scaled_time + change.timescale_skip)
+        hi_scaled_time = max(hi_scaled_time, next_scaled_time + change.timescale_skip)
+        max_time = max(max_time, next_time)
+        min_scaled_time = min(min_scaled_time, lo_scaled_time - SCALED_TIME_RANGE_EPSILON)
+        max_scaled_time = max(max_scaled_time, hi_scaled_time + SCALED_TIME_RANGE_EPSILON)
+        is_monotonic = is_monotonic and next_time >= segment.time and next_timescale >= 0 and change.timescale_skip >= 0
+
+        change.time = next_time
+        change.skip_scaled_time = change.timescale_skip * 60 / beat_to_bpm(change.beat)
+        change.scaled_time = next_scaled_time + change.skip_scaled_time
+        change.max_time = max_time
+        change.min_scaled_time = min_scaled_time
+        change.max_scaled_time = max_scaled_time
+        change.is_monotonic = is_monotonic
+        change.unskipped_scaled_time = next_scaled_time
+        change.segment_min_scaled_time = lo_scaled_time - SCALED_TIME_RANGE_EPSILON
+        change.segment_max_scaled_time = hi_scaled_time + SCALED_TIME_RANGE_EPSILON
+        change.timescale_slope = timescale_slope
+        change.prev_ref.index = prev_index
+        change.jump_ref.index = get_jump_index(prev_index)
+        change.ordinal = 0
+        if prev_index > 0:
+            change.ordinal = timescale_change_archetype().at(prev_index).ordinal + 1
+
+        segment.time = change.time
+        segment.scaled_time = change.scaled_time
+        segment.timescale = next_timescale
+        segment.ease = change.timescale_ease
+        prev_index = change.index
+    return prev_index
+
+
+def preprocess_timescale_hide_notes(last_index: int) -> float:
+    start_time = inf
+    end_time = inf
+    next_hide_notes = False
+    next_max_time = inf
+    index = last_index
+    while index > 0:
+        change = timescale_change_archetype().at(index)
+        # Changes with the same max_time as the next one never decide whether notes are hidden.
+        if change.max_time < next_max_time:
+            if index != last_index and change.hide_notes != next_hide_notes:
+                end_time = next_max_time
+            if change.hide_notes:
+                start_time = change.max_time
+            next_hide_notes = change.hide_notes
+        change.hide_notes_end_time = end_time
+        next_max_time = change.max_time
+        index = change.prev_ref.index
+    return start_time
+
+
+def get_jump_index(prev_index: int) -> int:
+    # Skew-binary jump pointers, so searching back from the last change takes logarithmic steps.
+    if prev_index <= 0:
+        return 0
+    prev = timescale_change_archetype().at(prev_index)
+    jump_index = prev.jump_ref.index
+    if jump_index <= 0:
+        return prev_index
+    jump = timescale_change_archetype().at(jump_index)
+    if jump.jump_ref.index <= 0:
+        return prev_index
+    jump_jump = timescale_change_archetype().at(jump.jump_ref.index)
+    if prev.ordinal - jump.ordinal == jump.ordinal - jump_jump.ordinal:
+        return jump_jump.index
+    return prev_index
+
+
+def change_reaches(change: TimescaleChangeLike, search: TimescaleSearch, value: float) -> bool:
+    match search:
+        case TimescaleSearch.TIME_AT_OR_AFTER:
+            return value <= change.max_time
+        case TimescaleSearch.TIME_AFTER:
+            return value < change.max_time
+        case TimescaleSearch.SCALED_TIME:
+            return change.min_scaled_time <= value <= change.max_scaled_time
+        case _:
+            assert_never(search)
+
+
+def find_first_change(last_index: int, search: TimescaleSearch, value: float, cursor_index: int = 0) -> int:
+    # Once a change reaches a value, so does every change after it, so lookups near the cursor only walk a few changes.
+    # Lookups only move backwards in watch mode, when scrubbing, so elsewhere only the change after the cursor is tried.
+    index = last_index
+    if runtime.is_watch():
+        if cursor_index <= 0:
+            cursor_index = last_index
+        if cursor_index > 0:
+            if change_reaches(timescale_change_archetype().at(cursor_index), search, value):
+                index = cursor_index
+                for _ in range(MAX_CURSOR_STEPS):
+                    record_timescale_change_walked()
+                    prev_index = timescale_change_archetype().at(index).prev_ref.index
+                    if prev_index <= 0 or not change_reaches(
+                        timescale_change_archetype().at(prev_index), search, value
+                    ):
+                        return index
+                    index = prev_index
+            else:
+                next_index = cursor_index
+                for _ in range(MAX_CURSOR_STEPS):
+                    record_timescale_change_walked()
+                    next_index = timescale_change_archetype().at(next_index).next_ref.index
+                    if next_index <= 0:
+                        return 0
+                    if change_reaches(timescale_change_archetype().at(next_index), search, value):
+                        return next_index
+    elif cursor_index > 0:
+        cursor = timescale_change_archetype().at(cursor_index)
+        if change_reaches(cursor, search, value):
+            index = cursor_index
+        else:
+            record_timescale_change_walked()
+            next_index = cursor.next_ref.index
+            if next_index <= 0:
+                return 0
+            if change_reaches(timescale_change_archetype().at(next_index), search, value):
+                return next_index
+    record_timescale_reset(search)
+    if index <= 0 or not change_reaches(timescale_change_archetype().at(index), search, value):
+        return 0
+    while True:
+        record_timescale_change_walked()
+        change = timescale_change_archetype().at(index)
+        jump_index = change.jump_ref.index
+        if jump_index > 0 and change_reaches(timescale_change_archetype().at(jump_index), search, value):
+            index = jump_index
+            continue
+        prev_index = change.prev_ref.index
+        if prev_index > 0 and change_reaches(timescale_change_archetype().at(prev_index), search, value):
+            index = prev_index
+            continue
+        return index
+
+
+def initial_timescale_segment() -> TimescaleSegment:
+    return TimescaleSegment(
+        time=MIN_START_TIME,
+        scaled_time=MIN_START_TIME,
+        timescale=1.0,
+        ease=TimescaleEase.NONE,
+    )
+
+
+def timescale_segment_after(change_index: int) -> TimescaleSegment:
+    segment = initial_timescale_segment()
+    if change_index > 0:
+        change = timescale_change_archetype().at(change_index)
+        segment.time = change.time
+        segment.scaled_time = change.scaled_time
+        segment.timescale = change.timescale
+        segment.ease = change.timescale_ease
+    return segment
+
+
+def timescale_segment_before(change_index: int) -> TimescaleSegment:
+    return timescale_segment_after(timescale_change_archetype().at(change_index).prev_ref.index)
 
-    def init(self, next_index: int):
-        self.first_change_index = next_index
+
+class TimeToScaledTime(Record):
+    last_change_index: int
+    # The first change at or after the last queried time, or 0 if there is none, which stays the same for times in
+    # (min_time, max_time]. The segment leading up to it is kept here too, so most lookups don't read any changes.
+    change_index: int
+    min_time: float
+    max_time: float
+    segment: TimescaleSegment
+    next_time: float
+    next_timescale: float
+    next_scaled_time: float
+    skip_scaled_time: float
+
+    def init(self, last_index: int):
+        self.last_change_index = last_index
         self.reset()
 
     def reset(self):
-        self.last_timescale = 1.0
-        self.last_time = MIN_START_TIME
-        self.last_scaled_time = MIN_START_TIME
-        self.last_ease = TimescaleEase.NONE
-        self.next_change_index = self.first_change_index
+        self.change_index = 0
+        self.min_time = inf
+        self.max_time = -inf
 
     def get(self, time: float) -> float:
+        record_timescale_query()
         if time <= MIN_START_TIME or Options.disable_timescale:
             return time
-        if time < self.last_time:
-            self.reset()
-        for change in iter_timescale_changes(self.next_change_index):
-            next_timescale = change.timescale
-            next_time = beat_to_time(change.beat)
-            match self.last_ease:
-                case TimescaleEase.NONE:
-                    next_scaled_time = self.last_scaled_time + (next_time - self.last_time) * self.last_timescale
-                case TimescaleEase.LINEAR:
-                    next_scaled_time = (
-                        self.last_scaled_time
-                        + (next_time - self.last_time) * (next_timescale + self.last_timescale) / 2
-                    )
-                case _:
-                    assert_never(self.last_ease)
-            skip_scaled_time = change.timescale_skip * 60 / beat_to_bpm(change.beat)
-            if time == next_time:
-                return next_scaled_time + skip_scaled_time
-            if time < next_time:
-                if abs(next_time - self.last_time) < 1e-6:
-                    return self.last_scaled_time
-                match self.last_ease:
-                    case TimescaleEase.NONE:
-                        return remap(self.last_time, next_time, self.last_scaled_time, next_scaled_time, time)
-                    case TimescaleEase.LINEAR:
-                        avg_timescale = (
-                            self.last_timescale
-                            + remap(self.last_time, next_time, self.last_timescale, next_timescale, time)
-                        ) / 2
-                        return self.last_scaled_time + (time - self.last_time) * avg_timescale
-                    case _:
-                        assert_never(self.last_ease)
-            self.last_timescale = next_timescale
-            self.last_time = next_time
-            self.last_scaled_time = next_scaled_time + skip_scaled_time
-            self.last_ease = change.timescale_ease
-            self.next_change_index = change.next_ref.index
-        return self.last_scaled_time + (time - self.last_time) * self.last_timescale
+        if not (self.min_time < time <= self.max_time):
+            self.seek(time)
+        segment = self.segment
+        if self.change_index <= 0:
+            return segment.scaled_time + (time - segment.time) * segment.timescale
+        if time == self.next_time:
+            return self.next_scaled_time + self.skip_scaled_time
+        if abs(self.next_time - segment.time) < 1e-6:
+            return segment.scaled_time
+        match segment.ease:
+            case TimescaleEase.NONE:
+                return remap(segment.time, self.next_time, segment.scaled_time, self.next_scaled_time, time)
+            case TimescaleEase.LINEAR:
+                avg_timescale = (
+                    segment.timescale
+                    + remap(segment.time, self.next_time, segment.timescale, self.next_timescale, time)
+                ) / 2
+                return segment.scaled_time + (time - segment.time) * avg_timescale
+            case _:
+                assert_never(segment.ease)
+
+    def seek(self, time: float):
+        self.change_index = find_first_change(
+            self.last_change_index, TimescaleSearch.TIME_AT_OR_AFTER, time, self.change_index
+        )
+        self.min_time, self.max_time = get_search_window(self.change_index, self.last_change_index)
+        if self.change_index <= 0:
+            self.segment @= timescale_segment_after(self.last_change_index)
+            return
+        self.segment @= timescale_segment_before(self.change_index)
+        change = timescale_change_archetype().at(self.change_index)
+        self.next_time = change.time
+        self.next_timescale = change.timescale
+        self.skip_scaled_time = change.skip_scaled_time
+        self.next_scaled_time = change.unskipped_scaled_time
+
+
+def get_search_window(change_index: int, last_index: int) -> tuple[float, float]:
+    prev_index = last_index
+    min_time = -inf
+    max_time = inf
+    if change_index > 0:
+        change = timescale_change_archetype().at(change_index)
+        prev_index = change.prev_ref.index
+        max_time = change.max_time
+    if prev_index > 0:
+        min_time = timescale_change_archetype().at(prev_index).max_time
+    return min_time, max_time
 
 
 class TimeToLastChangeIndex(Record):
-    last_time: float
-    first_change_index: int
-    current_change_index: int
+    last_change_index: int
+    # The first change after the last queried time, or 0 if there is none, and the change before it, which stay the
+    # same for times in [min_time, max_time).
     next_change_index: int
+    current_change_index: int
+    min_time: float
+    max_time: float
 
-    def init(self, next_index: int):
-        self.first_change_index = next_index
+    def init(self, last_index: int):
+        self.last_change_index = last_index
         self.reset()
 
     def reset(self):
-        self.last_time = MIN_START_TIME
+        self.next_change_index = 0
         self.current_change_index = 0
-        self.next_change_index = self.first_change_index
+        self.min_time = inf
+        self.max_time = -inf
 
     def get(self, time: float) -> int:
-        if time < self.last_time:
-            self.reset()
-        for change in iter_timescale_changes(self.next_change_index):
-            next_time = beat_to_time(change.beat)
-            if time < next_time:
-                return self.current_change_index
-            self.last_time = next_time
-            self.current_change_index = change.index
-            self.next_change_index = change.next_ref.index
+        record_timescale_query()
+        if not (self.min_time <= time < self.max_time):
+            self.next_change_index = find_first_change(
+                self.last_change_index, TimescaleSearch.TIME_AFTER, time, self.next_change_index
+            )
+            if self.next_change_index > 0:
+                self.current_change_index = timescale_change_archetype().at(self.next_change_index).prev_ref.index
+            else:
+                self.current_change_index = self.last_change_index
+            self.min_time, self.max_time = get_search_window(self.next_change_index, self.last_change_index)
         return self.current_change_index
 
 
 class ScaledTimeToFirstTime(Record):
-    last_timescale: float
-    last_time: float
-    last_scaled_time: float
-    last_ease: TimescaleEase
-    first_change_index: int
-    next_change_index: int
-    last_query_scaled_time: float
+    last_change_index: int
+    # The change the last lookup started from, which the next lookup walks from.
+    change_index: int
 
-    def init(self, next_index: int):
-        self.first_change_index = next_index
-        self.reset()
-
-    def reset(self):
-        self.last_timescale = 1.0
-        self.last_time = MIN_START_TIME
-        self.last_scaled_time = MIN_START_TIME
-        self.last_ease = TimescaleEase.NONE
-        self.next_change_index = self.first_change_index
-        self.last_query_scaled_time = MIN_START_TIME
+    def init(self, last_index: int):
+        self.last_change_index = last_index
+        self.change_index = 0
 
     def get(self, scaled_time: float) -> float:
+        record_timescale_query()
         if Options.disable_timescale:
             return scaled_time
-        if scaled_time < self.last_query_scaled_time or self.last_query_scaled_time < MIN_START_TIME:
-            self.reset()
-        self.last_query_scaled_time = scaled_time
-        for change in iter_timescale_changes(self.next_change_index):
-            next_timescale = change.timescale
-            next_time = beat_to_time(change.beat)
-            match self.last_ease:
-                case TimescaleEase.NONE:
-                    next_scaled_time = self.last_scaled_time + (next_time - self.last_time) * self.last_timescale
-                    if (self.last_scaled_time <= scaled_time <= next_scaled_time and self.last_timescale > 0) or (
-                        self.last_scaled_time >= scaled_time >= next_scaled_time and self.last_timescale < 0
-                    ):
-                        if abs(next_scaled_time - self.last_scaled_time) < 1e-6:
-                            return self.last_time
-                        return remap(self.last_scaled_time, next_scaled_time, self.last_time, next_time, scaled_time)
-                case TimescaleEase.LINEAR:
-                    next_scaled_time = (
-                        self.last_scaled_time
-                        + (next_time - self.last_time) * (next_timescale + self.last_timescale) / 2
-                    )
-                    if abs(next_time - self.last_time) < 1e-6:
-                        lo_scaled_time = min(self.last_scaled_time, next_scaled_time)
-                        hi_scaled_time = max(self.last_scaled_time, next_scaled_time)
-                        if lo_scaled_time <= scaled_time <= hi_scaled_time:
-                            return self.last_time
-                    else:
-                        a = (next_timescale - self.last_timescale) / (next_time - self.last_time)
-                        b = self.last_timescale
-                        c = self.last_scaled_time - scaled_time
-
-                        first_time = inf
-                        found_time = False
-
-                        if abs(a) < 1e-6:
-                            if abs(b) > 1e-6:
-                                dt = -c / b
-                                if 0 <= dt <= (next_time - self.last_time):
-                                    first_time = min(first_time, self.last_time + dt)
-                                    found_time = True
+        # No change before this one has a segment that reaches the scaled time, so start from here. Skips can jump
+        # over the scaled time, so it may not be reached until a later change.
+        first_index = find_first_change(
+            self.last_change_index, TimescaleSearch.SCALED_TIME, scaled_time, self.change_index
+        )
+        self.change_index = first_index
+        segment = timescale_segment_after(
+            timescale_change_archetype().at(first_index).prev_ref.index if first_index > 0 else self.last_change_index
+        )
+        for change in iter_timescale_changes(first_index):
+            record_timescale_change_walked()
+            # Most segments don't reach the scaled time at all, skip included, so they're passed over by their range
+            # before solving for anything.
+            if change.segment_min_scaled_time <= scaled_time <= change.segment_max_scaled_time:
+                next_time = change.time
+                next_scaled_time = change.unskipped_scaled_time
+                match segment.ease:
+                    case TimescaleEase.NONE:
+                        if (segment.scaled_time <= scaled_time <= next_scaled_time and segment.timescale > 0) or (
+                            segment.scaled_time >= scaled_time >= next_scaled_time and segment.timescale < 0
+                        ):
+                            if abs(next_scaled_time - segment.scaled_time) < 1e-6:
+                                return segment.time
+                            return remap(segment.scaled_time, next_scaled_time, segment.time, next_time, scaled_time)
+                    case TimescaleEase.LINEAR:
+                        if abs(next_time - segment.time) < 1e-6:
+                            lo_scaled_time = min(segment.scaled_time, next_scaled_time)
+                            hi_scaled_time = max(segment.scaled_time, next_scaled_time)
+                            if lo_scaled_time <= scaled_time <= hi_scaled_time:
+                                return segment.time
                         else:
-                            discriminant = b * b - 2 * a * c
-                            if discriminant >= 0:
-                                sqrt_discriminant = discriminant**0.5
-                                for dt in ((-b + sqrt_discriminant) / a, (-b - sqrt_discriminant) / a):
-                                    if 0 <= dt <= (next_time - self.last_time):
-                                        first_time = min(first_time, self.last_time + dt)
+                            a = change.timescale_slope
+                            b = segment.timescale
+                            c = segment.scaled_time - scaled_time
+
+                            first_time = inf
+                            found_time = False
+
+                            if abs(a) < 1e-6:
+                                if abs(b) > 1e-6:
+                                    dt = -c / b
+                                    if 0 <= dt <= (next_time - segment.time):
+                                        first_time = min(first_time, segment.time + dt)
                                         found_time = True
-
-                        if found_time:
-                            return first_time
-                case _:
-                    assert_never(self.last_ease)
-            skip_scaled_time = change.timescale_skip * 60 / beat_to_bpm(change.beat)
-            if (next_scaled_time <= scaled_time <= next_scaled_time + change.timescale_skip) or (
-                next_scaled_time + change.timescale_skip <= scaled_time <= next_scaled_time
-            ):
-                return next_time
-            self.last_timescale = next_timescale
-            self.last_time = next_time
-            self.last_scaled_time = next_scaled_time + skip_scaled_time
-            self.last_ease = change.timescale_ease
-            self.next_change_index = change.next_ref.index
-        if self.last_timescale == 0:
+                            else:
+                                discriminant = b * b - 2 * a * c
+                                if discriminant >= 0:
+                                    sqrt_discriminant = discriminant**0.5
+                                    for dt in ((-b + sqrt_discriminant) / a, (-b - sqrt_discriminant) / a):
+                                        if 0 <= dt <= (next_time - segment.time):
+                                            first_time = min(first_time, segment.time + dt)
+                                            found_time = True
+
+                            if found_time:
+                                return first_time
+                    case _:
+                        assert_never(segment.ease)
+                if (next_scaled_time <= scaled_time <= next_scaled_time + change.timescale_skip) or (
+                    next_scaled_time + change.timescale_skip <= scaled_time <= next_scaled_time
+                ):
+                    return next_time
+            segment.timescale = change.timescale
+            segment.time = change.time
+            segment.scaled_time = change.scaled_time
+            segment.ease = change.timescale_ease
+        if segment.timescale == 0:
             return inf
-        additional_time = (scaled_time - self.last_scaled_time) / self.last_timescale
+        additional_time = (scaled_time - segment.scaled_time) / segment.timescale
         if additional_time < 0:
             return inf
-        return self.last_time + additional_time
+        return segment.time + additional_time
+
+
+class ScaledTimeWindowToFirstTime(Record):
+    start: ScaledTimeToFirstTime
+    end: ScaledTimeToFirstTime
+    is_monotonic: bool
+
+    def init(self, last_index: int):
+        self.start.init(last_index)
+        self.end.init(last_index)
+        self.is_monotonic = True
+        if last_index > 0:
+            self.is_monotonic = timescale_change_archetype().at(last_index).is_monotonic
+
+    def get(self, start_scaled_time: float, end_scaled_time: float) -> float:
+        first_time = self.start.get(start_scaled_time)
+        if self.is_monotonic and start_scaled_time >= MIN_START_TIME:
+            # The scaled time never goes down, so it reaches the start of the window first and the end doesn't need
+            # looking up. Levels list notes in time order, so the start cursor then sweeps forward through each group.
+            return first_time
+        return min(first_time, self.end.get(end_scaled_time))
+
+
+def share_timescale_curve(group_index: int, last_index: int) -> int:
+    # Groups that only differ in hide_notes share the scaled time lookups of the first of them.
+    first_index = timescale_group_archetype().at(group_index).first_ref.index
+    curve_index = TimescaleMemory.last_curve_group_index
+    while curve_index > 0:
+        curve_group = timescale_group_archetype().at(curve_index)
+        if timescale_changes_match(
+            first_index, last_index, curve_group.first_ref.index, curve_group.time_to_scaled_time.last_change_index
+        ):
+            return curve_index
+        curve_index = curve_group.prev_curve_ref.index
+    timescale_group_archetype().at(group_index).prev_curve_ref.index = TimescaleMemory.last_curve_group_index
+    TimescaleMemory.last_curve_group_index = group_index
+    return group_index
+
+
+def timescale_changes_match(first_index: int, last_index: int, other_first_index: int, other_last_index: int) -> bool:
+    if last_index <= 0 or other_last_index <= 0:
+        return last_index <= 0 and other_last_index <= 0
+    # Most groups that differ already differ in their length or where they end up.
+    last = timescale_change_archetype().at(last_index)
+    other_last = timescale_change_archetype().at(other_last_index)
+    if last.ordinal != other_last.ordinal or last.time != other_last.time or last.scaled_time != other_last.scaled_time:
+        return False
+    index = first_index
+    other_index = other_first_index
+    while index > 0:
+        change = timescale_change_archetype().at(index)
+        other = timescale_change_archetype().at(other_index)
+        if (
+            change.beat != other.beat
+            or change.timescale != other.timescale
+            or change.timescale_skip != other.timescale_skip
+            or change.timescale_ease != other.timescale_ease
+        ):
+            return False
+        index = change.next_ref.index
+        other_index = other.next_ref.index
+    return True
 
 
 def timescale_change_archetype() -> type[TimescaleChangeLike]:
@@ -250,7 +626,22 @@ def group_scaled_time(group: int | EntityRef):
         group = group.index
     if group <= 0 or Options.disable_timescale:
         return runtime.time()
-    return timescale_group_archetype().at(group).current_scaled_time
+    return timescale_group_archetype().at(curve_group_index(group)).current_scaled_time
+
+
+def curve_group_index(group: int) -> int:
+    return timescale_group_archetype().at(group).curve_ref.index
+
+
+def mark_timescale_group_active(group: int | EntityRef, start_time: float, end_time: float):
+    if isinstance(group, EntityRef):
+        group = group.index
+    if group <= 0:
+        return
+    for index in (group, curve_group_index(group)):
+        active_interval = timescale_group_archetype().at(index).active_interval
+        active_interval.start = min(active_interval.start, start_time)
+        active_interval.end = max(active_interval.end, end_time)
 
 
 def group_hide_notes(group: int | EntityRef) -> bool:
@@ -261,6 +652,24 @@ def group_hide_notes(group: int | EntityRef) -> bool:
     return timescale_group_archetype().at(group).hide_notes
 
 
+def group_hide_notes_until(group: int | EntityRef, time: float) -> tuple[bool, float]:
+    # Moves the group's cursors, so it's only meant for preprocess.
+    if isinstance(group, EntityRef):
+        group = group.index
+    hide_notes = False
+    end_time = inf
+    if group > 0:
+        group_entity = timescale_group_archetype().at(group)
+        change_index = group_entity.time_to_last_change_index.get(time)
+        if change_index > 0:
+            change = timescale_change_archetype().at(change_index)
+            hide_notes = change.hide_notes
+            end_time = change.hide_notes_end_time
+        else:
+            end_time = group_entity.hide_notes_start_time
+    return hide_notes, end_time
+
+
 def iter_timescale_changes_in_group_after_time_inclusive(
     group: int | EntityRef,
     time: float,
@@ -273,7 +682,7 @@ def iter_timescale_changes_in_group_after_time_inclusive(
     next_index = group_entity.time_to_last_change_index.get(time)
     while next_index > 0:
         change = timescale_change_archetype().at(next_index)
-        change_time = beat_to_time(change.beat)
+        change_time = change.time
         next_index = change.next_ref.index
         if change_time < time:
             continue
@@ -286,7 +695,7 @@ def group_time_to_scaled_time(
 ) -> float:
     if isinstance(group, EntityRef):
         group = group.index
-    return timescale_group_archetype().at(group).time_to_scaled_time.get(time)
+    return timescale_group_archetype().at(curve_group_index(group)).time_to_scaled_time.get(time)
 
 
 def group_scaled_time_to_first_time(
@@ -295,14 +704,18 @@ def group_scaled_time_to_first_time(
 ) -> float:
     if isinstance(group, EntityRef):
         group = group.index
-    return timescale_group_archetype().at(group).scaled_time_to_first_time.get(scaled_time)
+    return timescale_group_archetype().at(curve_group_index(group)).scaled_time_to_first_time.get(scaled_time)
 
 
-def group_scaled_time_to_first_time_2(
+def group_scaled_time_window_to_first_time(
     group: int | EntityRef,
-    scaled_time: float,
+    start_scaled_time: float,
+    end_scaled_time: float,
 ) -> float:
-    # This is a second function so that we don't have to reset the timescale groups as often
     if isinstance(group, EntityRef):
         group = group.index
-    return timescale_group_archetype().at(group).scaled_time_to_first_time_2.get(scaled_time)
+    return (
+        timescale_group_archetype()
+        .at(curve_group_index(group))
+        .scaled_time_window_to_first_time.get(start_scaled_time, end_scaled_time)
+    )
@@ -0,0 +1,374 @@
+"""Evaluate the timescale groups of converted levels offline, for whole arrays of times at once.
+
+This mirrors the math of TimeToScaledTime and ScaledTimeToFirstTime in sekai.lib.timescale operation for operation, so
+results match the engine's exactly, which makes it usable for analyzing charts as well as for checking the engine
+against. It's tooling rather than engine code, and unlike the engine it needs NumPy.
+"""
+
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+from sonolus.script.level import LevelData
+from sonolus.script.timing import TimescaleEase
+
+from sekai.lib.timescale import MIN_START_TIME, SCALED_TIME_RANGE_EPSILON
+from sekai.play.bpm_change import BpmChange
+from sekai.play.note import BaseNote
+from sekai.play.timescale import TimescaleChange, TimescaleGroup
+
+type FloatArray = NDArray[np.float64]
+
+
+class BpmTimeline:
+    """Converts beats to times given a level's bpm changes.
+
+    The first bpm applies from beat 0 (and before), as levels start with a bpm change at beat 0.
+    """
+
+    def __init__(self, bpm_changes: Iterable[tuple[float, float]]):
+        changes = sorted(bpm_changes) or [(0.0, 60.0)]
+        self.beats = np.array([beat for beat, _ in changes], dtype=np.float64)
+        self.bpms = np.array([bpm for _, bpm in changes], dtype=np.float64)
+        times = [self.beats[0] * 60 / self.bpms[0]]
+        for i in range(1, len(changes)):
+            times.append(times[-1] + (self.beats[i] - self.beats[i - 1]) * 60 / self.bpms[i - 1])
+        self.times = np.array(times, dtype=np.float64)
+
+    @classmethod
+    def from_level_data(cls, level_data: LevelData) -> "BpmTimeline":
+        return cls((entity.beat, entity.bpm) for entity in level_data.entities if isinstance(entity, BpmChange))
+
+    def section_index(self, beats: FloatArray) -> NDArray[np.intp]:
+        return np.maximum(np.searchsorted(self.beats, beats, side="right") - 1, 0)
+
+    def beat_to_time(self, beats: ArrayLike) -> FloatArray:
+        beats = np.asarray(beats, dtype=np.float64)
+        i = self.section_index(beats)
+        return self.times[i] + (beats - self.beats[i]) * 60 / self.bpms[i]
+
+    def beat_to_bpm(self, beats: ArrayLike) -> FloatArray:
+        return self.bpms[self.section_index(np.asarray(beats, dtype=np.float64))]
+
+
+@dataclass(frozen=True)
+class TimescaleCurve:
+    """The breakpoint table of a timescale group, as filled in by preprocess_timescale_changes.
+
+    Per change arrays are in chain order. Segment arrays have one more entry: segment i leads up to change i, and the
+    last one continues after the last change.
+    """
+
+    time: FloatArray
+    timescale: FloatArray
+    timescale_skip: FloatArray
+    scaled_time: FloatArray
+    unskipped_scaled_time: FloatArray
+    max_time: FloatArray
+    segment_min_scaled_time: FloatArray
+    segment_max_scaled_time: FloatArray
+    timescale_slope: FloatArray
+    is_monotonic: bool
+    segment_time: FloatArray
+    segment_scaled_time: FloatArray
+    segment_timescale: FloatArray
+    segment_ease: NDArray[np.int64]
+
+    @classmethod
+    def from_changes(cls, changes: Sequence[TimescaleChange], bpm_timeline: BpmTimeline) -> "TimescaleCurve":
+        """Build the table for a group's changes, given in chain order."""
+        beats = np.array([change.beat for change in changes], dtype=np.float64)
+        times = bpm_timeline.beat_to_time(beats).tolist()
+        bpms = bpm_timeline.beat_to_bpm(beats).tolist()
+        columns: dict[str, list[float]] = {
+            name: []
+            for name in (
+                "scaled_time",
+                "unskipped_scaled_time",
+                "max_time",
+                "segment_min_scaled_time",
+                "segment_max_scaled_time",
+                "timescale_slope",
+            )
+        }
+        segment_time = [MIN_START_TIME]
+        segment_scaled_time = [MIN_START_TIME]
+        segment_timescale = [1.0]
+        segment_ease = [TimescaleEase.NONE]
+        max_time = -np.inf
+        is_monotonic = True
+        for change, next_time, bpm in zip(changes, times, bpms, strict=True):
+            time = segment_time[-1]
+            scaled_time = segment_scaled_time[-1]
+            timescale = segment_timescale[-1]
+            next_timescale = change.timescale
+            timescale_slope = 0.0
+            match segment_ease[-1]:
+                case TimescaleEase.NONE:
+                    next_scaled_time = scaled_time + (next_time - time) * timescale
+                    lo_scaled_time = min(scaled_time, next_scaled_time)
+                    hi_scaled_time = max(scaled_time, next_scaled_time)
+                case TimescaleEase.LINEAR:
+                    next_scaled_time = scaled_time + (next_time - time) * (next_timescale + timescale) / 2
+                    linear_scaled_time = scaled_time + (next_time - time) * timescale
+                    lo_scaled_time = min(scaled_time, next_scaled_time, linear_scaled_time)
+                    hi_scaled_time = max(scaled_time, next_scaled_time, linear_scaled_time)
+                    if abs(next_time - time) >= 1e-6:
+                        timescale_slope = (next_timescale - timescale) / (next_time - time)
+                    if timescale * next_timescale < 0:
+                        turn_scaled_time = (
+                            scaled_time + (next_time - time) * timescale * timescale / (timescale - next_timescale) / 2
+                        )
+                        lo_scaled_time = min(lo_scaled_time, turn_scaled_time)
+                        hi_scaled_time = max(hi_scaled_time, turn_scaled_time)
+            lo_scaled_time = min(lo_scaled_time, next_scaled_time + change.timescale_skip)
+            hi_scaled_time = max(hi_scaled_time, next_scaled_time + change.timescale_skip)
+            max_time = max(max_time, next_time)
+            is_monotonic = is_monotonic and next_time >= time and next_timescale >= 0 and change.timescale_skip >= 0
+
+            columns["scaled_time"].append(next_scaled_time + change.timescale_skip * 60 / bpm)
+            columns["unskipped_scaled_time"].append(next_scaled_time)
+            columns["max_time"].append(max_time)
+            columns["segment_min_scaled_time"].append(lo_scaled_time - SCALED_TIME_RANGE_EPSILON)
+            columns["segment_max_scaled_time"].append(hi_scaled_time + SCALED_TIME_RANGE_EPSILON)
+            columns["timescale_slope"].append(timescale_slope)
+            segment_time.append(next_time)
+            segment_scaled_time.append(columns["scaled_time"][-1])
+            segment_timescale.append(next_timescale)
+            segment_ease.append(change.timescale_ease)
+        return cls(
+            time=np.array(times, dtype=np.float64),
+            timescale=np.array([change.timescale for change in changes], dtype=np.float64),
+            timescale_skip=np.array([change.timescale_skip for change in changes], dtype=np.float64),
+            **{name: np.array(values, dtype=np.float64) for name, values in columns.items()},
+            is_monotonic=is_monotonic,
+            segment_time=np.array(segment_time, dtype=np.float64),
+            segment_scaled_time=np.array(segment_scaled_time, dtype=np.float64),
+            segment_timescale=np.array(segment_timescale, dtype=np.float64),
+            segment_ease=np.array(segment_ease, dtype=np.int64),
+        )
+
+    @property
+    def change_count(self) -> int:
+        return len(self.time)
+
+    def time_to_scaled_time(self, times: ArrayLike) -> FloatArray:
+        """Get the scaled time at each of the given times, as TimeToScaledTime does."""
+        times = np.asarray(times, dtype=np.float64)
+        n = self.change_count
+        # The first change at or after each time, or n if there is none.
+        k = np.searchsorted(self.max_time, times, side="left")
+        next_k = np.minimum(k, max(n - 1, 0))
+        segment_time = self.segment_time[k]
+        segment_scaled_time = self.segment_scaled_time[k]
+        segment_timescale = self.segment_timescale[k]
+        if n > 0:
+            next_time = self.time[next_k]
+            next_timescale = self.timescale[next_k]
+            next_scaled_time = self.unskipped_scaled_time[next_k]
+            scaled_time = self.scaled_time[next_k]
+        else:
+            next_time = next_timescale = next_scaled_time = scaled_time = np.zeros_like(times)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            linear_scaled_time = segment_scaled_time + (times - segment_time) * segment_timescale
+            eased_none = segment_scaled_time + (next_scaled_time - segment_scaled_time) * (times - segment_time) / (
+                next_time - segment_time
+            )
+            avg_timescale = (
+                segment_timescale
+                + (
+                    segment_timescale
+                    + (next_timescale - segment_timescale) * (times - segment_time) / (next_time - segment_time)
+                )
+            ) / 2
+            eased_linear = segment_scaled_time + (times - segment_time) * avg_timescale
+        return np.select(
+            [
+                times <= MIN_START_TIME,
+                k >= n,
+                times == next_time,
+                np.abs(next_time - segment_time) < 1e-6,
+                self.segment_ease[k] == TimescaleEase.NONE,
+            ],
+            [times, linear_scaled_time, scaled_time, segment_scaled_time, eased_none],
+            eased_linear,
+        )
+
+    def scaled_time_to_first_time(self, scaled_times: ArrayLike) -> FloatArray:
+        """Get the first time each of the given scaled times is reached, as ScaledTimeToFirstTime does.
+
+        Each segment is only solved for the scaled times in its range, so for curves that mostly move forward, the
+        cost is close to a sort of the scaled times.
+        """
+        scaled_times = np.asarray(scaled_times, dtype=np.float64)
+        result = np.full(scaled_times.shape, np.nan)
+        flat_scaled_times = scaled_times.ravel()
+        flat_result = result.ravel()
+        order = np.argsort(flat_scaled_times, kind="stable")
+        sorted_scaled_times = flat_scaled_times[order]
+        lo = np.searchsorted(sorted_scaled_times, self.segment_min_scaled_time, side="left")
+        hi = np.searchsorted(sorted_scaled_times, self.segment_max_scaled_time, side="right")
+        resolved = np.zeros(flat_scaled_times.shape, dtype=bool)
+        for k in range(self.change_count):
+            if lo[k] >= hi[k]:
+                continue
+            indices = order[lo[k] : hi[k]]
+            indices = indices[~resolved[indices]]
+            if len(indices) == 0:
+                continue
+            first_time, found = self.solve_segment(k, flat_scaled_times[indices])
+            flat_result[indices[found]] = first_time[found]
+            resolved[indices[found]] = True
+        # Past every change the last segment goes on forever.
+        remaining = ~resolved
+        segment_time = self.segment_time[-1]
+        segment_scaled_time = self.segment_scaled_time[-1]
+        segment_timescale = self.segment_timescale[-1]
+        if segment_timescale == 0:
+            flat_result[remaining] = np.inf
+        else:
+            additional_time = (flat_scaled_times[remaining] - segment_scaled_time) / segment_timescale
+            flat_result[remaining] = np.where(additional_time < 0, np.inf, segment_time + additional_time)
+        return result
+
+    def solve_segment(self, k: int, scaled_times: FloatArray) -> tuple[FloatArray, NDArray[np.bool_]]:
+        """Solve for the first time in segment k that reaches each scaled time, returning the times and which exist."""
+        time = self.segment_time[k]
+        scaled_time = self.segment_scaled_time[k]
+        timescale = self.segment_timescale[k]
+        next_time = self.time[k]
+        next_scaled_time = self.unskipped_scaled_time[k]
+        first_time = np.full(scaled_times.shape, np.inf)
+        found = np.zeros(scaled_times.shape, dtype=bool)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            match self.segment_ease[k]:
+                case TimescaleEase.NONE:
+                    found = ((scaled_time <= scaled_times) & (scaled_times <= next_scaled_time) & (timescale > 0)) | (
+                        (scaled_time >= scaled_times) & (scaled_times >= next_scaled_time) & (timescale < 0)
+                    )
+                    if abs(next_scaled_time - scaled_time) < 1e-6:
+                        first_time[:] = time
+                    else:
+                        first_time = time + (next_time - time) * (scaled_times - scaled_time) / (
+                            next_scaled_time - scaled_time
+                        )
+                case TimescaleEase.LINEAR:
+                    if abs(next_time - time) < 1e-6:
+                        lo_scaled_time = min(scaled_time, next_scaled_time)
+                        hi_scaled_time = max(scaled_time, next_scaled_time)
+                        found = (lo_scaled_time <= scaled_times) & (scaled_times <= hi_scaled_time)
+                        first_time[:] = time
+                    else:
+                        a = self.timescale_slope[k]
+                        b = timescale
+                        c = scaled_time - scaled_times
+                        if abs(a) < 1e-6:
+                            if abs(b) > 1e-6:
+                                dt = -c / b
+                                found = (dt >= 0) & (dt <= (next_time - time))
+                                first_time = np.where(found, time + dt, np.inf)
+                        else:
+                            discriminant = b * b - 2 * a * c
+                            sqrt_discriminant = np.power(np.where(discriminant >= 0, discriminant, 0.0), 0.5)
+                            for dt in ((-b + sqrt_discriminant) / a, (-b - sqrt_discriminant) / a):
+                                in_segment = (discriminant >= 0) & (dt >= 0) & (dt <= (next_time - time))
+                                first_time = np.where(in_segment, np.minimum(first_time, time + dt), first_time)
+                                found |= in_segment
+        skip_end_scaled_time = next_scaled_time + self.timescale_skip[k]
+        skipped = ((next_scaled_time <= scaled_times) & (scaled_times <= skip_end_scaled_time)) | (
+            (skip_end_scaled_time <= scaled_times) & (scaled_times <= next_scaled_time)
+        )
+        first_time = np.where(found, first_time, next_time)
+        return first_time, found | skipped
+
+    def scaled_time_window_to_first_time(
+        self, start_scaled_times: ArrayLike, end_scaled_times: ArrayLike
+    ) -> FloatArray:
+        """Get the first time either end of each window of scaled times is reached, as ScaledTimeWindowToFirstTime does."""
+        start_scaled_times = np.asarray(start_scaled_times, dtype=np.float64)
+        first_time = self.scaled_time_to_first_time(start_scaled_times)
+        if not self.is_monotonic:
+            return np.minimum(first_time, self.scaled_time_to_first_time(end_scaled_times))
+        # As in the engine, the end only needs looking up for windows that start before the curve does.
+        early = start_scaled_times < MIN_START_TIME
+        if np.any(early):
+            end_scaled_times = np.broadcast_to(np.asarray(end_scaled_times, dtype=np.float64), early.shape)
+            first_time[early] = np.minimum(first_time[early], self.scaled_time_to_first_time(end_scaled_times[early]))
+        return first_time
+
+
+def iter_group_changes(group: TimescaleGroup) -> Iterable[TimescaleChange]:
+    change = getattr(group.first_ref, "_ref_", None)
+    while change is not None:
+        yield change
+        change = getattr(change.next_ref, "_ref_", None)
+
+
+def level_timescale_curves(level_data: LevelData) -> dict[TimescaleGroup, TimescaleCurve]:
+    """Build the curve of each timescale group of a converted level."""
+    bpm_timeline = BpmTimeline.from_level_data(level_data)
+    return {
+        entity: TimescaleCurve.from_changes(list(iter_group_changes(entity)), bpm_timeline)
+        for entity in level_data.entities
+        if isinstance(entity, TimescaleGroup)
+    }
+
+
+def preempt_time(note_speed: float) -> float:
+    """Get how long notes take to travel down the lane at a note speed, as sekai.lib.layout.preempt_time does."""
+    return 0.35 + (4 - 0.35) * ((note_speed - 12) / (1 - 12)) ** 1.31
+
+
+@dataclass(frozen=True)
+class NoteSpawnWindows:
+    """When each note of a level starts being drawn and its target time, in level order."""
+
+    notes: list[BaseNote]
+    visual_start_time: FloatArray
+    target_time: FloatArray
+
+    def visible_note_counts(self, times: ArrayLike) -> NDArray[np.intp]:
+        """Count the notes between their visual start and target times at each of the given times."""
+        times = np.asarray(times, dtype=np.float64)
+        started = np.searchsorted(np.sort(self.visual_start_time), times, side="right")
+        ended = np.searchsorted(np.sort(self.target_time), times, side="right")
+        return started - ended
+
+
+def note_spawn_windows(
+    level_data: LevelData,
+    note_speed: float,
+    curves: dict[TimescaleGroup, TimescaleCurve] | None = None,
+) -> NoteSpawnWindows:
+    """Get the spawn windows of a converted level's notes at a note speed, as get_visual_spawn_time computes them.
+
+    Attached notes start being drawn with the earlier of the notes they're attached to.
+    """
+    if curves is None:
+        curves = level_timescale_curves(level_data)
+    bpm_timeline = BpmTimeline.from_level_data(level_data)
+    notes = [entity for entity in level_data.entities if isinstance(entity, BaseNote)]
+    index_by_note = {note: i for i, note in enumerate(notes)}
+    target_time = bpm_timeline.beat_to_time([note.beat for note in notes])
+    visual_start_time = np.full(len(notes), np.inf)
+    preempt = preempt_time(note_speed)
+
+    notes_by_group: dict[TimescaleGroup, list[int]] = {}
+    for i, note in enumerate(notes):
+        if not note.is_attached:
+            notes_by_group.setdefault(note.timescale_group._ref_, []).append(i)
+    for group, indices in notes_by_group.items():
+        curve = curves[group]
+        target_scaled_time = curve.time_to_scaled_time(target_time[indices])
+        first_time = curve.scaled_time_window_to_first_time(target_scaled_time - preempt, target_scaled_time + preempt)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            progress = (-2 - (target_scaled_time - preempt)) / (target_scaled_time - (target_scaled_time - preempt))
+        visual_start_time[indices] = np.minimum(first_time, np.where((progress >= 0) & (progress <= 2), -2, 1e8))
+    for i, note in enumerate(notes):
+        if note.is_attached:
+            visual_start_time[i] = min(
+                visual_start_time[index_by_note[note.attach_head_ref._ref_]],
+                visual_start_time[index_by_note[note.attach_tail_ref._ref_]],
+            )
+    return NoteSpawnWindows(notes=notes, visual_start_time=visual_start_time, target_time=target_time)
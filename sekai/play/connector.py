@@ -15,12 +15,16 @@ from sekai.lib.connector import (
     CONNECTOR_TRAIL_SPAWN_PERIOD,
     ActiveConnectorInfo,
     ConnectorKind,
+    ConnectorTessellation,
     ConnectorVisualState,
     destroy_looped_particle,
     destroy_looped_sfx,
     draw_connector,
     draw_connector_slot_glow_effect,
+    get_connector_quality_scale,
+    init_connector_tessellation,
     map_connector_kind,
+    reserve_connector_draw_budget,
     schedule_connector_sfx,
     spawn_connector_slot_particles,
     spawn_linear_connector_trail_particle,
@@ -29,6 +33,7 @@ from sekai.lib.connector import (
     update_linear_connector_particle,
 )
 from sekai.lib.ease import EaseType
+from sekai.lib.layout import preempt_time
 from sekai.lib.note import draw_slide_note_head, get_attach_params
 from sekai.lib.options import Options
 from sekai.lib.streams import Streams
@@ -57,6 +62,9 @@ class Connector(PlayArchetype):
     input_active_interval: Interval = entity_data()
 
     last_visual_state: ConnectorVisualState = entity_memory()
+    tessellation: ConnectorTessellation = entity_memory()
+    # What it would draw at full quality, going by what it drew last frame.
+    quad_demand: float = entity_memory()
 
     @callback(order=-1)
     def preprocess(self):
@@ -83,6 +91,28 @@ class Connector(PlayArchetype):
         self.end_time = max(self.visual_active_interval.end, self.input_active_interval.end)
         self.last_visual_state = ConnectorVisualState.WAITING
 
+        for note_ref in (self.head_ref, self.tail_ref, self.segment_head_ref, self.segment_tail_ref):
+            note_ref.get().mark_timescale_groups_active(self.start_time, self.end_time)
+
+        init_connector_tessellation(
+            self.tessellation,
+            kind=self.kind,
+            ease_type=self.ease_type,
+            head_lane=head.lane,
+            head_size=head.size,
+            head_target_time=head.target_time,
+            head_ease_frac=head.head_ease_frac,
+            tail_lane=tail.lane,
+            tail_size=tail.size,
+            tail_target_time=tail.target_time,
+            tail_ease_frac=tail.tail_ease_frac,
+            progress_span=self.get_progress_span(),
+            segment_head_target_time=self.segment_head.target_time,
+            segment_head_alpha=self.segment_head.segment_alpha,
+            segment_tail_target_time=self.segment_tail.target_time,
+            segment_tail_alpha=self.segment_tail.segment_alpha,
+        )
+
         if Options.auto_sfx and self.head_ref.index == self.segment_head_ref.index:
             match self.kind:
                 case (
@@ -130,6 +160,9 @@ class Connector(PlayArchetype):
             self.despawn = True
             return
 
+        if time() < self.visual_active_interval.end:
+            reserve_connector_draw_budget(self.kind, self.quad_demand)
+
         if self.active_head_ref.index > 0:
             if time() in self.input_active_interval:
                 input_lane, input_size = self.get_attached_params(offset_adjusted_time())
@@ -152,6 +185,7 @@ class Connector(PlayArchetype):
                 self.active_connector_info.connector_kind = ConnectorKind.NONE
 
     def update_parallel(self):
+        self.quad_demand = 0
         if time() < self.visual_active_interval.end:
             head = self.head
             tail = self.tail
@@ -177,7 +211,8 @@ class Connector(PlayArchetype):
                 return
             if self.active_tail_ref.index > 0 and self.active_tail.is_despawned:
                 return
-            draw_connector(
+            quality_scale = get_connector_quality_scale(self.kind)
+            quad_count = draw_connector(
                 kind=self.kind,
                 visual_state=visual_state,
                 ease_type=self.ease_type,
@@ -198,7 +233,20 @@ class Connector(PlayArchetype):
                 segment_head_alpha=segment_head.segment_alpha,
                 segment_tail_target_time=segment_tail.target_time,
                 segment_tail_alpha=segment_tail.segment_alpha,
+                tessellation=self.tessellation,
+                quality_scale=quality_scale,
             )
+            self.quad_demand = quad_count / quality_scale
+
+    def get_progress_span(self) -> float:
+        head = self.head
+        tail = self.tail
+        if head.is_attached or tail.is_attached:
+            # The notes these ease between may not be preprocessed yet, so leave the connector to be split each frame.
+            return -1.0
+        if head.timescale_group.index == tail.timescale_group.index:
+            return (tail.target_scaled_time - head.target_scaled_time) / preempt_time()
+        return (tail.target_time - head.target_time) / preempt_time()
 
     def get_attached_params(self, target_time: float) -> tuple[float, float]:
         head = self.head_ref.get().effective_attach_head
@@ -2,6 +2,7 @@ from sonolus.script.archetype import PlayArchetype, callback
 
 from sekai.lib import archetype_names
 from sekai.lib.buckets import init_buckets
+from sekai.lib.connector import init_connector_draw_budget
 from sekai.lib.layout import init_layout
 from sekai.lib.note import init_note_life, init_score
 from sekai.lib.ui import init_ui
@@ -16,6 +17,7 @@ class Initialization(PlayArchetype):
     @callback(order=-2)
     def preprocess(self):
         init_layout()
+        init_connector_draw_budget()
         init_ui()
         init_buckets()
         init_score()
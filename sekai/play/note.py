@@ -50,7 +50,13 @@ from sekai.lib.note import (
 )
 from sekai.lib.options import Options, SlideMod
 from sekai.lib.streams import Streams
-from sekai.lib.timescale import group_hide_notes, group_scaled_time, group_time_to_scaled_time
+from sekai.lib.timescale import (
+    group_hide_notes,
+    group_hide_notes_until,
+    group_scaled_time,
+    group_time_to_scaled_time,
+    mark_timescale_group_active,
+)
 from sekai.play import input_manager
 
 DEFAULT_BEST_TOUCH_TIME = -1e8
@@ -96,6 +102,11 @@ class BaseNote(PlayArchetype):
 
     should_play_hit_effects: bool = entity_memory()
 
+    # Whether the note's group hides notes from when the note starts drawing until visibility_flip_time, so it's only
+    # read from the group after then.
+    starts_hidden: bool = entity_memory()
+    visibility_flip_time: float = entity_memory()
+
     end_time: float = exported()
     played_hit_effects: bool = exported()
 
@@ -179,7 +190,14 @@ class BaseNote(PlayArchetype):
             self.lane = lane
             self.size = size
             self.visual_start_time = min(attach_head.visual_start_time, attach_tail.visual_start_time)
-        self.start_time = min(self.visual_start_time, self.input_interval.start)
+        self.starts_hidden, self.visibility_flip_time = group_hide_notes_until(
+            self.timescale_group, self.visual_start_time
+        )
+        if self.starts_hidden:
+            # Nothing is drawn while the group hides notes, so there's no need to spawn until it stops or input starts.
+            self.start_time = min(self.visibility_flip_time, self.input_interval.start)
+        else:
+            self.start_time = min(self.visual_start_time, self.input_interval.start)
 
         if is_head(self.kind):
             self.active_connector_info.input_lane = self.lane
@@ -187,6 +205,15 @@ class BaseNote(PlayArchetype):
 
         schedule_note_auto_sfx(self.effect_kind, self.target_time)
 
+        self.mark_timescale_groups_active(self.start_time, max(self.target_time, self.input_interval.end))
+
+    def mark_timescale_groups_active(self, start_time: float, end_time: float):
+        """Mark the groups this note's progress and visibility are read from as active between the given times."""
+        mark_timescale_group_active(self.timescale_group, start_time, end_time)
+        if self.is_attached:
+            mark_timescale_group_active(self.attach_head_ref.get().timescale_group, start_time, end_time)
+            mark_timescale_group_active(self.attach_tail_ref.get().timescale_group, start_time, end_time)
+
     def spawn_order(self) -> float:
         if self.kind == NoteKind.ANCHOR:
             return 1e8
@@ -292,10 +319,15 @@ class BaseNote(PlayArchetype):
             return
         if is_head(self.kind) and time() > self.target_time:
             return
-        if group_hide_notes(self.timescale_group):
+        if self.is_hidden():
             return
         draw_note(self.kind, self.lane, self.size, self.progress, self.direction, self.target_time)
 
+    def is_hidden(self) -> bool:
+        if time() < self.visibility_flip_time:
+            return self.starts_hidden
+        return group_hide_notes(self.timescale_group)
+
     def should_do_delayed_trigger(self) -> bool:
         # Don't trigger if we haven't reached the target time yet.
         if offset_adjusted_time() < self.target_time:
@@ -19,6 +19,8 @@ class SimLine(PlayArchetype):
     @callback(order=1)
     def preprocess(self):
         self.spawn_time = min(self.left.start_time, self.right.start_time)
+        self.left.mark_timescale_groups_active(self.spawn_time, self.left.target_time)
+        self.right.mark_timescale_groups_active(self.spawn_time, self.left.target_time)
 
     def spawn_order(self) -> float:
         return self.spawn_time
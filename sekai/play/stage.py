@@ -5,6 +5,7 @@ from sonolus.script.quad import Quad
 from sonolus.script.runtime import offset_adjusted_time, touches
 
 from sekai.lib import archetype_names
+from sekai.lib.connector import update_connector_draw_budget
 from sekai.lib.layout import layout_hitbox, refresh_layout
 from sekai.lib.stage import draw_stage_and_accessories, play_lane_hit_effects
 from sekai.lib.streams import Streams
@@ -23,6 +24,7 @@ class Stage(PlayArchetype):
     @callback(order=-2)
     def update_sequential(self):
         refresh_layout()
+        update_connector_draw_budget()
 
     @callback(order=2)
     def touch(self):
@@ -2,6 +2,7 @@ from sonolus.script.archetype import WatchArchetype, callback
 
 from sekai.lib import archetype_names
 from sekai.lib.buckets import init_buckets
+from sekai.lib.connector import init_connector_draw_budget
 from sekai.lib.layout import init_layout
 from sekai.lib.note import init_note_life, init_score
 from sekai.lib.stage import schedule_lane_sfx
@@ -17,6 +18,7 @@ class WatchInitialization(WatchArchetype):
     @callback(order=-2)
     def preprocess(self):
         init_layout()
+        init_connector_draw_budget()
         init_ui()
         init_buckets()
         init_score()
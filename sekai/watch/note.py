@@ -37,7 +37,13 @@ from sekai.lib.note import (
     schedule_note_slot_effects,
 )
 from sekai.lib.options import Options, SlideMod
-from sekai.lib.timescale import group_hide_notes, group_scaled_time, group_time_to_scaled_time
+from sekai.lib.timescale import (
+    group_hide_notes,
+    group_hide_notes_until,
+    group_scaled_time,
+    group_time_to_scaled_time,
+    mark_timescale_group_active,
+)
 from sekai.play.note import derive_note_archetypes
 
 
@@ -64,6 +70,10 @@ class WatchBaseNote(WatchArchetype):
     visual_start_time: float = entity_data()
     start_time: float = entity_data()
     target_scaled_time: float = entity_data()
+    # Whether the note's group hides notes from when the note starts drawing until visibility_flip_time, so it's only
+    # read from the group after then.
+    starts_hidden: bool = entity_data()
+    visibility_flip_time: float = entity_data()
 
     active_connector_info: ActiveConnectorInfo = shared_memory()
 
@@ -166,6 +176,19 @@ class WatchBaseNote(WatchArchetype):
 
         self.result.target_time = self.target_time
 
+        self.starts_hidden, self.visibility_flip_time = group_hide_notes_until(
+            self.timescale_group, self.visual_start_time
+        )
+
+        self.mark_timescale_groups_active(self.spawn_time(), self.despawn_time())
+
+    def mark_timescale_groups_active(self, start_time: float, end_time: float):
+        """Mark the groups this note's progress and visibility are read from as active between the given times."""
+        mark_timescale_group_active(self.timescale_group, start_time, end_time)
+        if self.is_attached:
+            mark_timescale_group_active(self.attach_head_ref.get().timescale_group, start_time, end_time)
+            mark_timescale_group_active(self.attach_tail_ref.get().timescale_group, start_time, end_time)
+
     def spawn_time(self) -> float:
         if self.kind == NoteKind.ANCHOR:
             return 1e8
@@ -185,10 +208,15 @@ class WatchBaseNote(WatchArchetype):
             return
         if is_head(self.kind) and time() > self.target_time:
             return
-        if group_hide_notes(self.timescale_group):
+        if self.is_hidden():
             return
         draw_note(self.kind, self.lane, self.size, self.progress, self.direction, self.target_time)
 
+    def is_hidden(self) -> bool:
+        if time() < self.visibility_flip_time:
+            return self.starts_hidden
+        return group_hide_notes(self.timescale_group)
+
     def terminate(self):
         if is_skip():
             return
@@ -24,6 +24,8 @@ class WatchSimLine(WatchArchetype):
             self.end_time = min(self.left.end_time, self.right.end_time, self.left.target_time)
         else:
             self.end_time = min(self.left.target_time, self.right.target_time)
+        self.left.mark_timescale_groups_active(self.start_time, self.end_time)
+        self.right.mark_timescale_groups_active(self.start_time, self.end_time)
 
     def spawn_time(self) -> float:
         return self.start_time
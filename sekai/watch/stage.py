@@ -2,6 +2,7 @@ from sonolus.script.archetype import WatchArchetype, callback, entity_memory
 from sonolus.script.runtime import is_skip
 
 from sekai.lib import archetype_names
+from sekai.lib.connector import update_connector_draw_budget
 from sekai.lib.layout import refresh_layout
 from sekai.lib.stage import draw_stage_and_accessories, play_lane_particle
 
@@ -18,6 +19,7 @@ class WatchStage(WatchArchetype):
     @callback(order=-2)
     def update_sequential(self):
         refresh_layout()
+        update_connector_draw_budget()
 
     def update_parallel(self):
         draw_stage_and_accessories()
@@ -1,20 +1,31 @@
 from __future__ import annotations
 
+from math import inf
+
 from sonolus.script.archetype import (
     EntityRef,
     StandardImport,
     WatchArchetype,
     callback,
+    entity_data,
     imported,
     shared_memory,
 )
+from sonolus.script.interval import Interval
 from sonolus.script.runtime import time
 
 from sekai.lib import archetype_names
+from sekai.lib.options import Options
 from sekai.lib.timescale import (
     ScaledTimeToFirstTime,
+    ScaledTimeWindowToFirstTime,
     TimeToLastChangeIndex,
     TimeToScaledTime,
+    preprocess_timescale_changes,
+    preprocess_timescale_hide_notes,
+    record_timescale_group_frame,
+    share_timescale_curve,
+    timescale_work,
 )
 
 
@@ -29,11 +40,30 @@ class WatchTimescaleChange(WatchArchetype):
     hide_notes: bool = imported(name="hideNotes")
     next_ref: EntityRef[WatchTimescaleChange] = imported(name="next")
 
+    time: float = entity_data()
+    scaled_time: float = entity_data()
+    skip_scaled_time: float = entity_data()
+    max_time: float = entity_data()
+    min_scaled_time: float = entity_data()
+    max_scaled_time: float = entity_data()
+    prev_ref: EntityRef[WatchTimescaleChange] = entity_data()
+    jump_ref: EntityRef[WatchTimescaleChange] = entity_data()
+    ordinal: int = entity_data()
+    is_monotonic: bool = entity_data()
+    unskipped_scaled_time: float = entity_data()
+    segment_min_scaled_time: float = entity_data()
+    segment_max_scaled_time: float = entity_data()
+    timescale_slope: float = entity_data()
+    hide_notes_end_time: float = entity_data()
+
 
 class WatchTimescaleGroup(WatchArchetype):
     name = archetype_names.TIMESCALE_GROUP
 
     first_ref: EntityRef[WatchTimescaleChange] = imported(name="first")
+    curve_ref: EntityRef[WatchTimescaleGroup] = entity_data()
+    prev_curve_ref: EntityRef[WatchTimescaleGroup] = entity_data()
+    hide_notes_start_time: float = entity_data()
 
     current_scaled_time: float = shared_memory()
     last_change: EntityRef[WatchTimescaleChange] = shared_memory()
@@ -42,9 +72,13 @@ class WatchTimescaleGroup(WatchArchetype):
     time_to_scaled_time: TimeToScaledTime = shared_memory()
     time_to_last_change_index: TimeToLastChangeIndex = shared_memory()
     scaled_time_to_first_time: ScaledTimeToFirstTime = shared_memory()
-    scaled_time_to_first_time_2: ScaledTimeToFirstTime = shared_memory()
+    scaled_time_window_to_first_time: ScaledTimeWindowToFirstTime = shared_memory()
+    active_interval: Interval = shared_memory()
 
     def spawn_time(self) -> float:
+        # With timescale disabled, scaled time is just time, so the group is only needed to track hidden notes.
+        if Options.disable_timescale and self.hide_notes_start_time == inf:
+            return 1e8
         return -1e8
 
     def despawn_time(self) -> float:
@@ -52,16 +86,27 @@ class WatchTimescaleGroup(WatchArchetype):
 
     @callback(order=-2)
     def preprocess(self):
-        self.time_to_scaled_time.init(self.first_ref.index)
-        self.time_to_last_change_index.init(self.first_ref.index)
-        self.scaled_time_to_first_time.init(self.first_ref.index)
-        self.scaled_time_to_first_time_2.init(self.first_ref.index)
+        last_index = preprocess_timescale_changes(self.first_ref.index)
+        self.curve_ref.index = share_timescale_curve(self.index, last_index)
+        self.hide_notes_start_time = preprocess_timescale_hide_notes(last_index)
+        self.time_to_scaled_time.init(last_index)
+        self.time_to_last_change_index.init(last_index)
+        self.scaled_time_to_first_time.init(last_index)
+        self.scaled_time_window_to_first_time.init(last_index)
+        # Widened by whatever reads this group as it preprocesses, see mark_timescale_group_active.
+        self.active_interval.start = inf
+        self.active_interval.end = -inf
 
     @callback(order=-2)
     def update_sequential(self):
-        self.current_scaled_time = self.time_to_scaled_time.get(time())
+        if time() not in self.active_interval:
+            return
+        start_work = timescale_work()
+        if self.curve_ref.index == self.index and not Options.disable_timescale:
+            self.current_scaled_time = self.time_to_scaled_time.get(time())
         self.last_change.index = self.time_to_last_change_index.get(time())
         if self.last_change.index > 0:
             self.hide_notes = self.last_change.get().hide_notes
         else:
             self.hide_notes = False
+        record_timescale_group_frame(self.index, start_work)
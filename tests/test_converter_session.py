@@ -0,0 +1,63 @@
+import random
+
+import pytest
+from sonolus.build.level import package_level_data
+from sonolus.script.level import ExternalEntityData
+
+from sekai.benchmarks.charts import ChartParams, generate_chart
+from sekai.lib.converter import convert_pjsekai_extended_level_data, note_type_mapping
+from sekai.lib.converter_session import ConversionSession
+
+STEPS = 25
+
+
+def keys_of(session: ConversionSession, *archetypes: str) -> list[int]:
+    return [key for key, entity in session.entities.items() if entity.archetype in archetypes]
+
+
+def with_data(entity: ExternalEntityData, **data) -> ExternalEntityData:
+    return ExternalEntityData(entity.archetype, {**entity.data, **data})
+
+
+def random_edit(session: ConversionSession, rng: random.Random):
+    notes = keys_of(session, *note_type_mapping)
+    groups = keys_of(session, "TimeScaleGroup")
+    match rng.randrange(7):
+        case 0:
+            key = rng.choice(notes)
+            entity = session.entities[key]
+            session.update(changed={key: with_data(entity, lane=rng.uniform(-5, 5), size=rng.uniform(0.5, 2))})
+        case 1:
+            key = rng.choice(notes)
+            entity = session.entities[key]
+            session.update(changed={key: with_data(entity, **{"#BEAT": entity.data["#BEAT"] + rng.uniform(-1, 1)})})
+        case 2:
+            key = rng.choice(keys_of(session, "TimeScaleChange"))
+            entity = session.entities[key]
+            session.update(changed={key: with_data(entity, timeScale=rng.choice([0.5, 1.0, 2.0]))})
+        case 3:
+            fields = {"#BEAT": rng.uniform(0, 20), "lane": rng.uniform(-5, 5), "size": 1.0}
+            session.update(
+                added=[ExternalEntityData("NormalTapNote", {**fields, "timeScaleGroup": rng.choice(groups)})]
+            )
+        case 4:
+            removable = keys_of(session, "SimLine", "Guide") + [key for key in notes if not session.referrers.get(key)]
+            session.update(removed=[rng.choice(removable)])
+        case 5:
+            key = rng.choice(keys_of(session, "Guide"))
+            entity = session.entities[key]
+            session.update(changed={key: with_data(entity, tailLane=rng.uniform(-5, 5), color=rng.randrange(8))})
+        case 6:
+            session.update(added=[ExternalEntityData("#BPM_CHANGE", {"#BEAT": rng.uniform(1, 20), "#BPM": 150})])
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_session_matches_full_conversion(seed: int):
+    rng = random.Random(seed)
+    session = ConversionSession(generate_chart(ChartParams(beats=20.0, guide_count=20, seed=seed)))
+    for _ in range(STEPS):
+        random_edit(session, rng)
+        converted = convert_pjsekai_extended_level_data(session.source())
+        assert session.level_data is not None
+        assert converted is not None
+        assert package_level_data(session.level_data) == package_level_data(converted)
@@ -0,0 +1,57 @@
+import pytest
+from sonolus.script.level import ExternalEntityData, ExternalLevelData, parse_external_level_data
+
+from sekai.lib.converter import InvalidLevelDataError, convert_pjsekai_extended_level_data
+from sekai.play.timescale import TimescaleChange
+
+
+def make_level(*entities: tuple[str, dict]) -> ExternalLevelData:
+    return ExternalLevelData(
+        bgm_offset=0,
+        entities=[ExternalEntityData(archetype, data) for archetype, data in entities],
+    )
+
+
+def test_dangling_ref_converts():
+    # Refs to names that don't exist in the level are parsed as 0, which means no ref.
+    level = parse_external_level_data(
+        {
+            "bgmOffset": 0,
+            "entities": [
+                {"archetype": "Initialization", "data": []},
+                {"archetype": "#BPM_CHANGE", "data": [{"name": "#BEAT", "value": 0}, {"name": "#BPM", "value": 120}]},
+                {"name": "group", "archetype": "TimeScaleGroup", "data": [{"name": "first", "ref": "change"}]},
+                {
+                    "name": "change",
+                    "archetype": "TimeScaleChange",
+                    "data": [
+                        {"name": "#BEAT", "value": 0},
+                        {"name": "timeScale", "value": 2},
+                        {"name": "next", "ref": "missing"},
+                    ],
+                },
+                {
+                    "archetype": "NormalTapNote",
+                    "data": [
+                        {"name": "#BEAT", "value": 1},
+                        {"name": "lane", "value": 0},
+                        {"name": "size", "value": 1},
+                        {"name": "timeScaleGroup", "ref": "group"},
+                    ],
+                },
+            ],
+        }
+    )
+    converted = convert_pjsekai_extended_level_data(level)
+    assert converted is not None
+    assert [entity.timescale for entity in converted.entities if isinstance(entity, TimescaleChange)] == [2]
+
+
+def test_negative_ref_is_missing():
+    level = make_level(
+        ("TimeScaleGroup", {"first": -1}),
+        ("#BPM_CHANGE", {"#BEAT": 0, "#BPM": 120}),
+    )
+    with pytest.raises(InvalidLevelDataError) as exc_info:
+        convert_pjsekai_extended_level_data(level)
+    assert [(d.index, d.field, d.message) for d in exc_info.value.diagnostics] == [(0, "first", "is missing")]
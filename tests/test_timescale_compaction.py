@@ -0,0 +1,88 @@
+import math
+import random
+
+import pytest
+from sonolus.script.level import ExternalEntityData, ExternalLevelData, LevelData
+
+from sekai.lib.converter import ConversionReport, convert_pjsekai_extended_level_data
+from sekai.play.note import BaseNote
+from sekai.play.timescale import TimescaleChange, TimescaleGroup
+
+BEATS = 64
+
+
+def generate_level(seed: int, group_count: int, chain_length: int) -> ExternalLevelData:
+    rng = random.Random(seed)
+    entities = [
+        ExternalEntityData("Initialization", {}),
+        ExternalEntityData("#BPM_CHANGE", {"#BEAT": 0, "#BPM": 120}),
+    ]
+    groups = []
+    chains = []
+    for _ in range(group_count):
+        # Some groups repeat an earlier chain, so they can be folded into it.
+        if chains and rng.random() < 0.5:
+            chain = rng.choice(chains)
+        else:
+            beats = sorted(rng.uniform(0, BEATS) for _ in range(chain_length))
+            chain = [(beat, rng.choice([0.5, 1.0, 1.0, 2.0])) for beat in beats]
+            chains.append(chain)
+        groups.append(len(entities))
+        entities.append(ExternalEntityData("TimeScaleGroup", {"first": len(entities) + 1}))
+        for i, (beat, timescale) in enumerate(chain):
+            data = {"#BEAT": beat, "timeScale": timescale}
+            if i < len(chain) - 1:
+                data["next"] = len(entities) + 1
+            entities.append(ExternalEntityData("TimeScaleChange", data))
+    entities.extend(
+        ExternalEntityData(
+            "NormalTapNote",
+            {"#BEAT": rng.uniform(0, BEATS), "lane": 0, "size": 1, "timeScaleGroup": rng.choice(groups)},
+        )
+        for _ in range(200)
+    )
+    return ExternalLevelData(bgm_offset=0, entities=entities)
+
+
+def scaled_beat(group: TimescaleGroup, beat: float) -> float:
+    # The integral of the timescale from beat 0, which is 1 before the first change.
+    result = 0.0
+    segment_beat = 0.0
+    timescale = 1.0
+    # Outside of compilation, refs to level data entities hold the entity they point to.
+    change = getattr(group.first_ref, "_ref_", None)
+    while isinstance(change, TimescaleChange) and change.beat < beat:
+        result += (change.beat - segment_beat) * timescale
+        segment_beat = change.beat
+        timescale = change.timescale
+        change = getattr(change.next_ref, "_ref_", None)
+    return result + (beat - segment_beat) * timescale
+
+
+def note_scaled_beats(level_data: LevelData) -> list[float]:
+    return [
+        scaled_beat(entity.timescale_group._ref_, entity.beat)
+        for entity in level_data.entities
+        if isinstance(entity, BaseNote)
+    ]
+
+
+@pytest.mark.parametrize(
+    ("group_count", "chain_length"),
+    [
+        (4, 32),
+        # Few changes per group, so many groups end up identical and get folded.
+        (32, 2),
+    ],
+)
+def test_compaction_keeps_scaled_times(group_count: int, chain_length: int):
+    data = generate_level(0, group_count, chain_length)
+    report = ConversionReport()
+    full = convert_pjsekai_extended_level_data(data)
+    compacted = convert_pjsekai_extended_level_data(data, compact_timescales=True, report=report)
+    assert full is not None
+    assert compacted is not None
+    assert report.removed_timescale_entities > 0
+    # Merged changes add up their segments in a different order, so results can differ in the last bit.
+    for compacted_beat, full_beat in zip(note_scaled_beats(compacted), note_scaled_beats(full), strict=True):
+        assert math.isclose(compacted_beat, full_beat, rel_tol=1e-12, abs_tol=1e-12)
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+from sonolus.backend.mode import Mode
+from sonolus.script.runtime import time
+
+from sekai.benchmarks.runtime import EngineHarness
+from sekai.benchmarks.timescale import CHANGE_INTERVAL, QUERY_GROUP, build_group
+from sekai.lib.timescale import group_scaled_time_to_first_time, group_time_to_scaled_time
+from sekai.play.mode import play_mode
+from sekai.play.timescale import TimescaleChange, TimescaleGroup
+
+np = pytest.importorskip("numpy")
+timescale_offline = pytest.importorskip("sekai.lib.timescale_offline")
+
+CHANGE_COUNT = 40
+QUERIES = 100
+
+
+def forward_query() -> float:
+    return group_time_to_scaled_time(QUERY_GROUP, time())
+
+
+def inverse_query() -> float:
+    return group_scaled_time_to_first_time(QUERY_GROUP, time())
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_offline_curve_matches_engine(seed: int):
+    # The harness runs at 60 bpm, so beats are seconds.
+    harness = EngineHarness(Mode.PLAY, play_mode.archetypes, bpm=60.0)
+    group = build_group(harness, CHANGE_COUNT, seed)
+    assert group == QUERY_GROUP
+    harness.run(harness.compile_callback(TimescaleGroup, "preprocess"), group)
+    changes = [
+        TimescaleChange(
+            beat=harness.get_field(TimescaleChange, index, "beat"),
+            timescale=harness.get_field(TimescaleChange, index, "timescale"),
+            timescale_skip=harness.get_field(TimescaleChange, index, "timescale_skip"),
+            timescale_ease=int(harness.get_field(TimescaleChange, index, "timescale_ease")),
+        )
+        for index in range(group + 1, group + 1 + CHANGE_COUNT)
+    ]
+    curve = timescale_offline.TimescaleCurve.from_changes(changes, timescale_offline.BpmTimeline([(0.0, 60.0)]))
+
+    rng = random.Random(seed)
+    duration = CHANGE_COUNT * CHANGE_INTERVAL
+    # Exact change times are edge cases of both lookups, so they're queried too.
+    times = [rng.uniform(-1, duration + 1) for _ in range(QUERIES)] + [float(t) for t in curve.time]
+    forward_node = harness.compile(forward_query, "preprocess")
+    engine_scaled_times = [harness.run(forward_node, 0, t)[0] for t in times]
+    np.testing.assert_array_equal(curve.time_to_scaled_time(times), engine_scaled_times)
+
+    inverse_node = harness.compile(inverse_query, "preprocess")
+    scaled_times = [rng.uniform(-1, max(engine_scaled_times)) for _ in range(QUERIES)]
+    engine_first_times = [harness.run(inverse_node, 0, t)[0] for t in scaled_times]
+    np.testing.assert_array_equal(curve.scaled_time_to_first_time(scaled_times), engine_first_times)